@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class HrmnConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.hrmn'
+
+    def ready(self):
+        from apps.hrmn import signals  # noqa: F401
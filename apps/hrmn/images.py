@@ -0,0 +1,146 @@
+import base64
+import binascii
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.urls import reverse
+
+from djangoProject import versions
+
+logger = logging.getLogger(__name__)
+
+THUMB_SIZE = getattr(settings, 'IMAGE_THUMB_SIZE', (128, 128))
+RECEIPT_WIDTH = getattr(settings, 'IMAGE_RECEIPT_WIDTH', 384)  # ticketera de 58 mm
+VARIANTS_DIR = 'variants'
+
+# (modelo, campo origen) -> {variante: campo destino}
+SOURCES = {
+    ('Employee', 'foto'): {'thumb': 'foto_thumb'},
+    ('Subsidiary', 'logo'): {'thumb': 'logo_thumb', 'receipt': 'logo_receipt'},
+    ('Company', 'logo'): {'thumb': 'logo_thumb', 'receipt': 'logo_receipt'},
+}
+
+_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'IMAGE_WORKERS', 2), thread_name_prefix='images')
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'JPEG':
+        image.convert('RGB').save(buffer, 'JPEG', quality=80, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def render_thumb(image):
+    from PIL import Image
+    thumb = image.copy()
+    thumb.thumbnail(THUMB_SIZE, Image.LANCZOS)
+    has_alpha = thumb.mode in ('RGBA', 'LA') or 'transparency' in thumb.info
+    return _encode(thumb, 'PNG' if has_alpha else 'JPEG'), 'png' if has_alpha else 'jpg'
+
+
+def render_receipt(image):
+    """Variante monocromática al ancho de la ticketera."""
+    from PIL import Image
+    if image.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', image.size, 'white')
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.split()[-1])
+        image = background
+    width = min(RECEIPT_WIDTH, image.width)
+    height = max(1, round(image.height * width / image.width))
+    receipt = image.convert('L').resize((width, height), Image.LANCZOS).convert('1')
+    return _encode(receipt, 'PNG'), 'png'
+
+
+RENDERERS = {'thumb': render_thumb, 'receipt': render_receipt}
+
+
+def store(data, ext):
+    """Guarda el contenido con nombre igual a su hash; si ya existe no se vuelve a escribir."""
+    digest = hashlib.sha256(data).hexdigest()
+    name = f'{VARIANTS_DIR}/{digest[:2]}/{digest}.{ext}'
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(data))
+    return name
+
+
+def read_source(instance, field):
+    value = getattr(instance, field)
+    if not value:
+        return None
+    if isinstance(value, str):
+        # Company.logo guarda la imagen como texto base64, con o sin prefijo data:
+        try:
+            return base64.b64decode(value.split(',', 1)[-1], validate=False)
+        except (binascii.Error, ValueError):
+            return None
+    try:
+        value.open('rb')
+        try:
+            return value.read()
+        finally:
+            value.close()
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def generate(instance, field):
+    """Genera las variantes de ``instance.field`` y guarda sus rutas en el modelo."""
+    from PIL import Image, ImageOps  # solo lo necesita el worker, no el arranque
+
+    targets = SOURCES[(type(instance).__name__, field)]
+    data = read_source(instance, field)
+    if data is None:
+        updates = {target: None for target in targets.values()}
+    else:
+        image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+        updates = {target: store(*RENDERERS[variant](image)) for variant, target in targets.items()}
+    # update() no dispara post_save, así no se vuelve a encolar
+    type(instance).objects.filter(pk=instance.pk).update(**updates)
+    versions.bump(*scopes(instance))
+    return updates
+
+
+def scopes(instance):
+    """Contadores de versión que dependen de las variantes de ``instance``.
+
+    La foto de un empleado solo invalida a los empleados de su sucursal; los
+    logos de sucursal y empresa se muestran en ``subsidiaries``/``subsidiary``.
+    """
+    if type(instance).__name__ == 'Employee':
+        return ['employee', f'employee:{instance.subsidiary_id}'] if instance.subsidiary_id else ['employee']
+    return ['subsidiary']
+
+
+def _run(model, pk, field):
+    close_old_connections()
+    try:
+        instance = model.objects.filter(pk=pk).first()
+        if instance is not None:
+            generate(instance, field)
+    except Exception:
+        logger.exception('Error generando variantes de %s %s', model.__name__, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule(instance, field):
+    """Encola la generación en segundo plano después del commit."""
+    model, pk = type(instance), instance.pk
+    transaction.on_commit(lambda: _executor.submit(_run, model, pk, field))
+
+
+def variant_url(request, name):
+    if not name:
+        return None
+    digest, ext = name.rsplit('/', 1)[-1].split('.', 1)
+    path = reverse('image_variant', kwargs={'digest': digest, 'ext': ext})
+    return request.build_absolute_uri(path) if request is not None else path
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from apps.hrmn import images
+from apps.hrmn.models import Employee, Subsidiary, Company
+
+MODELS = {'Employee': Employee, 'Subsidiary': Subsidiary, 'Company': Company}
+
+
+class Command(BaseCommand):
+    help = 'Genera las miniaturas y variantes de ticketera de fotos y logos existentes'
+
+    def handle(self, *args, **options):
+        for (model_name, field) in images.SOURCES:
+            model = MODELS[model_name]
+            count = 0
+            for instance in model.objects.exclude(**{f'{field}__isnull': True}).iterator():
+                try:
+                    images.generate(instance, field)
+                    count += 1
+                except Exception as e:
+                    self.stderr.write(f'{model_name} {instance.pk}: {e}')
+            self.stdout.write(f'{model_name}.{field}: {count} procesados')
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.hrmn import padron
+
+
+def read_rows(path, encoding):
+    """Lee el padrón reducido de SUNAT (``RUC|NOMBRE|ESTADO|CONDICION|UBIGEO|via|...|``)."""
+    with open(path, encoding=encoding, errors='replace') as source:
+        next(source, None)  # cabecera
+        for line in source:
+            fields = line.rstrip('\r\n').split('|')
+            if len(fields) < 4 or not fields[0].isdigit():
+                continue
+            address = ' '.join(f for f in fields[5:15] if f and f != '-')
+            yield int(fields[0]), fields[1].strip(), fields[2].strip(), fields[3].strip(), address
+
+
+class Command(BaseCommand):
+    help = 'Convierte el padrón de contribuyentes al formato binario usado por lookupClientByDocument'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source')
+        parser.add_argument('--output', default=getattr(settings, 'PADRON_PATH', None))
+        parser.add_argument('--encoding', default='latin-1')
+
+    def handle(self, *args, **options):
+        if not options['output']:
+            raise CommandError('Indique --output o configure PADRON_PATH')
+        count = padron.build(read_rows(options['source'], options['encoding']), options['output'])
+        self.stdout.write(self.style.SUCCESS(f'{count} contribuyentes importados en {options["output"]}'))
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models import Q
 # from django_mysql.models import EnumField
 
 
@@ -16,6 +17,7 @@ class Employee(models.Model):
     password = models.CharField(max_length=100, blank=True, null=True)
     foto = models.ImageField(upload_to='employee_photo/', default='empleoyee_photo/img_empleado.jpg', null=True,
                              blank=True)
+    foto_thumb = models.CharField(max_length=200, blank=True, null=True)
 
     def __str__(self):
         return str(self.name_lastname)
@@ -32,6 +34,8 @@ class Subsidiary(models.Model):
     address = models.CharField(max_length=150, blank=True, null=True)
     phone = models.CharField(max_length=45, blank=True, null=True)
     logo = models.ImageField(upload_to='subsidiary')
+    logo_thumb = models.CharField(max_length=200, blank=True, null=True)
+    logo_receipt = models.CharField(max_length=200, blank=True, null=True)
     is_enabled = models.BooleanField(default=True)
     password = models.CharField(max_length=100, blank=True, null=True)
     serie = models.CharField(max_length=45, blank=True, null=True)
@@ -54,6 +58,8 @@ class Company(models.Model):
     url = models.CharField(max_length=600, blank=True, null=True)
     token = models.CharField(max_length=600, blank=True, null=True)
     logo = models.TextField(blank=True, null=True)
+    logo_thumb = models.CharField(max_length=200, blank=True, null=True)
+    logo_receipt = models.CharField(max_length=200, blank=True, null=True)
     is_enabled = models.BooleanField(default=True)
     password = models.CharField(max_length=100, blank=True, null=True)
     billing_top = models.BooleanField(default=True)
@@ -109,12 +115,21 @@ class ClientSupplier(models.Model):
     address = models.CharField(max_length=200, blank=True, null=True)
     phone = models.CharField(max_length=100, blank=True, null=True)
     mail = models.CharField(max_length=100, blank=True, null=True)
-    nDocument = models.IntegerField(blank=True, null=True)
+    nDocument = models.BigIntegerField(blank=True, null=True)  # un RUC tiene 11 dígitos
     typeDocument = models.CharField(max_length=1, choices=TYPE_DOCUMENT_CHOICE, default='R')
     typePerson = models.CharField(max_length=1, choices=TYPE_PERSON_CHOICE, default='E')
+    lead_time_days = models.IntegerField('Días de entrega', default=7)
 
     def __str__(self):
         return str(self.name)
 
     class Meta:
         db_table = 'ClientSupplier'
+        indexes = [
+            models.Index(fields=['typeDocument', 'nDocument']),
+        ]
+        constraints = [
+            # 0 queda libre para clientes genéricos (varios)
+            models.UniqueConstraint(fields=['typeDocument', 'nDocument'], condition=Q(nDocument__gt=0),
+                                    name='unique_client_supplier_document'),
+        ]
@@ -0,0 +1,147 @@
+"""Directorio local de contribuyentes (padrón) para buscar clientes por DNI/RUC.
+
+El archivo se genera con ``import_padron`` y tiene este formato binario:
+
+    cabecera   b'PADRON01' + cantidad (uint64)
+    registros  cantidad + 1 pares (documento uint64, desplazamiento uint64),
+               ordenados por documento; el último solo marca el fin del texto
+    textos     filas UTF-8 ``nombre\\testado\\tcondicion\\tdireccion``
+
+Se abre con mmap y se busca por bisección, así que no se carga en memoria.
+"""
+import mmap
+import os
+import struct
+import threading
+from array import array
+
+from django.conf import settings
+
+MAGIC = b'PADRON01'
+HEADER = struct.Struct('<8sQ')
+RECORD = struct.Struct('<QQ')
+FIELDS = ('name', 'status', 'condition', 'address')
+
+RUC_WEIGHTS = (5, 4, 3, 2, 7, 6, 5, 4, 3, 2)
+
+
+def dni_to_ruc(dni):
+    """RUC de persona natural (10 + DNI + dígito verificador)."""
+    base = f'10{int(dni):08d}'
+    check = 11 - sum(int(d) * w for d, w in zip(base, RUC_WEIGHTS)) % 11
+    return int(base + str(check % 10))
+
+
+class PadronDirectory:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} no es un padrón válido')
+        self._records = HEADER.size
+        self._texts = HEADER.size + RECORD.size * (self.count + 1)
+        self.mtime = os.path.getmtime(path)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _key(self, index):
+        return struct.unpack_from('<Q', self._map, self._records + index * RECORD.size)[0]
+
+    def lookup(self, number):
+        """Devuelve ``{'document', 'name', 'status', 'condition', 'address'}`` o ``None``."""
+        number = int(number)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < number:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.count or self._key(low) != number:
+            return None
+        _, start = RECORD.unpack_from(self._map, self._records + low * RECORD.size)
+        _, end = RECORD.unpack_from(self._map, self._records + (low + 1) * RECORD.size)
+        values = self._map[self._texts + start:self._texts + end].decode('utf-8').split('\t')
+        return dict(zip(FIELDS, values), document=number)
+
+
+_directory = None
+_lock = threading.Lock()
+
+
+def get_directory():
+    """Directorio configurado en ``PADRON_PATH``; se reabre si el archivo fue reemplazado.
+
+    Se llama con ``_lock`` tomado: el directorio anterior se cierra al
+    reemplazarlo y ninguna búsqueda puede estar leyéndolo.
+    """
+    global _directory
+    path = getattr(settings, 'PADRON_PATH', None)
+    if not path or not os.path.exists(path):
+        return None
+    if _directory is None or _directory.path != path or _directory.mtime != os.path.getmtime(path):
+        previous, _directory = _directory, PadronDirectory(path)
+        if previous is not None:
+            previous.close()
+    return _directory
+
+
+def lookup(type_document, number):
+    # La bisección son unas pocas lecturas del mmap: se hace bajo el mismo candado que el cambio de archivo
+    with _lock:
+        directory = get_directory()
+        if directory is None:
+            return None
+        found = directory.lookup(number)
+        if found is None and type_document == 'D':
+            found = directory.lookup(dni_to_ruc(number))
+        return found
+
+
+def build(rows, output_path, tmp_path=None):
+    """Escribe el archivo binario a partir de ``(documento, nombre, estado, condicion, direccion)``.
+
+    Los textos se guardan primero en un archivo temporal y solo los documentos
+    y desplazamientos quedan en memoria para ordenarlos.
+    """
+    tmp_path = tmp_path or output_path + '.tmp'
+    keys, offsets, lengths = array('Q'), array('Q'), array('I')
+    position = 0
+    with open(tmp_path, 'wb') as tmp:
+        for document, *values in rows:
+            data = '\t'.join((v or '').replace('\t', ' ') for v in values).encode('utf-8')
+            tmp.write(data)
+            keys.append(int(document))
+            offsets.append(position)
+            lengths.append(len(data))
+            position += len(data)
+
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    # Sin documentos repetidos: se conserva la última aparición
+    unique = []
+    for index in order:
+        if unique and keys[unique[-1]] == keys[index]:
+            unique[-1] = index
+        else:
+            unique.append(index)
+
+    with open(tmp_path, 'rb') as tmp, open(output_path + '.new', 'wb') as out:
+        source = mmap.mmap(tmp.fileno(), 0, access=mmap.ACCESS_READ) if position else None
+        out.write(HEADER.pack(MAGIC, len(unique)))
+        text_offset = 0
+        for index in unique:
+            out.write(RECORD.pack(keys[index], text_offset))
+            text_offset += lengths[index]
+        out.write(RECORD.pack(0, text_offset))
+        for index in unique:
+            out.write(source[offsets[index]:offsets[index] + lengths[index]])
+        if source is not None:
+            source.close()
+
+    os.replace(output_path + '.new', output_path)
+    os.remove(tmp_path)
+    return len(unique)
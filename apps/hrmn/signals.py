@@ -0,0 +1,43 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from apps.hrmn import images
+from apps.hrmn.models import Subsidiary, Company, Employee
+from djangoProject import versions
+
+# Campo de imagen de cada modelo con variantes (ver ``images.SOURCES``)
+IMAGE_FIELDS = {Employee: 'foto', Subsidiary: 'logo', Company: 'logo'}
+UNKNOWN = object()
+
+
+def _image_value(instance, field):
+    # Se lee de __dict__ para no consultar un campo diferido; un FileField guarda su nombre
+    value = instance.__dict__.get(field, UNKNOWN)
+    return getattr(value, 'name', value)
+
+
+@receiver([post_save, post_delete], sender=Subsidiary)
+@receiver([post_save, post_delete], sender=Company)
+def subsidiary_changed(sender, instance, **kwargs):
+    versions.bump('subsidiary')
+
+
+@receiver(post_init, sender=Employee)
+@receiver(post_init, sender=Subsidiary)
+@receiver(post_init, sender=Company)
+def image_loaded(sender, instance, **kwargs):
+    instance._image_source = _image_value(instance, IMAGE_FIELDS[sender])
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_save, sender=Subsidiary)
+@receiver(post_save, sender=Company)
+def image_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    """Encola las variantes solo si la imagen cambió respecto de la cargada."""
+    field = IMAGE_FIELDS[sender]
+    if update_fields is not None and field not in update_fields:
+        return
+    previous, current = getattr(instance, '_image_source', UNKNOWN), _image_value(instance, field)
+    instance._image_source = current
+    if created or previous is UNKNOWN or previous != current:
+        images.schedule(instance, field)
@@ -1,3 +1,30 @@
+import re
+
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponseNotModified
 from django.shortcuts import render
+from django.views.decorators.http import require_GET
+
+from apps.hrmn.images import VARIANTS_DIR
+
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+CONTENT_TYPES = {'jpg': 'image/jpeg', 'png': 'image/png'}
+
 
-# Create your views here.
+@require_GET
+def image_variant(request, digest, ext):
+    """Sirve una variante de imagen; el nombre es su hash, así que nunca cambia."""
+    if not DIGEST_RE.match(digest) or ext not in CONTENT_TYPES:
+        raise Http404
+    etag = f'"{digest}"'
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponseNotModified()
+    else:
+        try:
+            response = FileResponse(default_storage.open(f'{VARIANTS_DIR}/{digest[:2]}/{digest}.{ext}', 'rb'),
+                                    content_type=CONTENT_TYPES[ext])
+        except FileNotFoundError:
+            raise Http404
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
@@ -0,0 +1,33 @@
+"""Árbol Categoría → Subcategoría → Observación del menú de venta.
+
+Se arma con una consulta por nivel y se devuelve como diccionarios simples
+para guardarlo tal cual en el cache de resultados.
+"""
+from apps.products.models import Category, SubCategory, Observation
+
+
+def version_names(subsidiary_id):
+    return [f'category:{subsidiary_id}']
+
+
+def build_tree(subsidiary_id):
+    """Categorías habilitadas de la sucursal con sus subcategorías habilitadas y observaciones."""
+    categories = list(Category.objects.filter(subsidiary_id=subsidiary_id, is_enabled=True)
+                      .order_by('category', 'id').values('id', 'category', 'description'))
+    subcategories = (SubCategory.objects
+                     .filter(category__subsidiary_id=subsidiary_id, category__is_enabled=True, is_enabled=True)
+                     .order_by('subcategory', 'id').values('id', 'category_id', 'subcategory', 'description'))
+    observations = (Observation.objects
+                    .filter(subcategory__category__subsidiary_id=subsidiary_id, subcategory__is_enabled=True,
+                            subcategory__category__is_enabled=True)
+                    .order_by('observation', 'id').values('id', 'subcategory_id', 'observation'))
+
+    by_category = {category['id']: dict(category, subcategories=[]) for category in categories}
+    by_subcategory = {}
+    for subcategory in subcategories:
+        category_id = subcategory.pop('category_id')
+        node = by_subcategory[subcategory['id']] = dict(subcategory, observations=[])
+        by_category[category_id]['subcategories'].append(node)
+    for observation in observations:
+        by_subcategory[observation.pop('subcategory_id')]['observations'].append(observation)
+    return list(by_category.values())
@@ -0,0 +1,42 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from djangoProject.views import CachedGraphQLView
+
+CATALOG_QUERY = '''
+query Catalog($subsidiaryId: ID) {
+  products(subsidiaryId: $subsidiaryId) { id code name alias price quantity laboratory }
+}
+'''
+
+
+class Command(BaseCommand):
+    help = 'Mide bytes y latencia de la consulta de catálogo con y sin ETag/compresión'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subsidiary', default=None)
+        parser.add_argument('--requests', type=int, default=50)
+
+    def handle(self, *args, **options):
+        view = CachedGraphQLView.as_view()
+        factory = RequestFactory()
+        params = {'query': CATALOG_QUERY, 'variables': json.dumps({'subsidiaryId': options['subsidiary']})}
+
+        def measure(label, **headers):
+            total_bytes, start = 0, time.perf_counter()
+            for _ in range(options['requests']):
+                response = view(factory.get('/graphql/', params, HTTP_ACCEPT='application/json', **headers))
+                total_bytes += len(response.content)
+            elapsed = (time.perf_counter() - start) / options['requests']
+            self.stdout.write(f'{label:<28} {response.status_code}  {total_bytes // options["requests"]:>9} bytes  '
+                              f'{elapsed * 1000:8.2f} ms')
+            return response
+
+        first = measure('sin cache ni compresión')
+        measure('gzip', HTTP_ACCEPT_ENCODING='gzip')
+        measure('brotli', HTTP_ACCEPT_ENCODING='br, gzip')
+        if first.has_header('ETag'):
+            measure('revalidación (304)', HTTP_IF_NONE_MATCH=first['ETag'], HTTP_ACCEPT_ENCODING='gzip')
@@ -0,0 +1,69 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.products import pricing
+
+
+class Command(BaseCommand):
+    help = 'Mide la compilación de reglas de precios y el cálculo de tickets con miles de reglas activas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rules', type=int, default=5000)
+        parser.add_argument('--products', type=int, default=20000)
+        parser.add_argument('--categories', type=int, default=200)
+        parser.add_argument('--lines', type=int, default=50)
+        parser.add_argument('--tickets', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        rows = list(self.rules(rng, now, options))
+        categories = {p: rng.randrange(options['categories']) for p in range(1, options['products'] + 1)}
+        base_prices = {p: Decimal(rng.randrange(100, 50000)) / 100 for p in categories}
+
+        started = time.perf_counter()
+        compiled = pricing.compile_rules(rows, now)
+        compile_ms = (time.perf_counter() - started) * 1000
+
+        timings = []
+        for _ in range(options['tickets']):
+            lines = [(p, categories[p], base_prices[p], rng.choice((1, 1, 1, 2, 3, 6, 12)))
+                     for p in rng.sample(range(1, options['products'] + 1), options['lines'])]
+            started = time.perf_counter()
+            compiled.price_lines(lines)
+            timings.append(time.perf_counter() - started)
+
+        timings.sort()
+        self.stdout.write(f'{compiled.rules} reglas activas de {len(rows)} compiladas en {compile_ms:.1f} ms')
+        self.stdout.write(f'Ticket de {options["lines"]} líneas: p50 {statistics.median(timings) * 1e6:.0f} µs, '
+                          f'p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f} µs')
+
+    @staticmethod
+    def rules(rng, now, options):
+        kinds = ('PRICE', 'PRICE', 'PERCENT', 'AMOUNT')
+        for n in range(options['rules']):
+            kind = rng.choice(kinds)
+            target = rng.random()
+            product_id = rng.randrange(1, options['products'] + 1) if target < 0.7 else None
+            category_id = rng.randrange(options['categories']) if product_id is None and target < 0.95 else None
+            windowed = rng.random() < 0.3
+            yield {
+                'id': n + 1,
+                'kind': kind,
+                'product_id': product_id,
+                'category_id': category_id,
+                'min_quantity': rng.choice((1, 1, 3, 6, 12)),
+                'value': (Decimal(rng.randrange(5, 30)) if kind == 'PERCENT' else
+                          Decimal(rng.randrange(50, 40000)) / 100),
+                'date_start': now - timedelta(days=rng.randrange(0, 10)) if windowed else None,
+                'date_end': now + timedelta(days=rng.randrange(1, 10)) if windowed else None,
+                'priority': rng.randrange(3),
+                'list_priority': rng.randrange(2),
+            }
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.products import sync
+
+
+class Command(BaseCommand):
+    help = ('Elimina las bajas del catálogo más antiguas que --days. Las terminales que no sincronizan desde '
+            'antes de esa fecha reciben fullResync y descargan el catálogo completo.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30)
+
+    def handle(self, *args, **options):
+        deleted = sync.prune(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'{deleted} bajas depuradas'))
@@ -1,11 +1,87 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 
 # Create your models here.
-from django.db import models
-# Create your models here.
 
 
-class Category(models.Model):
+class CatalogSequence(models.Model):
+    """Contador de versiones del catálogo por sucursal (0 = productos sin sucursal).
+
+    La fila queda bloqueada hasta el commit de quien la incrementa, así las
+    versiones se confirman en orden y una terminal que leyó la versión ``v``
+    ya puede ver todas las filas con versión menor o igual.
+    """
+    scope = models.IntegerField(primary_key=True)
+    value = models.BigIntegerField(default=0)
+    # Versión hasta la que se depuraron las bajas; una terminal más atrasada debe descargar todo
+    floor = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'CatalogSequence'
+
+    @staticmethod
+    def scope_for(subsidiary_id):
+        return subsidiary_id or 0
+
+    @classmethod
+    def next(cls, subsidiary_id):
+        """Siguiente versión de la sucursal; se llama dentro de la transacción que escribe."""
+        scope = cls.scope_for(subsidiary_id)
+        if not cls.objects.filter(scope=scope).update(value=F('value') + 1):
+            cls.objects.get_or_create(scope=scope)
+            cls.objects.filter(scope=scope).update(value=F('value') + 1)
+        return cls.objects.filter(scope=scope).values_list('value', flat=True).get()
+
+    @classmethod
+    def current(cls, subsidiary_id):
+        """``(última versión confirmada, piso de bajas)`` de la sucursal."""
+        row = cls.objects.filter(scope=cls.scope_for(subsidiary_id)).values_list('value', 'floor').first()
+        return row or (0, 0)
+
+
+class CatalogVersioned(models.Model):
+    """Modelos que las terminales sincronizan por versión (``productsChangedSince``)."""
+    version = models.BigIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    def catalog_subsidiary_id(self):
+        """Sucursal cuya secuencia versiona la fila; los modelos sin ``subsidiary`` la buscan en su padre."""
+        return self.subsidiary_id
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            if not self._state.adding:
+                # La fila antes que la secuencia, el mismo orden que las ventas y ``sync.stamp``
+                list(type(self)._base_manager.using(kwargs.get('using')).select_for_update()
+                     .filter(pk=self.pk).values_list('pk'))
+            self.version = CatalogSequence.next(self.catalog_subsidiary_id())
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'version'}
+            super().save(*args, **kwargs)
+
+
+class CatalogTombstone(models.Model):
+    """Baja de una fila del catálogo, para que las terminales la borren de su copia local."""
+    MODEL_CHOICES = (('product', 'PRODUCTO'), ('category', 'CATEGORIA'), ('subcategory', 'SUBCATEGORIA'),
+                     ('observation', 'OBSERVACION'))
+
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.IntegerField()
+    subsidiary_id = models.IntegerField(default=0)
+    version = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'CatalogTombstone'
+        indexes = [
+            models.Index(fields=['subsidiary_id', 'version']),
+        ]
+
+
+class Category(CatalogVersioned):
     id = models.AutoField(primary_key=True)
     subsidiary = models.ForeignKey('hrmn.Subsidiary', on_delete=models.CASCADE, related_name='category_subsidiary',
                                    blank=True, null=True)
@@ -19,9 +95,12 @@ class Category(models.Model):
 
     class Meta:
         db_table = 'Category'
+        indexes = [
+            models.Index(fields=['subsidiary', 'version']),
+        ]
 
 
-class SubCategory(models.Model):
+class SubCategory(CatalogVersioned):
     id = models.AutoField(primary_key=True)
     category = models.ForeignKey('Category', on_delete=models.CASCADE, related_name='subcategory_category', blank=True,
                                  null=True)
@@ -32,11 +111,17 @@ class SubCategory(models.Model):
     def __str__(self):
         return str(self.subcategory)
 
+    def catalog_subsidiary_id(self):
+        return Category.objects.filter(pk=self.category_id).values_list('subsidiary_id', flat=True).first()
+
     class Meta:
         db_table = 'SubCategory'
+        indexes = [
+            models.Index(fields=['version']),
+        ]
 
 
-class Observation(models.Model):
+class Observation(CatalogVersioned):
     id = models.AutoField(primary_key=True)
     observation = models.CharField('Observaciones', max_length=200, null=True, blank=True)
     subcategory = models.ForeignKey('SubCategory', on_delete=models.CASCADE, related_name='observation_subcategory',
@@ -46,11 +131,18 @@ class Observation(models.Model):
     def __str__(self):
         return str(self.observation)
 
+    def catalog_subsidiary_id(self):
+        return (SubCategory.objects.filter(pk=self.subcategory_id)
+                .values_list('category__subsidiary_id', flat=True).first())
+
     class Meta:
         db_table = 'Observation'
+        indexes = [
+            models.Index(fields=['version']),
+        ]
 
 
-class Product(models.Model):
+class Product(CatalogVersioned):
     id = models.AutoField(primary_key=True)
     code = models.CharField(max_length=100, null=True, blank=True)
     due_date = models.DateField(null=True, blank=True)
@@ -61,10 +153,66 @@ class Product(models.Model):
     purchase_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, )
     laboratory = models.CharField(max_length=100, null=True, blank=True)
     subsidiary = models.ForeignKey('hrmn.Subsidiary', on_delete=models.CASCADE, blank=True, null=True)
+    category = models.ForeignKey('Category', on_delete=models.SET_NULL, related_name='products', blank=True,
+                                 null=True)
 
     def __str__(self):
         return str(self.id)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['subsidiary', 'version']),
+        ]
+
+
+class PriceList(models.Model):
+    """Lista de precios de una sucursal; sin sucursal aplica a todas."""
+    id = models.AutoField(primary_key=True)
+    subsidiary = models.ForeignKey('hrmn.Subsidiary', on_delete=models.CASCADE, related_name='price_lists',
+                                   blank=True, null=True)
+    name = models.CharField(max_length=100)
+    priority = models.IntegerField(default=0)
+    is_enabled = models.BooleanField(default=True)
+
+    def __str__(self):
+        return str(self.name)
+
+    class Meta:
+        db_table = 'PriceList'
+
+
+class PriceRule(models.Model):
+    """Precio o descuento para un producto, una categoría o toda la lista.
+
+    PRICE fija el precio unitario desde ``min_quantity`` unidades (escalas por cantidad);
+    PERCENT y AMOUNT descuentan un porcentaje o un monto por unidad. Con fechas,
+    la regla solo vale dentro de esa ventana (ofertas).
+    """
+    KIND_CHOICES = (('PRICE', 'PRECIO'), ('PERCENT', 'DESCUENTO %'), ('AMOUNT', 'DESCUENTO MONTO'))
+
+    id = models.AutoField(primary_key=True)
+    price_list = models.ForeignKey('PriceList', on_delete=models.CASCADE, related_name='rules')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='PRICE')
+    product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='price_rules', blank=True,
+                                null=True)
+    category = models.ForeignKey('Category', on_delete=models.CASCADE, related_name='price_rules', blank=True,
+                                 null=True)
+    min_quantity = models.IntegerField(default=1)
+    value = models.DecimalField(max_digits=10, decimal_places=2)
+    date_start = models.DateTimeField(blank=True, null=True)
+    date_end = models.DateTimeField(blank=True, null=True)
+    priority = models.IntegerField(default=0)
+    is_enabled = models.BooleanField(default=True)
+
+    def __str__(self):
+        return f'{self.kind} {self.value}'
+
+    class Meta:
+        db_table = 'PriceRule'
+        indexes = [
+            models.Index(fields=['price_list', 'is_enabled']),
+        ]
+
 
 class UnitMeasure(models.Model):
     id = models.AutoField(primary_key=True)
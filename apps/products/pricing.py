@@ -0,0 +1,172 @@
+"""Precios de venta calculados en el servidor a partir de ``PriceRule``.
+
+Las reglas vigentes de una sucursal se compilan en diccionarios por producto,
+por categoría y para toda la lista, con las escalas ordenadas por cantidad.
+El resultado queda en memoria del proceso y se recompila cuando cambia la
+versión ``pricing``/``pricing:<sucursal>`` o cuando empieza o termina la
+ventana de alguna oferta.
+
+Cálculo de una línea:
+  1. Precio base del producto.
+  2. Regla PRICE más específica (producto, categoría, lista) con la mayor
+     ``min_quantity`` que no supere la cantidad; a igual escala gana la de
+     mayor prioridad.
+  3. Sobre ese precio se aplica el mejor descuento (PERCENT o AMOUNT) que
+     corresponda; los descuentos no se acumulan.
+"""
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from apps.products.models import PriceRule
+from djangoProject import versions
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+HUNDRED = Decimal('100')
+ALL = ('*',)
+CHECK_INTERVAL = getattr(settings, 'PRICING_VERSION_CHECK_INTERVAL', 1.0)
+
+RULE_FIELDS = ('id', 'kind', 'product_id', 'category_id', 'min_quantity', 'value', 'date_start', 'date_end',
+               'priority')
+
+
+class CompiledPricing:
+    __slots__ = ('prices', 'discounts', 'valid_until', 'rules')
+
+    def __init__(self, prices, discounts, valid_until, rules):
+        self.prices = prices
+        self.discounts = discounts
+        self.valid_until = valid_until
+        self.rules = rules
+
+    def unit_price(self, product_id, category_id, base_price, quantity):
+        price = base_price
+        for key in (('p', product_id), ('c', category_id), ALL):
+            breaks = self.prices.get(key)
+            if breaks:
+                found = next((value for min_quantity, value in breaks if min_quantity <= quantity), None)
+                if found is not None:
+                    price = found
+                    break
+
+        best = price
+        for key in (('p', product_id), ('c', category_id), ALL):
+            for min_quantity, percent, amount in self.discounts.get(key, ()):
+                if min_quantity <= quantity:
+                    if percent:
+                        best = min(best, price * (HUNDRED - percent) / HUNDRED)
+                    if amount:
+                        best = min(best, price - amount)
+                    break
+        return max(best, ZERO).quantize(CENT, rounding=ROUND_HALF_UP)
+
+    def price_lines(self, lines):
+        """``lines`` son ``(product_id, category_id, precio_base, cantidad)``; devuelve ``(unitario, total)``."""
+        result = []
+        for product_id, category_id, base_price, quantity in lines:
+            unit = self.unit_price(product_id, category_id, base_price, quantity)
+            result.append((unit, unit * quantity))
+        return result
+
+
+def _key(row):
+    if row['product_id'] is not None:
+        return 'p', row['product_id']
+    if row['category_id'] is not None:
+        return 'c', row['category_id']
+    return ALL
+
+
+def compile_rules(rows, now):
+    """Compila filas con ``RULE_FIELDS`` más ``list_priority`` vigentes en ``now``."""
+    best_prices = {}
+    discounts = defaultdict(lambda: defaultdict(lambda: [ZERO, ZERO]))
+    valid_until = None
+    count = 0
+    for row in rows:
+        start, end = row['date_start'], row['date_end']
+        for boundary in (start, end):
+            if boundary is not None and boundary > now and (valid_until is None or boundary < valid_until):
+                valid_until = boundary
+        if (start is not None and start > now) or (end is not None and end <= now):
+            continue
+
+        count += 1
+        key = _key(row)
+        if row['kind'] == 'PRICE':
+            slot = (key, row['min_quantity'])
+            rank = (row['list_priority'], row['priority'], row['id'])
+            if slot not in best_prices or rank > best_prices[slot][0]:
+                best_prices[slot] = (rank, row['value'])
+        else:
+            best = discounts[key][row['min_quantity']]
+            position = 0 if row['kind'] == 'PERCENT' else 1
+            best[position] = max(best[position], row['value'])
+
+    prices = defaultdict(list)
+    for (key, min_quantity), (_, value) in best_prices.items():
+        prices[key].append((min_quantity, value))
+    return CompiledPricing(
+        {key: tuple(sorted(breaks, key=lambda b: -b[0])) for key, breaks in prices.items()},
+        {key: _cumulative_discounts(by_quantity) for key, by_quantity in discounts.items()},
+        valid_until,
+        count,
+    )
+
+
+def _cumulative_discounts(by_quantity):
+    """Por cada escala, el mejor porcentaje y el mejor monto aplicables desde esa cantidad.
+
+    Queda ordenado de mayor a menor escala: la primera que no supera la cantidad ya
+    resume todas las menores, así cada línea evalúa solo dos descuentos por nivel.
+    """
+    result, percent, amount = [], ZERO, ZERO
+    for min_quantity in sorted(by_quantity):
+        percent = max(percent, by_quantity[min_quantity][0])
+        amount = max(amount, by_quantity[min_quantity][1])
+        result.append((min_quantity, percent, amount))
+    return tuple(reversed(result))
+
+
+def load_rules(subsidiary_id, now):
+    """Reglas habilitadas de las listas de la sucursal y de las generales, sin las ya vencidas."""
+    lists = Q(price_list__subsidiary__isnull=True)
+    if subsidiary_id is not None:
+        lists |= Q(price_list__subsidiary_id=subsidiary_id)
+    return (PriceRule.objects.filter(lists, is_enabled=True, price_list__is_enabled=True)
+            .exclude(date_end__lte=now)
+            .values(*RULE_FIELDS, list_priority=F('price_list__priority'))
+            .iterator())
+
+
+def version_names(subsidiary_id):
+    return ['pricing', f'pricing:{subsidiary_id}']
+
+
+_compiled = {}
+_lock = threading.Lock()
+
+
+def get_pricing(subsidiary_id, now=None):
+    """Reglas compiladas de la sucursal; la versión se consulta como mucho cada ``CHECK_INTERVAL`` s."""
+    now = now or timezone.now()
+    entry = _compiled.get(subsidiary_id)
+    fresh = entry is not None and (entry[2].valid_until is None or now < entry[2].valid_until)
+    if fresh and time.monotonic() - entry[1] < CHECK_INTERVAL:
+        return entry[2]
+
+    current = versions.get_versions(version_names(subsidiary_id))
+    if fresh and entry[0] == current:
+        entry[1] = time.monotonic()
+        return entry[2]
+
+    with _lock:
+        compiled = compile_rules(load_rules(subsidiary_id, now), now)
+        _compiled[subsidiary_id] = [current, time.monotonic(), compiled]
+    return compiled
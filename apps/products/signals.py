@@ -0,0 +1,74 @@
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from apps.products.models import Product, Category, SubCategory, Observation, PriceList, PriceRule
+from apps.products import sync
+from djangoProject import versions
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    versions.bump('product', f'product:{instance.subsidiary_id}')
+
+
+# Campo que enlaza cada fila del árbol con su dueño (sucursal, categoría o subcategoría)
+PARENT_FIELDS = {Category: 'subsidiary_id', SubCategory: 'category_id', Observation: 'subcategory_id'}
+
+
+def _owner_subsidiaries(sender, parent_ids):
+    parent_ids = {parent_id for parent_id in parent_ids if parent_id is not None}
+    if sender is Category or not parent_ids:
+        return parent_ids
+    if sender is SubCategory:
+        return set(Category.objects.filter(pk__in=parent_ids).values_list('subsidiary_id', flat=True))
+    return set(SubCategory.objects.filter(pk__in=parent_ids).values_list('category__subsidiary_id', flat=True))
+
+
+@receiver(post_init, sender=Category)
+@receiver(post_init, sender=SubCategory)
+@receiver(post_init, sender=Observation)
+def category_loaded(sender, instance, **kwargs):
+    # Dueño con el que se cargó la fila; __dict__ para no consultar un campo diferido
+    instance._loaded_parent = instance.__dict__.get(PARENT_FIELDS[sender])
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=SubCategory)
+@receiver([post_save, post_delete], sender=Observation)
+def category_changed(sender, instance, **kwargs):
+    # El árbol del menú se cachea por sucursal: se invalida la del dueño actual y la del anterior si cambió
+    field = PARENT_FIELDS[sender]
+    current = getattr(instance, field)
+    subsidiaries = _owner_subsidiaries(sender, {current, getattr(instance, '_loaded_parent', None)})
+    instance._loaded_parent = current
+    versions.bump('category', *[f'category:{subsidiary_id}' for subsidiary_id in sorted(subsidiaries - {None})])
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=SubCategory)
+@receiver(post_delete, sender=Observation)
+def catalog_row_deleted(sender, instance, **kwargs):
+    # Corre dentro de la transacción del borrado; en cascada los padres todavía existen
+    sync.tombstone(sender.__name__.lower(), instance.pk, instance.catalog_subsidiary_id())
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    # SET_NULL en Product.category es un UPDATE sin save(): se versionan aquí los productos afectados
+    sync.stamp_products(Product.objects.filter(category=instance))
+
+
+def _pricing_version(subsidiary_id):
+    return f'pricing:{subsidiary_id}' if subsidiary_id is not None else 'pricing'
+
+
+@receiver([post_save, post_delete], sender=PriceList)
+def price_list_changed(sender, instance, **kwargs):
+    versions.bump(_pricing_version(instance.subsidiary_id))
+
+
+@receiver([post_save, post_delete], sender=PriceRule)
+def price_rule_changed(sender, instance, **kwargs):
+    subsidiary_id = PriceList.objects.filter(pk=instance.price_list_id).values_list('subsidiary_id', flat=True).first()
+    versions.bump(_pricing_version(subsidiary_id))
@@ -0,0 +1,126 @@
+"""Sincronización incremental del catálogo para las terminales.
+
+Cada escritura de ``Product``, ``Category``, ``SubCategory`` u ``Observation``
+toma la siguiente versión de ``CatalogSequence`` de su sucursal; las bajas
+dejan un ``CatalogTombstone``. Una terminal guarda la última versión que vio
+y con ``changes_since`` recibe solo lo cambiado desde entonces.
+
+Los UPDATE masivos (stock de ventas, compras y anulaciones) no pasan por
+``save``: llaman a ``stamp``, que versiona los productos en una transacción
+corta propia después del commit. La fila de ``CatalogSequence`` queda
+bloqueada hasta el commit de quien la incrementa; si la tomara la venta,
+todas las ventas de la sucursal esperarían una por otra hasta terminar.
+Si el proceso cae entre el commit y el sellado, esos productos conservan su
+versión anterior hasta el próximo cambio y las terminales no ven ese stock.
+
+El orden de bloqueos es siempre productos primero y secuencia al final.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, When, F, Value, Max
+from django.utils import timezone
+
+from apps.products.models import CatalogSequence, CatalogTombstone, Product, Category, SubCategory, Observation
+
+logger = logging.getLogger(__name__)
+
+MAX_CHANGES = 1000
+
+
+def version_case(subsidiaries):
+    """Expresión para ``update(version=...)``: una versión nueva para cada sucursal de ``subsidiaries``."""
+    whens = []
+    # Mismo orden siempre para no cruzar bloqueos entre sucursales
+    for subsidiary_id in sorted(set(subsidiaries), key=CatalogSequence.scope_for):
+        version = CatalogSequence.next(subsidiary_id)
+        condition = {'subsidiary__isnull': True} if subsidiary_id is None else {'subsidiary_id': subsidiary_id}
+        whens.append(When(**condition, then=Value(version)))
+    return Case(*whens, default=F('version'))
+
+
+def stamp_products(products):
+    """Versión nueva para los productos de ``products``: primero los bloquea en orden de id, como
+    ``stock.lock_products``, y recién después toma la secuencia."""
+    rows = dict(products.select_for_update().order_by('id').values_list('id', 'subsidiary_id'))
+    if rows:
+        Product.objects.filter(id__in=rows).update(version=version_case(rows.values()))
+
+
+def stamp(product_ids):
+    """Fija una versión nueva a los productos cuando la transacción actual hace commit (ver arriba)."""
+    product_ids = sorted(set(product_ids))
+    if product_ids:
+        transaction.on_commit(lambda: _stamp_committed(product_ids))
+
+
+def _stamp_committed(product_ids):
+    try:
+        with transaction.atomic():
+            stamp_products(Product.objects.filter(id__in=product_ids))
+    except Exception:
+        # La venta ya se confirmó: un fallo aquí no debe devolverla como error
+        logger.exception('No se pudo versionar los productos %s', product_ids)
+
+
+def tombstone(model, object_id, subsidiary_id):
+    return CatalogTombstone.objects.create(model=model, object_id=object_id,
+                                           subsidiary_id=CatalogSequence.scope_for(subsidiary_id),
+                                           version=CatalogSequence.next(subsidiary_id))
+
+
+def _page(queryset, version, limit):
+    """Hasta ``limit`` filas con versión mayor a ``version`` sin cortar un grupo de la misma versión."""
+    rows = list(queryset.filter(version__gt=version).order_by('version', 'id')[:limit + 1])
+    if len(rows) <= limit:
+        return rows, False
+    boundary = rows[limit].version
+    rows = [row for row in rows if row.version < boundary]
+    if not rows:
+        # Un solo UPDATE masivo con más filas que el límite: se entrega completo
+        rows = list(queryset.filter(version=boundary).order_by('id'))
+    return rows, True
+
+
+def changes_since(subsidiary_id, version, limit=MAX_CHANGES):
+    """Cambios del catálogo de la sucursal después de ``version``.
+
+    Devuelve un diccionario con productos, categorías, subcategorías y
+    observaciones cambiados, las bajas, la nueva versión y si quedan más.
+    ``full_resync`` indica que la terminal está por debajo de las bajas
+    depuradas y debe descargar todo el catálogo. La carga inicial se pide con
+    ``version=-1`` (las filas anteriores a esta columna tienen versión 0) y
+    nunca pide resincronizar: trae el catálogo completo.
+    """
+    current, floor = CatalogSequence.current(subsidiary_id)
+    if 0 <= version < floor:
+        return {'products': [], 'categories': [], 'subcategories': [], 'observations': [], 'deleted': [],
+                'version': current, 'has_more': False, 'full_resync': True}
+
+    products, has_more = _page(Product.objects.filter(subsidiary_id=subsidiary_id), version, limit)
+    # Con más páginas por venir se llega hasta la última versión entregada; si no, hasta la confirmada
+    high = products[-1].version if has_more else current
+    window = {'version__gt': version, 'version__lte': high}
+    return {
+        'products': products,
+        'categories': list(Category.objects.filter(subsidiary_id=subsidiary_id, **window)),
+        'subcategories': list(SubCategory.objects.filter(category__subsidiary_id=subsidiary_id, **window)),
+        'observations': list(Observation.objects.filter(subcategory__category__subsidiary_id=subsidiary_id,
+                                                        **window)),
+        'deleted': list(CatalogTombstone.objects.filter(subsidiary_id=CatalogSequence.scope_for(subsidiary_id),
+                                                        **window).values('model', 'object_id')),
+        'version': high,
+        'has_more': has_more,
+        'full_resync': False,
+    }
+
+
+def prune(days):
+    """Depura bajas de más de ``days`` días y sube el piso de cada sucursal; devuelve cuántas borró."""
+    old = CatalogTombstone.objects.filter(deleted_at__lt=timezone.now() - timedelta(days=days))
+    floors = dict(old.values('subsidiary_id').annotate(top=Max('version')).values_list('subsidiary_id', 'top'))
+    deleted, _ = old.delete()
+    for scope, top in floors.items():
+        CatalogSequence.objects.filter(scope=scope, floor__lt=top).update(floor=top)
+    return deleted
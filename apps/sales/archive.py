@@ -0,0 +1,185 @@
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import BooleanField, Count, Q, Sum, Value
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from apps.sales.models import (Sales, DetailSales, Payment, Operation, SalesArchive, DetailSalesArchive,
+                               PaymentArchive, SalesMonthlySummary)
+from djangoProject import versions
+
+SALE_FIELDS = ('id', 'date_creation', 'date_cancel', 'employee_creation_id', 'employee_cancel_id', 'type_receipt',
+               'type_pay', 'total', 'provider_id', 'subsidiary_id', 'serie', 'number', 'billing_status')
+DETAIL_FIELDS = ('id', 'sale_id', 'product_id', 'quantity', 'quantity_cancel', 'price', 'subtotal', 'total',
+                 'observation')
+PAYMENT_FIELDS = ('id', 'subsidiary_id', 'cash_id', 'sale_id', 'purchase_id', 'payment_type', 'payment_method',
+                  'status', 'payment_date', 'due_date', 'total_amount', 'paid_amount', 'reference_number', 'notes',
+                  'user_id', 'is_active', 'created_at', 'updated_at')
+
+
+def month_start(value):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1)
+
+
+def archivable_sales(cutoff):
+    """Ventas anteriores a ``cutoff`` cuyos pagos pertenecen a cajas ya cerradas."""
+    return (Sales.objects.filter(date_creation__lt=cutoff)
+            .exclude(payments__cash__status='A')
+            .exclude(billing_status__in=('PENDING', 'SENDING')))
+
+
+def archive_batch(cutoff, batch_size):
+    """Mueve un lote a las tablas de archivo en una transacción corta.
+
+    Devuelve ``(cantidad, meses)`` con los meses (subsidiary_id, primer día) afectados.
+    """
+    with transaction.atomic():
+        ids = list(archivable_sales(cutoff).order_by('id').values_list('id', flat=True).distinct()[:batch_size])
+        if not ids:
+            return 0, set()
+        # Las ventas que otra transacción tiene bloqueadas se toman en una pasada posterior
+        ids = list(Sales.objects.select_for_update(skip_locked=True).filter(id__in=ids).values_list('id', flat=True))
+        if not ids:
+            return 0, set()
+
+        sales = list(Sales.objects.filter(id__in=ids).values(*SALE_FIELDS))
+        SalesArchive.objects.bulk_create([SalesArchive(**row) for row in sales], ignore_conflicts=True)
+        DetailSalesArchive.objects.bulk_create(
+            [DetailSalesArchive(**row) for row in DetailSales.objects.filter(sale_id__in=ids).values(*DETAIL_FIELDS)],
+            ignore_conflicts=True,
+        )
+        PaymentArchive.objects.bulk_create(
+            [PaymentArchive(**row) for row in Payment.objects.filter(sale_id__in=ids).values(*PAYMENT_FIELDS)],
+            ignore_conflicts=True,
+        )
+
+        # Los movimientos de almacén se conservan; solo pierden el enlace al detalle archivado.
+        Operation.objects.filter(detail_order__sale_id__in=ids).update(detail_order=None)
+        Payment.objects.filter(sale_id__in=ids).delete()
+        DetailSales.objects.filter(sale_id__in=ids).delete()
+        Sales.objects.filter(id__in=ids).delete()
+
+    months = {(row['subsidiary_id'], month_start(timezone.localtime(row['date_creation'])).date()) for row in sales}
+    return len(ids), months
+
+
+def refresh_summary(subsidiary_id, month):
+    """Recalcula el resumen de un mes a partir de las tablas de archivo."""
+    start = timezone.make_aware(datetime.combine(month, datetime.min.time()))
+    end = add_months(start, 1)
+    archived = SalesArchive.objects.filter(subsidiary_id=subsidiary_id, date_creation__gte=start,
+                                           date_creation__lt=end)
+
+    rows = archived.values('type_receipt').annotate(
+        sales_count=Count('id'),
+        cancelled_count=Count('id', filter=Q(date_cancel__isnull=False)),
+        total=Sum('total'),
+    )
+    for row in rows:
+        sale_ids = archived.filter(type_receipt=row['type_receipt']).values('id')
+        items = DetailSalesArchive.objects.filter(sale_id__in=sale_ids).aggregate(q=Sum('quantity'))['q'] or 0
+        payments = (PaymentArchive.objects.filter(sale_id__in=sale_ids, status='PAID')
+                    .values('payment_method').annotate(total=Sum('paid_amount')))
+        SalesMonthlySummary.objects.update_or_create(
+            subsidiary_id=subsidiary_id,
+            month=month,
+            type_receipt=row['type_receipt'],
+            defaults={
+                'sales_count': row['sales_count'],
+                'cancelled_count': row['cancelled_count'],
+                'total': row['total'] or Decimal('0.00'),
+                'items_quantity': items,
+                'payments_by_method': {p['payment_method']: str(p['total']) for p in payments},
+            },
+        )
+    versions.bump(f'sales:{subsidiary_id}')
+
+
+def archive(cutoff, batch_size=500, pause=0.1, log=None):
+    """Archiva todas las ventas anteriores a ``cutoff`` en lotes acotados."""
+    total, months = 0, set()
+    while True:
+        moved, batch_months = archive_batch(cutoff, batch_size)
+        if not moved:
+            break
+        total += moved
+        months |= batch_months
+        if log:
+            log(f'{total} ventas archivadas')
+        if pause:
+            time.sleep(pause)
+
+    for subsidiary_id, month in sorted(months, key=lambda m: (m[0] or 0, m[1])):
+        refresh_summary(subsidiary_id, month)
+    return total, months
+
+
+def sales_between(subsidiary_id, date_from, date_to):
+    """Ventas de la tabla activa y del archivo en un solo resultado ordenado por fecha."""
+    hot = (Sales.objects.filter(subsidiary_id=subsidiary_id, date_creation__gte=date_from,
+                                date_creation__lt=date_to)
+           .annotate(archived=Value(False, output_field=BooleanField()))
+           .values(*SALE_FIELDS, 'archived'))
+    cold = (SalesArchive.objects.filter(subsidiary_id=subsidiary_id, date_creation__gte=date_from,
+                                        date_creation__lt=date_to)
+            .annotate(archived=Value(True, output_field=BooleanField()))
+            .values(*SALE_FIELDS, 'archived'))
+    return hot.union(cold, all=True).order_by('date_creation', 'id')
+
+
+def _local(value):
+    return timezone.localtime(value) if timezone.is_aware(value) else value
+
+
+def _by_month(queryset, date_from, date_to):
+    return (queryset.filter(date_creation__gte=date_from, date_creation__lt=date_to)
+            .annotate(month=TruncMonth('date_creation')).values('month', 'type_receipt')
+            .annotate(sales_count=Count('id'), total=Sum('total')))
+
+
+def monthly_totals(subsidiary_id, date_from, date_to):
+    """Totales mensuales: resúmenes para los meses archivados y agregación para los activos.
+
+    Los resúmenes solo cuentan para los meses que el rango cubre completos; lo
+    archivado de un mes cortado por ``date_from`` o ``date_to`` se agrega desde
+    el archivo.
+    """
+    result = {}
+
+    def add(month, type_receipt, sales_count, total):
+        month = month.date() if isinstance(month, datetime) else month
+        entry = result.setdefault((month, type_receipt), {'sales_count': 0, 'total': Decimal('0.00')})
+        entry['sales_count'] += sales_count
+        entry['total'] += total or Decimal('0.00')
+
+    # Meses completos: desde el primero que empieza en date_from o después hasta el que contiene date_to
+    first = month_start(_local(date_from))
+    if first < date_from:
+        first = add_months(first, 1)
+    last = month_start(_local(date_to))
+    edges = [(date_from, date_to)]
+    if first < last:
+        for row in SalesMonthlySummary.objects.filter(subsidiary_id=subsidiary_id, month__gte=first.date(),
+                                                      month__lt=last.date()):
+            add(row.month, row.type_receipt, row.sales_count, row.total)
+        edges = [(date_from, first), (last, date_to)]
+
+    archived = SalesArchive.objects.filter(subsidiary_id=subsidiary_id)
+    for start, end in edges:
+        if start < end:
+            for row in _by_month(archived, start, end):
+                add(row['month'], row['type_receipt'], row['sales_count'], row['total'])
+
+    for row in _by_month(Sales.objects.filter(subsidiary_id=subsidiary_id), date_from, date_to):
+        add(row['month'], row['type_receipt'], row['sales_count'], row['total'])
+
+    return [dict(month=month, type_receipt=type_receipt, **values)
+            for (month, type_receipt), values in sorted(result.items())]
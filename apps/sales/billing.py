@@ -0,0 +1,229 @@
+import http.client
+import json
+import queue
+import random
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+
+from apps.sales.models import Sales, DetailSales
+
+BILLABLE_RECEIPTS = ('B', 'F')
+
+BATCH_SIZE = getattr(settings, 'BILLING_BATCH_SIZE', 50)
+MAX_PER_COMPANY = getattr(settings, 'BILLING_MAX_CONCURRENCY_PER_COMPANY', 4)
+MAX_ATTEMPTS = getattr(settings, 'BILLING_MAX_ATTEMPTS', 8)
+BACKOFF_BASE = getattr(settings, 'BILLING_BACKOFF_BASE', 5)  # segundos
+BACKOFF_MAX = getattr(settings, 'BILLING_BACKOFF_MAX', 3600)
+TIMEOUT = getattr(settings, 'BILLING_TIMEOUT', 15)
+LEASE = timedelta(seconds=getattr(settings, 'BILLING_LEASE', 300))
+
+
+def is_billable(sale):
+    company = sale.subsidiary.company if sale.subsidiary else None
+    return bool(company and company.billing_top and company.url and sale.type_receipt in BILLABLE_RECEIPTS)
+
+
+def backoff_delay(attempts):
+    """Espera exponencial con jitter para el reintento número ``attempts``."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** max(attempts - 1, 0)))
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def build_document(sale):
+    """Arma el comprobante electrónico a partir de la venta, sus detalles y el cliente."""
+    company = sale.subsidiary.company
+    igv_rate = Decimal(company.igv or 18) / Decimal('100')
+    total = sale.total or Decimal('0.00')
+    taxable = (total / (1 + igv_rate)).quantize(Decimal('0.01'))
+    client = sale.provider
+
+    return {
+        'ruc': company.ruc,
+        'type_receipt': sale.type_receipt,
+        'serie': sale.serie,
+        'number': sale.number,
+        'date': sale.date_creation.isoformat() if sale.date_creation else None,
+        'type_pay': sale.type_pay,
+        'client': {
+            'type_document': client.typeDocument,
+            'n_document': client.nDocument,
+            'name': client.name,
+            'address': client.address,
+        } if client else None,
+        'items': [
+            {
+                'code': detail.product.code if detail.product else None,
+                'description': detail.product.name if detail.product else None,
+                'quantity': detail.quantity,
+                'price': str(detail.price),
+                'subtotal': str(detail.subtotal),
+                'total': str(detail.total),
+            }
+            for detail in sale.detailsales_set.all()
+        ],
+        'taxable': str(taxable),
+        'igv': str(total - taxable),
+        'total': str(total),
+    }
+
+
+class ConnectionPool:
+    """Pool de conexiones HTTP persistentes por host."""
+
+    def __init__(self, timeout=TIMEOUT):
+        self.timeout = timeout
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _new(self, scheme, netloc):
+        cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return cls(netloc, timeout=self.timeout)
+
+    def post(self, url, body, headers):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        with self._lock:
+            pool = self._pools.setdefault(key, queue.LifoQueue())
+        try:
+            conn = pool.get_nowait()
+        except queue.Empty:
+            conn = self._new(*key)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        try:
+            conn.request('POST', path, body=body, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except Exception:
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            pool.put(conn)
+        return response.status, data
+
+    def close(self):
+        for pool in self._pools.values():
+            while not pool.empty():
+                pool.get_nowait().close()
+
+
+def send_document(pool, company, document):
+    """Envía un comprobante; devuelve ``(estado, mensaje)`` con estado SENT, REJECTED o RETRY."""
+    body = json.dumps(document).encode('utf-8')
+    headers = {
+        'Content-Type': 'application/json',
+        'Authorization': f'Bearer {company.token or ""}',
+        'Connection': 'keep-alive',
+    }
+    try:
+        status, data = pool.post(company.url, body, headers)
+    except (OSError, http.client.HTTPException) as e:
+        return 'RETRY', str(e)
+    message = data.decode('utf-8', 'replace')[:1000]
+    if 200 <= status < 300:
+        return 'SENT', message
+    if status == 429 or status >= 500:
+        return 'RETRY', f'HTTP {status}: {message}'
+    return 'REJECTED', f'HTTP {status}: {message}'
+
+
+def claim_batch(batch_size=BATCH_SIZE):
+    """Marca como SENDING un lote de ventas pendientes; varios workers no toman las mismas.
+
+    Las ventas que quedaron en SENDING por un worker caído se retoman al vencer su plazo.
+    """
+    now = timezone.now()
+    due = Q(billing_next_attempt__isnull=True) | Q(billing_next_attempt__lte=now)
+    with transaction.atomic():
+        ids = list(
+            Sales.objects.select_for_update(skip_locked=True)
+            .filter(Q(billing_status='PENDING') & due | Q(billing_status='SENDING', billing_next_attempt__lte=now))
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        Sales.objects.filter(id__in=ids).update(billing_status='SENDING', billing_next_attempt=now + LEASE)
+    return list(
+        Sales.objects.filter(id__in=ids)
+        .select_related('subsidiary__company', 'provider')
+        .prefetch_related(Prefetch('detailsales_set', queryset=DetailSales.objects.select_related('product')))
+    )
+
+
+def _record(sale, status, message):
+    now = timezone.now()
+    attempts = sale.billing_attempts + 1
+    fields = {'billing_attempts': attempts, 'billing_error': None}
+    if status == 'SENT':
+        fields.update(billing_status='SENT', billing_date=now)
+    elif status == 'RETRY' and attempts < MAX_ATTEMPTS:
+        fields.update(billing_status='PENDING', billing_next_attempt=now + backoff_delay(attempts),
+                      billing_error=message)
+    else:
+        fields.update(billing_status='REJECTED' if status == 'REJECTED' else 'FAILED', billing_error=message)
+    Sales.objects.filter(pk=sale.pk).update(**fields)
+    return fields['billing_status']
+
+
+def process_batch(pool, executor, batch_size=BATCH_SIZE, max_per_company=MAX_PER_COMPANY):
+    """Envía un lote respetando el límite de envíos simultáneos por empresa.
+
+    Los hilos del executor solo hacen HTTP (el lote llega con sus relaciones
+    cargadas); los resultados se graban desde este hilo, así los hilos no
+    abren conexiones a la base que después nadie cierra.
+    """
+    sales = claim_batch(batch_size)
+    limits = {}
+    counts = defaultdict(int)
+
+    def submit(sale):
+        company = sale.subsidiary.company
+        with limits[company.id]:
+            try:
+                return send_document(pool, company, build_document(sale))
+            except Exception as e:
+                return 'RETRY', str(e)
+
+    for sale in sales:
+        limits.setdefault(sale.subsidiary.company_id, threading.BoundedSemaphore(max_per_company))
+    for sale, (status, message) in zip(sales, executor.map(submit, sales)):
+        counts[_record(sale, status, message)] += 1
+    return len(sales), dict(counts)
+
+
+def mark_pending(sale):
+    """Deja la venta en cola de facturación; el worker la envía después del commit."""
+    if is_billable(sale):
+        sale.billing_status = 'PENDING'
+        sale.billing_next_attempt = None
+        Sales.objects.filter(pk=sale.pk).update(billing_status='PENDING', billing_next_attempt=None)
+
+
+def run(batch_size=BATCH_SIZE, workers=16, once=False, idle_sleep=2, stop_event=None):
+    """Bucle del worker de facturación."""
+    from django.db import connections
+
+    pool = ConnectionPool()
+    stop_event = stop_event or threading.Event()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while not stop_event.is_set():
+                processed, _ = process_batch(pool, executor, batch_size)
+                if once:
+                    break
+                if not processed:
+                    stop_event.wait(idle_sleep)
+    finally:
+        pool.close()
+        connections.close_all()
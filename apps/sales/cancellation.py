@@ -0,0 +1,215 @@
+"""Anulación de ventas, completas o por líneas.
+
+``cancel`` recibe un lote de ventas y lo resuelve en una transacción con un
+número fijo de sentencias por lote (no por ticket):
+
+  * el stock vuelve con un UPDATE por ``Product`` y uno por almacén afectado;
+  * ``DetailSales.quantity_cancel`` se acumula en un solo UPDATE;
+  * cada salida de almacén recibe su ENTRADA de reversa (``reference``);
+  * los pagos de cajas abiertas pasan a CANCELLED; si la caja ya cerró, o la
+    anulación es parcial, la devolución se registra como un pago ADJUST
+    negativo en la caja abierta de la sucursal;
+  * ``Cash.totalSales`` se descuenta en un solo UPDATE para todas las cajas;
+  * los acumulados de cada cliente (``client_stats``) se descuentan.
+
+Una venta queda anulada (``date_cancel``) cuando ya no le quedan unidades
+pendientes.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, When, F, Value, IntegerField, DecimalField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.hrmn.models import Warehouse
+from apps.products import sync
+from apps.sales import stock, outbox, client_stats
+from apps.sales.models import Sales, DetailSales, Operation, Payment, Cash
+from djangoProject import broadcast, versions
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+MAX_SALES = 500
+
+
+class CancellationError(Exception):
+    pass
+
+
+def cancel(requests, employee=None, user=None, date=None):
+    """Anula ``requests``: ``{sale_id: {detail_id: cantidad}}``, o ``None`` para todo lo pendiente.
+
+    Se llama dentro de ``transaction.atomic``; cualquier ``CancellationError`` deja el lote sin cambios.
+    Devuelve las ventas actualizadas.
+    """
+    if not requests:
+        raise CancellationError('Debe indicar al menos una venta')
+    if len(requests) > MAX_SALES:
+        raise CancellationError(f'No se pueden anular más de {MAX_SALES} ventas a la vez')
+    date = date or timezone.now()
+
+    sales = {s.id: s for s in Sales.objects.select_for_update().filter(id__in=requests).order_by('id')}
+    for sale_id in requests:
+        sale = sales.get(sale_id)
+        if sale is None:
+            raise CancellationError(f"Venta '{sale_id}' no encontrada")
+        if sale.date_cancel is not None:
+            raise CancellationError(f'La venta {sale.serie}-{sale.number} ya está anulada')
+
+    lines, fully_cancelled, amounts = _lines(sales, requests)
+    _restore_stock(sales, lines, date)
+    DetailSales.objects.filter(id__in=[line[0] for line in lines]).update(quantity_cancel=Case(
+        *[When(id=detail_id, then=Coalesce(F('quantity_cancel'), Value(0)) + Value(quantity))
+          for detail_id, _, _, quantity, _ in lines],
+        default=F('quantity_cancel'),
+        output_field=IntegerField(),
+    ))
+    if fully_cancelled:
+        Sales.objects.filter(id__in=fully_cancelled).update(date_cancel=date, employee_cancel=employee)
+    cashes = _reverse_payments(sales, fully_cancelled, amounts, user)
+
+    for sale_id in fully_cancelled:
+        sales[sale_id].date_cancel, sales[sale_id].employee_cancel = date, employee
+    lines_by_sale = defaultdict(list)
+    for line in lines:
+        lines_by_sale[line[1]].append(line)
+    cancelled = [(sales[sale_id], sale_id in fully_cancelled, amounts[sale_id], lines_by_sale[sale_id])
+                 for sale_id in sorted(amounts)]
+    outbox.sales_cancelled(cancelled)
+    client_stats.record_cancellations(cancelled)
+    # La versión de catálogo se toma después del commit
+    sync.stamp({line[2] for line in lines})
+    subsidiaries = {s.subsidiary_id for s in sales.values()}
+    versions.bump('sales', 'payment', 'cash', *{f'sales:{sub}' for sub in subsidiaries},
+                  *{f'payment:{sub}' for sub in subsidiaries}, *{f'cash:{c.id}' for c in cashes})
+    for cash in cashes:
+        broadcast.notify_cash(cash, 'CANCEL')
+    return list(sales.values())
+
+
+def _lines(sales, requests):
+    """Cantidades a anular por detalle: ``(detail_id, sale_id, product_id, cantidad, precio)``."""
+    rows = (DetailSales.objects.filter(sale_id__in=sales)
+            .values_list('id', 'sale_id', 'product_id', 'quantity', 'quantity_cancel', 'price'))
+    wanted = {sale_id: dict(lines) if lines is not None else None for sale_id, lines in requests.items()}
+    lines, pending_after, amounts = [], defaultdict(int), defaultdict(lambda: ZERO)
+    for detail_id, sale_id, product_id, quantity, cancelled, price in rows:
+        pending = (quantity or 0) - (cancelled or 0)
+        requested = wanted[sale_id]
+        amount = pending if requested is None else requested.pop(detail_id, 0)
+        if amount < 0 or amount > pending:
+            raise CancellationError(f'Cantidad a anular inválida en el detalle {detail_id}: pendiente {pending}, '
+                                    f'solicitado {amount}')
+        pending_after[sale_id] += pending - amount
+        if amount:
+            lines.append((detail_id, sale_id, product_id, amount, price))
+            amounts[sale_id] += price * amount
+
+    for sale_id, requested in wanted.items():
+        if requested:
+            raise CancellationError(f"El detalle '{min(requested)}' no pertenece a la venta '{sale_id}'")
+        if sale_id not in amounts:
+            sale = sales[sale_id]
+            raise CancellationError(f'La venta {sale.serie}-{sale.number} no tiene unidades por anular')
+    fully_cancelled = {sale_id for sale_id in wanted if not pending_after[sale_id]}
+    return lines, fully_cancelled, {sale_id: amount.quantize(CENT) for sale_id, amount in amounts.items()}
+
+
+def _restore_stock(sales, lines, date):
+    """Devuelve el stock al producto y al almacén de donde salió, con la entrada de reversa."""
+    origins = {detail_id: (operation_id, warehouse_id) for detail_id, operation_id, warehouse_id in
+               Operation.objects.filter(detail_order_id__in=[line[0] for line in lines], type_operation='S')
+               .values_list('detail_order_id', 'id', 'warehouse_id')}
+    deltas, by_warehouse = defaultdict(int), defaultdict(lambda: defaultdict(int))
+    for detail_id, _, product_id, quantity, _ in lines:
+        deltas[product_id] += quantity
+        warehouse_id = origins.get(detail_id, (None, None))[1]
+        if warehouse_id is not None:
+            by_warehouse[warehouse_id][product_id] += quantity
+
+    products = stock.lock_products(list(deltas))
+    stock.apply_deltas(deltas)
+    for warehouse in Warehouse.objects.filter(id__in=by_warehouse).order_by('id'):
+        stock.apply_warehouse_deltas(warehouse, by_warehouse[warehouse.id])
+
+    Operation.objects.bulk_create([
+        Operation(
+            product_id=product_id,
+            detail_order_id=detail_id,
+            warehouse_id=origins.get(detail_id, (None, None))[1],
+            reference_id=origins.get(detail_id, (None, None))[0],
+            quantity=quantity,
+            price=price,
+            date=date,
+            type_operation='E',
+            type_document=sales[sale_id].type_receipt,
+            operation='V',
+        )
+        for detail_id, sale_id, product_id, quantity, price in lines
+    ])
+    stock.changed(products, deltas)
+
+
+def _reverse_payments(sales, fully_cancelled, amounts, user):
+    """Anula o compensa los pagos de las ventas y descuenta ``totalSales``; devuelve las cajas tocadas."""
+    payments = list(Payment.objects.filter(sale_id__in=amounts, status='PAID')
+                    .values_list('id', 'sale_id', 'cash_id', 'payment_method', 'paid_amount').order_by('id'))
+    subsidiaries = {sales[sale_id].subsidiary_id for sale_id in amounts}
+    # Mismo bloqueo que CloseCash: una caja no cierra a mitad de la anulación
+    cashes = {c.id: c for c in Cash.objects.select_for_update()
+              .filter(id__in={p[2] for p in payments}).order_by('id')}
+    open_cashes = {c.subsidiary_id: c for c in Cash.objects.select_for_update()
+                   .filter(subsidiary_id__in=subsidiaries, status='A').order_by('id')}
+    cashes.update({c.id: c for c in open_cashes.values()})
+
+    by_sale = defaultdict(list)
+    for payment in payments:
+        by_sale[payment[1]].append(payment)
+
+    cancelled_ids, refunds, totals = [], [], defaultdict(lambda: ZERO)
+    for sale_id, amount in amounts.items():
+        sale = sales[sale_id]
+        if sale_id in fully_cancelled:
+            # Lo cobrado en cajas abiertas se anula; lo de cajas cerradas se devuelve en la caja actual
+            refund = ZERO
+            for payment_id, _, cash_id, method, paid_amount in by_sale[sale_id]:
+                if cashes[cash_id].status == 'A':
+                    cancelled_ids.append(payment_id)
+                    totals[cash_id] -= paid_amount or ZERO
+                else:
+                    refund += paid_amount or ZERO
+        else:
+            # Las devoluciones previas (ADJUST negativos) ya descuentan lo cobrado
+            refund = min(amount, sum((p[4] or ZERO for p in by_sale[sale_id]), ZERO))
+        if not refund:
+            continue
+
+        cash = next((cashes[p[2]] for p in by_sale[sale_id] if cashes[p[2]].status == 'A'),
+                    open_cashes.get(sale.subsidiary_id))
+        if cash is None:
+            raise CancellationError(f'No hay caja abierta para devolver el importe de la venta '
+                                    f'{sale.serie}-{sale.number}')
+        method = by_sale[sale_id][-1][3] if by_sale[sale_id] else sale.type_pay
+        refunds.append(Payment(subsidiary_id=sale.subsidiary_id, cash=cash, sale_id=sale_id, payment_type='ADJUST',
+                               payment_method=method, status='PAID', total_amount=-refund,
+                               paid_amount=-refund, notes=f'Devolución por anulación de {sale.serie}-{sale.number}',
+                               user=user))
+        totals[cash.id] -= refund
+
+    if cancelled_ids:
+        Payment.objects.filter(id__in=cancelled_ids).update(status='CANCELLED', updated_at=timezone.now())
+    if refunds:
+        # payment_date es auto_now_add: las devoluciones quedan con la hora en que se registran
+        outbox.payments_created(Payment.objects.bulk_create(refunds))
+    totals = {cash_id: delta for cash_id, delta in totals.items() if delta}
+    if totals:
+        Cash.objects.filter(id__in=totals).update(totalSales=Case(
+            *[When(id=cash_id, then=F('totalSales') + Value(delta)) for cash_id, delta in totals.items()],
+            default=F('totalSales'),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        ))
+    touched = [cashes[cash_id] for cash_id in totals]
+    for cash in touched:
+        cash.totalSales += totals[cash.id]
+    return touched
@@ -0,0 +1,76 @@
+"""Reporte Z del cierre de caja.
+
+Los pagos de la caja se recorren una sola vez (con la venta y el empleado en
+la misma consulta) y se acumulan todos los desgloses a la vez. El resultado
+se guarda en ``CashReport`` y no se vuelve a calcular.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from apps.sales.models import Payment, CashReport
+
+ZERO = Decimal('0.00')
+NO_EMPLOYEE = 'SIN ASIGNAR'
+
+PAYMENT_COLUMNS = ('payment_method', 'payment_type', 'paid_amount', 'sale_id', 'sale__type_receipt', 'sale__total',
+                   'sale__employee_creation__name_lastname', 'user__username')
+
+
+class _Totals(defaultdict):
+    def __init__(self):
+        super().__init__(lambda: [ZERO, 0])
+
+    def add(self, key, amount):
+        entry = self[key]
+        entry[0] += amount
+        entry[1] += 1
+
+    def as_json(self):
+        return {key: {'total': str(total), 'count': count} for key, (total, count) in sorted(self.items())}
+
+
+def aggregate(cash):
+    """Totales de los pagos vigentes de ``cash`` en una sola pasada."""
+    by_method, by_type, by_receipt, by_employee = _Totals(), _Totals(), _Totals(), _Totals()
+    total, count, sales_total, sales = ZERO, 0, ZERO, set()
+
+    rows = Payment.objects.filter(cash=cash, status='PAID').values_list(*PAYMENT_COLUMNS)
+    for method, payment_type, amount, sale_id, receipt, sale_total, employee, username in rows.iterator():
+        amount = amount or ZERO
+        total += amount
+        count += 1
+        by_method.add(method, amount)
+        by_type.add(payment_type, amount)
+        by_employee.add(employee or username or NO_EMPLOYEE, amount)
+        if sale_id is not None:
+            by_receipt.add(receipt, amount)
+            if sale_id not in sales:
+                sales.add(sale_id)
+                sales_total += sale_total or ZERO
+
+    return {
+        'total_expected': total,
+        'payments_count': count,
+        'sales_count': len(sales),
+        'total_sales': sales_total,
+        'by_method': by_method.as_json(),
+        'by_payment_type': by_type.as_json(),
+        'by_receipt': by_receipt.as_json(),
+        'by_employee': by_employee.as_json(),
+    }
+
+
+def create(cash, total_counted, user, date_close):
+    """Genera el reporte Z; se llama con la caja bloqueada dentro de la transacción del cierre."""
+    totals = aggregate(cash)
+    return CashReport.objects.create(
+        cash=cash,
+        subsidiary_id=cash.subsidiary_id,
+        user=user,
+        date_open=cash.dateOpen,
+        date_close=date_close,
+        initial_amount=cash.initialAmount,
+        total_counted=total_counted,
+        difference=total_counted - totals['total_expected'],
+        **totals,
+    )
@@ -0,0 +1,226 @@
+"""Acumulados de compras por cliente para mostrarlos en caja sin recorrer sus ventas.
+
+``ClientStats`` guarda tickets, importe, primera y última compra;
+``ClientProductStats`` las unidades e importe por producto, de donde salen
+los más comprados. Se actualizan en la misma transacción que la venta
+(``record_sale``) o la anulación (``record_cancellations``), así quedan
+confirmados junto con ella.
+
+La fila de ``ClientStats`` se actualiza primero y hace de bloqueo por
+cliente: dos ventas del mismo cliente tocan sus productos una después de la
+otra. ``rebuild`` recalcula todo desde las ventas activas y archivadas.
+"""
+import base64
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, When, F, Value, Sum, Count, Min, Max, OuterRef, Subquery, IntegerField, \
+    DecimalField
+from django.db.models.functions import Coalesce
+
+from apps.sales.models import Sales, DetailSales, SalesArchive, DetailSalesArchive, ClientStats, ClientProductStats
+
+ZERO = Decimal('0.00')
+AMOUNT = DecimalField(max_digits=15, decimal_places=2)
+MAX_PAGE = 100
+ARCHIVE_CHUNK = 1000
+
+
+def record_sale(sale, details):
+    """Suma la venta a los acumulados de su cliente; las ventas sin cliente no cuentan."""
+    if not sale.provider_id:
+        return
+    products = defaultdict(lambda: [0, ZERO])
+    for detail in details:
+        products[detail.product_id][0] += detail.quantity
+        products[detail.product_id][1] += detail.price * detail.quantity
+    date = sale.date_creation
+    _update_stats(sale.provider_id, tickets_count=F('tickets_count') + 1,
+                  total_spent=F('total_spent') + Value(sale.total or ZERO),
+                  first_purchase=Case(When(first_purchase__lte=date, then=F('first_purchase')), default=Value(date)),
+                  last_purchase=Case(When(last_purchase__gte=date, then=F('last_purchase')), default=Value(date)))
+    _update_products(sale.provider_id, products, date)
+
+
+def record_cancellations(cancelled):
+    """Descuenta las anulaciones: ``[(venta, anulada_completa, importe, [(detail, sale, product, cantidad, precio)])]``.
+
+    Con la venta completa anulada deja de contar como ticket y la última
+    compra se vuelve a tomar de las ventas vigentes (con el índice de cliente).
+    Se llama después de marcar ``date_cancel``.
+    """
+    by_client = defaultdict(lambda: {'tickets': 0, 'amount': ZERO, 'products': defaultdict(lambda: [0, ZERO])})
+    for sale, fully, amount, lines in cancelled:
+        if not sale.provider_id:
+            continue
+        client = by_client[sale.provider_id]
+        client['tickets'] += 1 if fully else 0
+        client['amount'] += amount
+        for _, _, product_id, quantity, price in lines:
+            client['products'][product_id][0] -= quantity
+            client['products'][product_id][1] -= price * quantity
+
+    for client_id in sorted(by_client):
+        client = by_client[client_id]
+        changes = {'total_spent': F('total_spent') - Value(client['amount'])}
+        if client['tickets']:
+            live = Sales.objects.filter(provider_id=OuterRef('client_id'), date_cancel__isnull=True)
+            archived = SalesArchive.objects.filter(provider_id=OuterRef('client_id'), date_cancel__isnull=True)
+            # La primera compra se conserva; el archivo solo se consulta si no quedan ventas activas
+            changes.update(
+                tickets_count=F('tickets_count') - client['tickets'],
+                last_purchase=Coalesce(Subquery(live.order_by('-date_creation').values('date_creation')[:1]),
+                                       Subquery(archived.order_by('-date_creation').values('date_creation')[:1])),
+            )
+        # Sin fila no hay nada que descontar: el cliente se carga con rebuild
+        if ClientStats.objects.filter(client_id=client_id).update(**changes):
+            _update_products(client_id, client['products'])
+
+
+def _update_stats(client_id, **changes):
+    if ClientStats.objects.filter(client_id=client_id).update(**changes):
+        return
+    # Primera venta del cliente: get_or_create resuelve la carrera con otra venta simultánea
+    ClientStats.objects.get_or_create(client_id=client_id)
+    ClientStats.objects.filter(client_id=client_id).update(**changes)
+
+
+def _update_products(client_id, products, date=None):
+    """Suma ``{product_id: [cantidad, importe]}`` con un UPDATE y crea las filas que faltan."""
+    existing = set(ClientProductStats.objects.filter(client_id=client_id, product_id__in=products)
+                   .values_list('product_id', flat=True))
+    if existing:
+        changes = {
+            'quantity': Case(*[When(product_id=product_id, then=F('quantity') + Value(products[product_id][0]))
+                               for product_id in existing], default=F('quantity'), output_field=IntegerField()),
+            'total': Case(*[When(product_id=product_id, then=F('total') + Value(products[product_id][1]))
+                            for product_id in existing], default=F('total'), output_field=AMOUNT),
+        }
+        if date is not None:
+            changes['last_purchase'] = Value(date)
+        ClientProductStats.objects.filter(client_id=client_id, product_id__in=existing).update(**changes)
+    ClientProductStats.objects.bulk_create([
+        ClientProductStats(client_id=client_id, product_id=product_id, quantity=quantity, total=total,
+                           last_purchase=date)
+        for product_id, (quantity, total) in products.items() if product_id not in existing and quantity > 0
+    ])
+
+
+def top_products(client_id, limit=5):
+    return (ClientProductStats.objects.filter(client_id=client_id, quantity__gt=0).select_related('product')
+            .order_by('-quantity', 'product_id')[:limit])
+
+
+def encode_cursor(sale):
+    return base64.urlsafe_b64encode(f'{sale.date_creation.isoformat()}|{sale.id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """``(fecha, id)`` de la última venta entregada; ``ValueError`` si el cursor no es válido."""
+    try:
+        date, sale_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(date), int(sale_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Cursor inválido: {cursor}') from e
+
+
+def history(client_id, first=20, after=None):
+    """Ventas del cliente de la más reciente a la más antigua, por páginas con cursor.
+
+    Se pagina por ``(date_creation, id)`` sobre el índice ``(provider,
+    date_creation, id)``: cada página lee solo sus filas, sin OFFSET, aunque el
+    cliente tenga decenas de miles de tickets. Devuelve ``(ventas, cursor, hay_más)``.
+    """
+    first = max(1, min(first, MAX_PAGE))
+    sales = Sales.objects.filter(provider_id=client_id, date_creation__isnull=False)
+    if after:
+        date, sale_id = decode_cursor(after)
+        # Rango sobre el índice y solo los empates de la misma fecha se descartan por id
+        sales = sales.filter(date_creation__lte=date).exclude(date_creation=date, id__gte=sale_id)
+    page = list(sales.select_related('subsidiary').prefetch_related('detailsales_set__product')
+                .order_by('-date_creation', '-id')[:first + 1])
+    has_more = len(page) > first
+    page = page[:first]
+    return page, encode_cursor(page[-1]) if page else after, has_more
+
+
+def _pending_totals():
+    """Importe y unidades sin anular de los detalles agrupados."""
+    pending = F('quantity') - Coalesce(F('quantity_cancel'), Value(0))
+    return Sum(F('price') * pending, output_field=AMOUNT), Sum(pending)
+
+
+def _client_totals(client_ids):
+    """Acumulados recalculados de ``client_ids`` sumando ventas activas y archivadas."""
+    stats = {client_id: {'tickets_count': 0, 'total_spent': ZERO, 'first_purchase': None, 'last_purchase': None}
+             for client_id in client_ids}
+    products = defaultdict(lambda: [0, ZERO, None])
+    amount, units = _pending_totals()
+
+    def add(client_id, product_id, amount, units, last):
+        stats[client_id]['total_spent'] += amount or ZERO
+        entry = products[client_id, product_id]
+        entry[0] += units or 0
+        entry[1] += amount or ZERO
+        if last is not None and (entry[2] is None or last > entry[2]):
+            entry[2] = last
+
+    for sales in (Sales.objects.filter(provider_id__in=client_ids),
+                  SalesArchive.objects.filter(provider_id__in=client_ids)):
+        rows = (sales.filter(date_cancel__isnull=True).values('provider_id')
+                .annotate(tickets=Count('id'), first=Min('date_creation'), last=Max('date_creation')))
+        for row in rows:
+            client = stats[row['provider_id']]
+            client['tickets_count'] += row['tickets']
+            for key, value, pick in (('first_purchase', row['first'], min), ('last_purchase', row['last'], max)):
+                if value is not None:
+                    client[key] = value if client[key] is None else pick(client[key], value)
+
+    live = (DetailSales.objects.filter(sale__provider_id__in=client_ids, sale__date_cancel__isnull=True)
+            .values('sale__provider_id', 'product_id')
+            .annotate(amount=amount, units=units, last=Max('sale__date_creation')))
+    for row in live:
+        add(row['sale__provider_id'], row['product_id'], row['amount'], row['units'], row['last'])
+
+    # El archivo no tiene claves foráneas: las ventas vigentes del lote se leen con el índice de cliente
+    # y sus detalles se agrupan por venta
+    archived = dict((sale_id, (provider_id, date)) for sale_id, provider_id, date in
+                    SalesArchive.objects.filter(provider_id__in=client_ids, date_cancel__isnull=True)
+                    .values_list('id', 'provider_id', 'date_creation'))
+    sale_ids = list(archived)
+    for start in range(0, len(sale_ids), ARCHIVE_CHUNK):
+        rows = (DetailSalesArchive.objects.filter(sale_id__in=sale_ids[start:start + ARCHIVE_CHUNK])
+                .values('sale_id', 'product_id').annotate(amount=amount, units=units))
+        for row in rows:
+            provider_id, date = archived[row['sale_id']]
+            add(provider_id, row['product_id'], row['amount'], row['units'], date)
+    return stats, products
+
+
+def rebuild(client_ids):
+    """Recalcula los acumulados de ``client_ids`` bloqueando sus filas mientras tanto."""
+    client_ids = sorted(set(client_ids))
+    with transaction.atomic():
+        ClientStats.objects.bulk_create([ClientStats(client_id=client_id) for client_id in client_ids],
+                                        ignore_conflicts=True)
+        # Con las filas bloqueadas las ventas de estos clientes esperan, y el recálculo ve las ya confirmadas
+        list(ClientStats.objects.select_for_update().filter(client_id__in=client_ids).order_by('client_id'))
+        stats, products = _client_totals(client_ids)
+        for client_id, values in stats.items():
+            ClientStats.objects.filter(client_id=client_id).update(**values)
+        ClientProductStats.objects.filter(client_id__in=client_ids).delete()
+        ClientProductStats.objects.bulk_create([
+            ClientProductStats(client_id=client_id, product_id=product_id, quantity=quantity, total=total,
+                               last_purchase=last)
+            for (client_id, product_id), (quantity, total, last) in products.items()
+            if product_id is not None and quantity > 0
+        ])
+
+
+def clients_with_sales():
+    live = Sales.objects.filter(provider__isnull=False).values_list('provider_id', flat=True).distinct()
+    archived = (SalesArchive.objects.filter(provider_id__isnull=False)
+                .values_list('provider_id', flat=True).distinct())
+    return sorted(set(live) | set(archived))
@@ -0,0 +1,158 @@
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F
+
+from apps.sales.models import Correlative, CorrelativeBlock, CorrelativeGap
+
+# Cache de ids de contadores por (subsidiary_id, serie, type_receipt) para no
+# consultar la tabla Correlative en cada venta.
+_counter_ids = {}
+
+
+class CorrelativeError(Exception):
+    pass
+
+
+def _increment(table, column, pk, amount, limit_column=None):
+    """Incrementa ``column`` en una sola sentencia y devuelve el nuevo valor.
+
+    En PostgreSQL y SQLite se usa ``UPDATE ... RETURNING``; en otros motores el
+    UPDATE bloquea la fila y la lectura posterior dentro de la misma
+    transacción devuelve el valor asignado.
+    """
+    qn = connection.ops.quote_name
+    where = f'{qn("id")} = %s'
+    params = [amount, pk]
+    if limit_column:
+        where += f' AND {qn(column)} + %s - 1 <= {qn(limit_column)}'
+        params.append(amount)
+
+    if connection.vendor in ('postgresql', 'sqlite'):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {qn(table)} SET {qn(column)} = {qn(column)} + %s WHERE {where} RETURNING {qn(column)}',
+                params
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {qn(table)} SET {qn(column)} = {qn(column)} + %s WHERE {where}', params)
+            if cursor.rowcount == 0:
+                return None
+            cursor.execute(f'SELECT {qn(column)} FROM {qn(table)} WHERE {qn("id")} = %s', [pk])
+            return cursor.fetchone()[0]
+
+
+def get_counter_id(subsidiary, type_receipt):
+    serie = subsidiary.serie or ''
+    key = (subsidiary.id, serie, type_receipt)
+    counter_id = _counter_ids.get(key)
+    if counter_id is None:
+        try:
+            counter, _ = Correlative.objects.get_or_create(subsidiary=subsidiary, serie=serie,
+                                                           type_receipt=type_receipt)
+        except IntegrityError:
+            counter = Correlative.objects.get(subsidiary=subsidiary, serie=serie, type_receipt=type_receipt)
+        counter_id = _counter_ids[key] = counter.id
+    return counter_id
+
+
+def allocate(subsidiary, type_receipt, count=1):
+    """Reserva ``count`` números consecutivos y devuelve ``(serie, primer_numero)``.
+
+    La fila del contador queda bloqueada hasta el final de la transacción que
+    la llama, por eso debe ser la última escritura de la transacción.
+    """
+    counter_id = get_counter_id(subsidiary, type_receipt)
+    last = _increment(Correlative._meta.db_table, 'current', counter_id, count)
+    if last is None:
+        # El contador fue eliminado; se recrea en el siguiente intento.
+        _counter_ids.clear()
+        counter_id = get_counter_id(subsidiary, type_receipt)
+        last = _increment(Correlative._meta.db_table, 'current', counter_id, count)
+        if last is None:
+            raise CorrelativeError(f'No se pudo asignar un correlativo para {subsidiary.serie or ""}-{type_receipt}')
+    return subsidiary.serie or '', last - count + 1
+
+
+def reserve_block(subsidiary, type_receipt, device, size):
+    """Reserva un bloque de ``size`` números para un terminal (modo sin conexión)."""
+    if size <= 0:
+        raise CorrelativeError('El tamaño del bloque debe ser mayor a cero')
+    with transaction.atomic():
+        serie, start = allocate(subsidiary, type_receipt, size)
+        return CorrelativeBlock.objects.create(
+            correlative_id=get_counter_id(subsidiary, type_receipt),
+            device=device,
+            start=start,
+            end=start + size - 1,
+            next_number=start,
+        )
+
+
+def take_from_block(subsidiary, type_receipt, device):
+    """Toma el siguiente número del bloque activo del terminal, o ``None`` si no tiene."""
+    counter_id = get_counter_id(subsidiary, type_receipt)
+    blocks = CorrelativeBlock.objects.filter(correlative_id=counter_id, device=device, is_active=True,
+                                             next_number__lte=F('end')).order_by('start')
+    for block_id in blocks.values_list('id', flat=True):
+        taken = _increment(CorrelativeBlock._meta.db_table, 'next_number', block_id, 1, limit_column='end')
+        if taken is not None:
+            return subsidiary.serie or '', taken - 1
+    return None
+
+
+def _offline_blocks(subsidiary, type_receipt, device, number):
+    counter_id = get_counter_id(subsidiary, type_receipt)
+    return CorrelativeBlock.objects.filter(
+        correlative_id=counter_id,
+        device=device,
+        is_active=True,
+        start__lte=number,
+        end__gte=number,
+    ).exclude(correlative__gaps__number=number)
+
+
+def block_contains(subsidiary, type_receipt, device, number):
+    """Valida que un número asignado sin conexión pertenezca a un bloque activo del terminal y no esté anulado."""
+    return _offline_blocks(subsidiary, type_receipt, device, number).exists()
+
+
+def claim_number(subsidiary, type_receipt, device, number):
+    """Confirma un número asignado sin conexión y adelanta ``next_number`` del bloque más allá de él.
+
+    Debe llamarse dentro de la transacción de la venta: la fila del bloque
+    queda bloqueada hasta el commit, así ``take_from_block`` no puede entregar
+    el mismo número a otra venta. Lanza ``CorrelativeError`` si ya no es válido.
+    """
+    block = _offline_blocks(subsidiary, type_receipt, device, number).select_for_update().first()
+    if block is None:
+        raise CorrelativeError(f'El correlativo {number} no pertenece a un bloque activo del terminal')
+    if block.next_number <= number:
+        CorrelativeBlock.objects.filter(pk=block.pk).update(next_number=number + 1)
+    return subsidiary.serie or '', number
+
+
+def void_number(subsidiary, type_receipt, number, reason=None, sale=None):
+    """Registra un número anulado para que la serie no tenga huecos sin justificar."""
+    gap, _ = CorrelativeGap.objects.get_or_create(
+        correlative_id=get_counter_id(subsidiary, type_receipt),
+        number=number,
+        defaults={'reason': reason, 'sale': sale},
+    )
+    return gap
+
+
+def release_block(block, reason='Bloque liberado'):
+    """Cierra un bloque y registra como huecos los números que no se usaron."""
+    with transaction.atomic():
+        block = CorrelativeBlock.objects.select_for_update().get(pk=block.pk)
+        CorrelativeGap.objects.bulk_create(
+            [CorrelativeGap(correlative_id=block.correlative_id, number=number, reason=reason)
+             for number in range(block.next_number, block.end + 1)],
+            ignore_conflicts=True,
+        )
+        block.is_active = False
+        block.save(update_fields=['is_active'])
+    return block
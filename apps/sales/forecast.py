@@ -0,0 +1,168 @@
+"""Pronóstico de demanda y sugerencias de reposición por sucursal.
+
+Las ventas diarias de cada producto se cargan en una matriz productos x días
+y todos los cálculos (promedios, estacionalidad semanal, clasificación ABC,
+punto de reorden) se hacen con operaciones vectorizadas de numpy.
+"""
+from array import array
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.hrmn.models import ClientSupplier
+from apps.products.models import Product
+from apps.sales.models import DetailSales, DetailPurchase, ReorderSuggestion
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional; solo lo necesitan las sugerencias de reposición
+    np = None
+
+HISTORY_DAYS = getattr(settings, 'FORECAST_HISTORY_DAYS', 730)
+REVIEW_DAYS = getattr(settings, 'FORECAST_REVIEW_DAYS', 7)
+DEFAULT_LEAD_TIME = getattr(settings, 'FORECAST_DEFAULT_LEAD_TIME', 7)
+SERVICE_LEVEL_Z = {'A': 1.65, 'B': 1.28, 'C': 0.84}
+ABC_LIMITS = (0.80, 0.95)
+
+
+def load_history(subsidiary_id, start, days, index):
+    """Cantidades y montos diarios por producto como matrices ``(productos, días)``."""
+    rows = (DetailSales.objects
+            .filter(sale__subsidiary_id=subsidiary_id, sale__date_creation__gte=start,
+                    sale__date_cancel__isnull=True, product__subsidiary_id=subsidiary_id)
+            .annotate(day=TruncDate('sale__date_creation'))
+            .values('product_id', 'day')
+            .annotate(quantity=Sum('quantity'), amount=Sum('total'))
+            .values_list('product_id', 'day', 'quantity', 'amount'))
+
+    products, positions, quantities, amounts = array('i'), array('i'), array('d'), array('d')
+    start_date = start.date()
+    for product_id, day, quantity, amount in rows.iterator(chunk_size=20000):
+        position = (day - start_date).days
+        if 0 <= position < days and product_id in index:
+            products.append(index[product_id])
+            positions.append(position)
+            quantities.append(quantity or 0)
+            amounts.append(float(amount or 0))
+
+    shape = (len(index), days)
+    demand = np.zeros(shape, dtype=np.float32)
+    revenue = np.zeros(len(index), dtype=np.float64)
+    if products:
+        p = np.frombuffer(products, dtype=np.int32)
+        d = np.frombuffer(positions, dtype=np.int32)
+        np.add.at(demand, (p, d), np.frombuffer(quantities, dtype=np.float64))
+        np.add.at(revenue, p, np.frombuffer(amounts, dtype=np.float64))
+    return demand, revenue
+
+
+def abc_classes(revenue):
+    """Clase A/B/C según la participación acumulada en la venta."""
+    classes = np.full(revenue.shape, 'C', dtype='<U1')
+    total = revenue.sum()
+    if total <= 0:
+        return classes
+    order = np.argsort(-revenue)
+    share = np.cumsum(revenue[order]) / total
+    # Un producto es A mientras la participación acumulada anterior a él no supere el límite
+    previous = np.concatenate(([0.0], share[:-1]))
+    ranked = np.where(previous < ABC_LIMITS[0], 'A', np.where(previous < ABC_LIMITS[1], 'B', 'C'))
+    classes[order] = ranked
+    classes[revenue <= 0] = 'C'
+    return classes
+
+
+def forecast(demand, first_weekday, lead_times, stock, classes):
+    """Devuelve promedio diario, demanda en el plazo de entrega, stock de seguridad,
+    punto de reorden y cantidad sugerida por producto."""
+    days = demand.shape[1]
+    recent = demand[:, -28:]
+    quarter = demand[:, -91:]
+    level = 0.6 * recent.mean(axis=1) + 0.4 * quarter.mean(axis=1)
+
+    # Índice estacional por día de la semana sobre las últimas 13 semanas
+    weekdays = (first_weekday + np.arange(days)) % 7
+    quarter_weekdays = weekdays[-quarter.shape[1]:]
+    overall = quarter.mean(axis=1)
+    factors = np.ones((demand.shape[0], 7), dtype=np.float32)
+    for weekday in range(7):
+        mask = quarter_weekdays == weekday
+        if mask.any():
+            weekday_mean = quarter[:, mask].mean(axis=1)
+            factors[:, weekday] = np.where(overall > 0, weekday_mean / np.maximum(overall, 1e-9), 1.0)
+
+    max_lead = int(lead_times.max()) if lead_times.size else 1
+    horizon = max_lead + REVIEW_DAYS
+    future_weekdays = (first_weekday + days + np.arange(horizon)) % 7
+    cumulative = np.cumsum(level[:, None] * factors[:, future_weekdays], axis=1)
+    rows = np.arange(demand.shape[0])
+    lead_demand = cumulative[rows, lead_times - 1]
+    cycle_demand = cumulative[rows, lead_times + REVIEW_DAYS - 1]
+
+    z = np.select([classes == 'A', classes == 'B'], [SERVICE_LEVEL_Z['A'], SERVICE_LEVEL_Z['B']],
+                  SERVICE_LEVEL_Z['C'])
+    safety = z * quarter.std(axis=1) * np.sqrt(lead_times)
+    reorder_point = np.ceil(lead_demand + safety)
+    order_up_to = np.ceil(cycle_demand + safety)
+    suggested = np.where(stock <= reorder_point, np.maximum(order_up_to - stock, 0), 0)
+    return level, lead_demand, np.ceil(safety), reorder_point, suggested
+
+
+def compute(subsidiary_id, history_days=HISTORY_DAYS):
+    """Recalcula y guarda las sugerencias de una sucursal; devuelve cuántas se guardaron."""
+    if np is None:
+        raise ImportError('numpy no está instalado: es necesario para las sugerencias de reposición')
+    now = timezone.now()
+    start = timezone.localtime(now - timedelta(days=history_days)).replace(hour=0, minute=0, second=0,
+                                                                         microsecond=0)
+    last_supplier = (DetailPurchase.objects
+                     .filter(product=OuterRef('pk'), purchase__provider__isnull=False)
+                     .order_by('-purchase__date', '-id')
+                     .values('purchase__provider_id')[:1])
+    products = list(Product.objects.filter(subsidiary_id=subsidiary_id)
+                    .annotate(supplier_id=Subquery(last_supplier))
+                    .values_list('id', 'quantity', 'supplier_id'))
+    if not products:
+        ReorderSuggestion.objects.filter(subsidiary_id=subsidiary_id).delete()
+        return 0
+
+    ids = [p[0] for p in products]
+    index = {product_id: i for i, product_id in enumerate(ids)}
+    lead_by_supplier = dict(ClientSupplier.objects.filter(id__in={p[2] for p in products if p[2]})
+                            .values_list('id', 'lead_time_days'))
+    lead_times = np.array([max(lead_by_supplier.get(p[2]) or DEFAULT_LEAD_TIME, 1) for p in products],
+                          dtype=np.int64)
+    stock = np.array([p[1] or 0 for p in products], dtype=np.float64)
+
+    demand, revenue = load_history(subsidiary_id, start, history_days, index)
+    classes = abc_classes(revenue)
+    level, lead_demand, safety, reorder_point, suggested = forecast(
+        demand, start.weekday(), lead_times, stock, classes)
+
+    relevant = np.nonzero((level > 0) | (suggested > 0))[0]
+    suggestions = [
+        ReorderSuggestion(
+            subsidiary_id=subsidiary_id,
+            product_id=ids[i],
+            supplier_id=products[i][2],
+            abc_class=classes[i],
+            avg_daily=Decimal(f'{level[i]:.3f}'),
+            forecast_lead_time=Decimal(f'{lead_demand[i]:.3f}'),
+            lead_time_days=int(lead_times[i]),
+            safety_stock=int(safety[i]),
+            reorder_point=int(reorder_point[i]),
+            stock=int(stock[i]),
+            suggested_quantity=int(suggested[i]),
+            date_computed=now,
+        )
+        for i in relevant
+    ]
+    with transaction.atomic():
+        ReorderSuggestion.objects.filter(subsidiary_id=subsidiary_id).delete()
+        ReorderSuggestion.objects.bulk_create(suggestions, batch_size=5000)
+    return len(suggestions)
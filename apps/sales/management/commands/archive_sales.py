@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.sales import archive
+
+
+class Command(BaseCommand):
+    help = 'Mueve a las tablas de archivo las ventas, detalles y pagos de meses cerrados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=getattr(settings, 'SALES_HOT_MONTHS', 12),
+                            help='Meses completos que se mantienen en las tablas activas')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0.1, help='Segundos de espera entre lotes')
+
+    def handle(self, *args, **options):
+        current_month = archive.month_start(timezone.localtime())
+        cutoff = archive.add_months(current_month, -options['keep_months'])
+        self.stdout.write(f'Archivando ventas anteriores a {cutoff:%Y-%m-%d}')
+        total, months = archive.archive(cutoff, batch_size=options['batch_size'], pause=options['pause'],
+                                        log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f'{total} ventas archivadas en {len(months)} meses'))
@@ -0,0 +1,106 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from djangoProject import admission, operations
+
+CREATE_SALE = 'mutation($input: CreateSaleInput!) { createSale(input: $input) { success } }'
+SALES_HISTORY = ('query($s: ID!, $f: DateTime!, $t: DateTime!) '
+                 '{ salesHistory(subsidiaryId: $s, dateFrom: $f, dateTo: $t) { id } }')
+PRODUCTS = 'query($s: ID) { products(subsidiaryId: $s) { id } }'
+
+
+class Command(BaseCommand):
+    help = ('Simula una ráfaga contra el control de admisión: un terminal en bucle de reintentos, '
+            'un script de reportes y terminales normales de varias sucursales')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=int, default=60)
+        parser.add_argument('--terminals', type=int, default=20)
+        parser.add_argument('--threads', type=int, default=8, help='Workers para medir la latencia del almacén')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        path = os.path.join(tempfile.mkdtemp(), 'admission.sqlite3')
+        store = admission.BucketStore(path)
+
+        def request(query, variables, device):
+            req = factory.post('/graphql/', data=json.dumps({'query': query, 'variables': variables}),
+                               content_type='application/json', HTTP_X_DEVICE_ID=device)
+            req.user = AnonymousUser()
+            return req
+
+        # (actor, peticiones por segundo, fábrica de peticiones)
+        actors = [
+            ('terminal en bucle (createSale)', 40,
+             lambda: request(CREATE_SALE, {'input': {'subsidiaryId': '1', 'deviceId': 'loop'}}, 'loop')),
+            ('script de reportes (salesHistory)', 10,
+             lambda: request(SALES_HISTORY, {'s': '1', 'f': '2024-01-01', 't': '2025-01-01'}, 'report')),
+            ('consultas de catálogo', 120,
+             lambda: request(PRODUCTS, {'s': '2'}, f'catalog{int(time.time() * 1000) % 50}')),
+        ]
+        for n in range(options['terminals']):
+            actors.append((f'terminal normal {n}', 0.2,
+                           lambda n=n: request(CREATE_SALE, {'input': {'subsidiaryId': str(2 + n % 3)}}, f't{n}')))
+
+        events = []
+        for index, (_, rate, _) in enumerate(actors):
+            interval = 1.0 / rate
+            t = (index % 10) * 0.01
+            while t < options['seconds']:
+                events.append((t, index))
+                t += interval
+        events.sort()
+
+        admitted, rejected = defaultdict(int), defaultdict(int)
+        start = 1_000_000.0
+        for t, index in events:
+            req = actors[index][2]()
+            wait = store.acquire(admission.buckets_for(req, operations.from_request(req)), now=start + t)
+            (rejected if wait else admitted)[index] += 1
+
+        self.stdout.write(f'Ráfaga simulada de {options["seconds"]} s ({len(events)} peticiones):')
+        normal = [i for i, actor in enumerate(actors) if actor[0].startswith('terminal normal')]
+        for index, (name, rate, _) in enumerate(actors):
+            if index not in normal:
+                self.stdout.write(f'  {name:40} {admitted[index]:6} admitidas {rejected[index]:6} rechazadas')
+        self.stdout.write(f'  {"terminales normales (createSale)":40} {sum(admitted[i] for i in normal):6} admitidas '
+                          f'{sum(rejected[i] for i in normal):6} rechazadas')
+
+        self.measure(path, options['threads'], request)
+
+    def measure(self, path, threads, request):
+        """Latencia del almacén compartido con varios workers tomando fichas a la vez."""
+        store = admission.BucketStore(path, timeout=5)
+        req = request(PRODUCTS, {'s': '9'}, 'bench')
+        buckets = [(key + ':bench', 10 ** 9, 10 ** 6, cost, borrow)
+                   for key, _, _, cost, borrow in admission.buckets_for(req, operations.from_request(req))]
+        per_thread, timings = 2000, []
+
+        def worker():
+            local = []
+            for _ in range(per_thread):
+                started = time.perf_counter()
+                store.acquire(buckets)
+                local.append(time.perf_counter() - started)
+            timings.extend(local)
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        timings.sort()
+        self.stdout.write(f'Almacén SQLite con {threads} workers: {len(timings) / elapsed:.0f} admisiones/s, '
+                          f'p50 {timings[len(timings) // 2] * 1e6:.0f} µs, '
+                          f'p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f} µs')
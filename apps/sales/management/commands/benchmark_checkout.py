@@ -0,0 +1,94 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+
+from apps.products.models import Product
+
+CREATE_CLIENT = '''mutation($input: CreateClientSupplierInput!) {
+  createClientSupplier(input: $input) { success clientSupplier { id } }
+}'''
+CREATE_SALE = '''mutation($input: CreateSaleInput!) {
+  createSale(input: $input) { success sale { id serie number total } }
+}'''
+READ_SALE = 'query($id: ID!) { sale(id: $id) { id serie number total } }'
+
+
+class Command(BaseCommand):
+    help = ('Latencia de un cobro completo (cliente nuevo, venta y lectura del comprobante) en peticiones '
+            'separadas frente a un lote atómico, con un RTT simulado. Todo se deshace al terminar.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subsidiary', type=int, required=True)
+        parser.add_argument('--product', type=int, required=True)
+        parser.add_argument('--username', required=True)
+        parser.add_argument('--rtt', type=float, default=150.0, help='Ida y vuelta simulada en ms')
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        product = Product.objects.filter(id=options['product']).first()
+        user = get_user_model().objects.filter(username=options['username']).first()
+        if product is None or user is None:
+            raise CommandError('Producto o usuario no encontrado')
+
+        self.rtt = options['rtt'] / 1000
+        self.subsidiary = str(options['subsidiary'])
+        self.product = product
+
+        with transaction.atomic():
+            client = Client()
+            client.force_login(user)
+            sequential, batched = [], []
+            for n in range(options['iterations']):
+                sequential.append(self.sequential(client, 91000000 + 2 * n))
+                batched.append(self.batched(client, 91000001 + 2 * n))
+            transaction.set_rollback(True)
+
+        for name, timings in (('3 peticiones', sequential), ('1 lote atómico', batched)):
+            timings.sort()
+            self.stdout.write(f'{name:16} p50 {statistics.median(timings) * 1000:7.1f} ms  '
+                              f'p95 {timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000:7.1f} ms '
+                              f'(RTT {self.rtt * 1000:.0f} ms)')
+
+    def post(self, client, path, body):
+        time.sleep(self.rtt)  # la red lenta se paga una vez por petición
+        response = client.post(path, data=json.dumps(body), content_type='application/json')
+        if response.status_code != 200:
+            raise CommandError(f'{path} respondió {response.status_code}: {response.content[:200]!r}')
+        return json.loads(response.content)
+
+    def client_input(self, document):
+        return {'name': f'Cliente {document}', 'nDocument': document, 'typeDocument': 'D', 'typePerson': 'C'}
+
+    def sale_input(self, provider):
+        price = str(self.product.price or '1.00')
+        return {'providerId': provider, 'subsidiaryId': self.subsidiary, 'typeReceipt': 'T', 'typePay': 'E',
+                'details': [{'productId': str(self.product.id), 'quantity': 1, 'price': price, 'subtotal': price,
+                             'total': price}]}
+
+    def sequential(self, client, document):
+        started = time.perf_counter()
+        created = self.post(client, '/graphql/', {'query': CREATE_CLIENT,
+                                                  'variables': {'input': self.client_input(document)}})
+        provider = created['data']['createClientSupplier']['clientSupplier']['id']
+        sale = self.post(client, '/graphql/', {'query': CREATE_SALE,
+                                               'variables': {'input': self.sale_input(provider)}})
+        self.post(client, '/graphql/', {'query': READ_SALE,
+                                        'variables': {'id': sale['data']['createSale']['sale']['id']}})
+        return time.perf_counter() - started
+
+    def batched(self, client, document):
+        started = time.perf_counter()
+        result = self.post(client, '/graphql/batch/', {'atomic': True, 'operations': [
+            {'id': 'client', 'query': CREATE_CLIENT, 'variables': {'input': self.client_input(document)}},
+            {'id': 'sale', 'query': CREATE_SALE,
+             'variables': {'input': self.sale_input({'$ref': 'client.createClientSupplier.clientSupplier.id'})}},
+            {'id': 'receipt', 'query': READ_SALE, 'variables': {'id': {'$ref': 'sale.createSale.sale.id'}}},
+        ]})
+        if not result['committed']:
+            raise CommandError(f'El lote no se confirmó: {result["results"]}')
+        return time.perf_counter() - started
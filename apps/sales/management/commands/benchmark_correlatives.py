@@ -0,0 +1,54 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from apps.hrmn.models import Subsidiary
+from apps.sales import correlatives
+
+
+class Command(BaseCommand):
+    help = 'Mide el rendimiento del asignador de correlativos con varios terminales concurrentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('subsidiary_id', type=int)
+        parser.add_argument('--type-receipt', default='B')
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--allocations', type=int, default=500, help='Asignaciones por hilo')
+
+    def handle(self, *args, **options):
+        try:
+            subsidiary = Subsidiary.objects.get(id=options['subsidiary_id'])
+        except Subsidiary.DoesNotExist:
+            raise CommandError('Sucursal no encontrada')
+
+        type_receipt = options['type_receipt']
+        allocations = options['allocations']
+
+        def worker(_):
+            numbers = []
+            latencies = []
+            try:
+                for _ in range(allocations):
+                    start = time.perf_counter()
+                    with transaction.atomic():
+                        numbers.append(correlatives.allocate(subsidiary, type_receipt)[1])
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                connection.close()
+            return numbers, latencies
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            results = list(executor.map(worker, range(options['threads'])))
+        elapsed = time.perf_counter() - start
+
+        numbers = [n for result in results for n in result[0]]
+        latencies = sorted(l for result in results for l in result[1])
+        if len(set(numbers)) != len(numbers):
+            raise CommandError('Se asignaron correlativos duplicados')
+
+        p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+        self.stdout.write(f'Asignaciones: {len(numbers)} en {elapsed:.2f}s '
+                          f'({len(numbers) / elapsed:.0f}/s), p99 {p99 * 1000:.2f} ms')
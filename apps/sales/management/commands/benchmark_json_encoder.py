@@ -0,0 +1,63 @@
+import json
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from djangoProject.views import fast_json_encode
+
+
+def build_sales_response(rows):
+    """Respuesta con la forma de ``{ sales { ... details { ... } } }`` ya resuelta por graphene."""
+    now = timezone.now()
+    sales = []
+    for i in range(rows):
+        details = [{
+            'id': str(i * 3 + j),
+            'quantity': random.randint(1, 10),
+            'price': str(Decimal(random.randint(100, 99999)) / 100),
+            'subtotal': str(Decimal(random.randint(100, 99999)) / 100),
+            'total': str(Decimal(random.randint(100, 99999)) / 100),
+            'observation': 'Sin azúcar' if j == 0 else None,
+        } for j in range(3)]
+        sales.append({
+            'id': str(i),
+            'dateCreation': (now - timedelta(minutes=i)).isoformat(),
+            'typeReceipt': random.choice('BFT'),
+            'typePay': random.choice('EYP'),
+            'total': str(Decimal(random.randint(100, 999999)) / 100),
+            'serie': '001',
+            'number': i + 1,
+            'details': details,
+        })
+    return {'data': {'sales': sales}}
+
+
+class Command(BaseCommand):
+    help = 'Compara el codificador JSON estándar con el rápido sobre una respuesta de ventas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        data = build_sales_response(options['rows'])
+        if fast_json_encode(data) is None:
+            raise CommandError('orjson no está instalado')
+        if json.loads(fast_json_encode(data)) != json.loads(json.dumps(data, separators=(',', ':'))):
+            raise CommandError('Las salidas no son equivalentes')
+
+        def measure(label, encode):
+            start = time.perf_counter()
+            for _ in range(options['repeat']):
+                size = len(encode(data))
+            elapsed = (time.perf_counter() - start) / options['repeat']
+            self.stdout.write(f'{label:<10} {elapsed * 1000:8.2f} ms  {size} bytes')
+            return elapsed
+
+        stdlib = measure('json', lambda d: json.dumps(d, separators=(',', ':')))
+        fast = measure('orjson', fast_json_encode)
+        self.stdout.write(f'Aceleración: {stdlib / fast:.1f}x')
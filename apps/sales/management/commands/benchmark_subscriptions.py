@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+
+from djangoProject.broadcast import Broadcaster, InMemoryBackend, ChannelLayerBackend
+
+
+class Command(BaseCommand):
+    help = 'Mide la difusión de eventos a muchos suscriptores (proceso local o capa de channels en memoria)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=500)
+        parser.add_argument('--messages', type=int, default=50)
+        parser.add_argument('--backend', choices=('memory', 'layer'), default='layer')
+
+    def handle(self, *args, **options):
+        if options['backend'] == 'layer':
+            from channels.layers import InMemoryChannelLayer
+            backend = ChannelLayerBackend(layer=InMemoryChannelLayer(capacity=options['messages'] * 2))
+        else:
+            backend = InMemoryBackend()
+        asyncio.run(self.run(Broadcaster(backend), options['subscribers'], options['messages']))
+
+    async def run(self, broadcaster, subscribers, messages):
+        received = [0] * subscribers
+
+        async def subscriber(index):
+            stream = broadcaster.subscribe('stock.1')
+            async for _ in stream:
+                received[index] += 1
+                if received[index] == messages:
+                    break
+            await stream.aclose()
+
+        tasks = [asyncio.ensure_future(subscriber(i)) for i in range(subscribers)]
+        await asyncio.sleep(0.5)  # deja que todos se registren en el canal
+
+        start = time.perf_counter()
+        for n in range(messages):
+            await sync_to_async(broadcaster.publish)('stock.1', {'product_id': n, 'subsidiary_id': 1, 'quantity': n})
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=60)
+        elapsed = time.perf_counter() - start
+
+        delivered = sum(received)
+        self.stdout.write(f'{delivered} entregas ({subscribers} suscriptores x {messages} mensajes) en '
+                          f'{elapsed:.2f}s: {delivered / elapsed:.0f} entregas/s')
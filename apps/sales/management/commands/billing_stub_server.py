@@ -0,0 +1,55 @@
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Servidor HTTP local que simula al proveedor de facturación (latencia y fallos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8089)
+        parser.add_argument('--latency', type=float, default=0.2, help='Latencia media en segundos')
+        parser.add_argument('--failure-rate', type=float, default=0.1, help='Proporción de respuestas 503')
+        parser.add_argument('--reject-rate', type=float, default=0.0, help='Proporción de respuestas 400')
+
+    def handle(self, *args, **options):
+        latency = options['latency']
+        failure_rate = options['failure_rate']
+        reject_rate = options['reject_rate']
+        stdout = self.stdout
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                document = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                time.sleep(random.expovariate(1 / latency) if latency else 0)
+                roll = random.random()
+                if roll < failure_rate:
+                    status, body = 503, {'error': 'Servicio no disponible'}
+                elif roll < failure_rate + reject_rate:
+                    status, body = 400, {'error': 'Comprobante rechazado'}
+                else:
+                    status, body = 200, {'accepted': True, 'serie': document.get('serie'),
+                                         'number': document.get('number')}
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                stdout.write(format % args)
+
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), Handler)
+        self.stdout.write(f'Proveedor simulado en http://127.0.0.1:{options["port"]}/')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
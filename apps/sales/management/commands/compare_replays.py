@@ -0,0 +1,69 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangoProject import recording
+
+
+class Command(BaseCommand):
+    help = ('Compara dos corridas de replay_traffic (por ejemplo la versión actual y la candidata): latencia '
+            'por operación y peticiones cuyo resultado cambió de éxito a error o al revés.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('baseline')
+        parser.add_argument('candidate')
+        parser.add_argument('--threshold', type=float, default=10.0,
+                            help='Porcentaje de aumento del p95 que se marca como regresión')
+        parser.add_argument('--min-count', type=int, default=20,
+                            help='Operaciones con menos peticiones no se marcan como regresión')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        baseline, candidate = self.load(options['baseline']), self.load(options['candidate'])
+        before, after = recording.summarize(baseline.values()), recording.summarize(candidate.values())
+
+        self.stdout.write(f'{"operación":36} {"n":>6} {"p50 antes":>10} {"p50 después":>12} '
+                          f'{"p95 antes":>10} {"p95 después":>12} {"Δp95":>7} {"fallas":>9}')
+        regressions = []
+        for label in sorted(set(before) | set(after), key=lambda name: -(after.get(name) or before[name])['count']):
+            old, new = before.get(label), after.get(label)
+            if old is None or new is None:
+                self.stdout.write(f'{label[:36]:36} solo en {"la candidata" if old is None else "la base"}')
+                continue
+            change = ((new['p95'] - old['p95']) * 100 / old['p95']) if old['p95'] and new['p95'] else 0.0
+            line = (f'{label[:36]:36} {new["count"]:6d} {old["p50"] or 0:10.1f} {new["p50"] or 0:12.1f} '
+                    f'{old["p95"] or 0:10.1f} {new["p95"] or 0:12.1f} {change:+6.1f}% '
+                    f'{old["failed"]:4d}→{new["failed"]:<4d}')
+            regressed = ((change > options['threshold'] and new['count'] >= options['min_count']) or
+                         new['failed'] > old['failed'])
+            if regressed:
+                regressions.append(label)
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+
+        changed = [(index, baseline[index], candidate[index]) for index in sorted(set(baseline) & set(candidate))
+                   if self.is_failure(baseline[index]) != self.is_failure(candidate[index])]
+        if changed:
+            self.stdout.write(f'\n{len(changed)} peticiones cambiaron de resultado:')
+            for index, old, new in changed[:50]:
+                self.stdout.write(f'  #{index} {new["label"]}: {self.describe(old)} → {self.describe(new)}')
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'Regresiones en: {", ".join(regressions)}')
+
+    @staticmethod
+    def load(path):
+        try:
+            with open(path, encoding='utf-8') as results:
+                return {result['index']: result for result in map(json.loads, results) if result}
+        except (OSError, ValueError) as e:
+            raise CommandError(f'No se pudo leer {path}: {e}')
+
+    @staticmethod
+    def is_failure(result):
+        return result.get('status') != 200 or bool(result.get('failures'))
+
+    def describe(self, result):
+        if not self.is_failure(result):
+            return 'ok'
+        return f'{result.get("status")} {"; ".join(str(m) for m in result.get("errors") or [])[:120]}'
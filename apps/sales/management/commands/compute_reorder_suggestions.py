@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.hrmn.models import Subsidiary
+from apps.sales import forecast
+
+
+class Command(BaseCommand):
+    help = 'Calcula pronósticos de demanda, clasificación ABC y sugerencias de reposición por sucursal'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subsidiary', type=int, action='append', help='Sucursal (se puede repetir)')
+        parser.add_argument('--days', type=int, default=forecast.HISTORY_DAYS, help='Días de historial')
+
+    def handle(self, *args, **options):
+        if forecast.np is None:
+            raise CommandError('numpy no está instalado')
+        subsidiaries = options['subsidiary'] or list(
+            Subsidiary.objects.filter(is_enabled=True).values_list('id', flat=True))
+        for subsidiary_id in subsidiaries:
+            start = time.perf_counter()
+            count = forecast.compute(subsidiary_id, history_days=options['days'])
+            self.stdout.write(f'Sucursal {subsidiary_id}: {count} sugerencias en {time.perf_counter() - start:.2f}s')
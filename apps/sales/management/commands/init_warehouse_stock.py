@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.products.models import Product
+from apps.sales import stock
+from apps.sales.models import WarehouseStock
+
+
+class Command(BaseCommand):
+    help = ('Carga el stock por almacén a partir de Product.quantity: los productos que aún no tienen filas en '
+            'WarehouseStock quedan con todo su stock en el almacén principal de su sucursal')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with_stock = WarehouseStock.objects.values('product_id')
+        pending = (Product.objects.exclude(id__in=with_stock).exclude(subsidiary__isnull=True)
+                   .values_list('subsidiary_id', flat=True).distinct())
+        created = 0
+        for subsidiary_id in pending:
+            warehouse = stock.default_warehouse(subsidiary_id)
+            if warehouse is None:
+                self.stdout.write(f'Sucursal {subsidiary_id} sin almacén habilitado, se omite')
+                continue
+            ids = list(Product.objects.filter(subsidiary_id=subsidiary_id).exclude(id__in=with_stock)
+                       .values_list('id', flat=True))
+            for start in range(0, len(ids), options['batch_size']):
+                with transaction.atomic():
+                    products = stock.lock_products(ids[start:start + options['batch_size']])
+                    stock.apply_warehouse_deltas(warehouse, {p.id: p.quantity or 0 for p in products.values()})
+                created += len(products)
+        self.stdout.write(self.style.SUCCESS(f'{created} productos cargados en su almacén principal'))
@@ -0,0 +1,53 @@
+import glob
+import os
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangoProject import profiling
+
+
+class Command(BaseCommand):
+    help = ('Resume los perfiles guardados por ProfilingMiddleware: funciones con más muestras propias e '
+            'inclusivas. Con --merge junta las pilas en un solo archivo para flamegraph.pl o speedscope.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=profiling.DIR)
+        parser.add_argument('--operation', help='Solo perfiles cuyo nombre contiene este texto')
+        parser.add_argument('--top', type=int, default=25)
+        parser.add_argument('--merge', help='Archivo .folded de salida con todas las pilas sumadas')
+
+    def handle(self, *args, **options):
+        files = sorted(glob.glob(os.path.join(options['dir'], '*.folded')))
+        if options['operation']:
+            files = [f for f in files if options['operation'] in os.path.basename(f)]
+        if not files:
+            raise CommandError(f'No hay perfiles en {options["dir"]}')
+
+        stacks = Counter()
+        for path in files:
+            with open(path, encoding='utf-8') as profile:
+                for line in profile:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    if stack and count.isdigit():
+                        stacks[stack] += int(count)
+
+        own, inclusive = Counter(), Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for frame in set(frames):
+                inclusive[frame] += count
+        total = sum(stacks.values())
+
+        self.stdout.write(f'{len(files)} perfiles, {total} muestras')
+        for title, counter in (('Propias', own), ('Inclusivas', inclusive)):
+            self.stdout.write(f'\n{title}:')
+            for frame, count in counter.most_common(options['top']):
+                self.stdout.write(f'{count * 100 / total:6.1f}% {count:8d}  {frame}')
+
+        if options['merge']:
+            with open(options['merge'], 'w', encoding='utf-8') as output:
+                for stack, count in stacks.most_common():
+                    output.write(f'{stack} {count}\n')
+            self.stdout.write(self.style.SUCCESS(f'Pilas combinadas en {options["merge"]}'))
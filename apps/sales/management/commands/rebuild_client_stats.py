@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from apps.sales import client_stats
+
+
+class Command(BaseCommand):
+    help = ('Recalcula los acumulados de compras por cliente (ClientStats y ClientProductStats) desde las ventas '
+            'activas y archivadas. Se corre una vez al desplegar y cuando se sospeche que quedaron desfasados.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--client', type=int, action='append', help='Solo este cliente (se puede repetir)')
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        client_ids = options['client'] or client_stats.clients_with_sales()
+        size = options['batch_size']
+        for start in range(0, len(client_ids), size):
+            batch = client_ids[start:start + size]
+            client_stats.rebuild(batch)
+            self.stdout.write(f'{start + len(batch)}/{len(client_ids)} clientes')
+        self.stdout.write(self.style.SUCCESS(f'{len(client_ids)} clientes recalculados'))
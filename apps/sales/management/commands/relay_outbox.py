@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from apps.sales import outbox
+
+
+class Command(BaseCommand):
+    help = ('Publica los eventos pendientes del outbox (published_seq para changesSince) y los entrega a los '
+            'consumidores externos')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=outbox.BATCH_SIZE)
+        parser.add_argument('--handler', help=('Ruta de la función que recibe cada lote (por defecto OUTBOX_HANDLER); '
+                                               'apps.sales.outbox.sequence_only solo publica para changesSince'))
+        parser.add_argument('--once', action='store_true', help='Entrega lo pendiente y termina')
+        parser.add_argument('--prune-days', type=int, help='Antes de empezar, elimina lo publicado hace más de N días')
+
+    def handle(self, *args, **options):
+        if options['prune_days'] is not None:
+            self.stdout.write(f'{outbox.prune(options["prune_days"])} eventos eliminados')
+        try:
+            total = outbox.relay(outbox.get_handler(options['handler']), batch_size=options['batch_size'],
+                                 once=options['once'], log=self.stdout.write)
+            self.stdout.write(f'{total} eventos entregados')
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangoProject import recording
+from djangoProject.views import failed
+
+
+class Command(BaseCommand):
+    help = ('Reproduce tráfico grabado por TrafficRecorderMiddleware contra una instancia de prueba, a la '
+            'velocidad original o acelerada, y guarda la latencia y los errores de cada petición. '
+            'Las mutaciones se ejecutan de verdad: usar solo contra una base de prueba.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='Archivos .jsonl grabados (y sus rotaciones)')
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help='Multiplicador del ritmo grabado; 0 envía todo sin esperar')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--token', help='JWT para la cabecera Authorization')
+        parser.add_argument('--header', action='append', default=[], help='Cabecera extra "Nombre: valor"')
+        parser.add_argument('--only', action='append', default=[], help='Solo estas operaciones')
+        parser.add_argument('--skip-mutations', action='store_true')
+        parser.add_argument('--limit', type=int)
+        parser.add_argument('--timeout', type=float, default=30.0)
+        parser.add_argument('--output', required=True, help='Resultados .jsonl para compare_replays')
+
+    def handle(self, *args, **options):
+        requests = recording.load(options['files'])
+        if options['only']:
+            requests = [r for r in requests if r['label'] in options['only']]
+        if options['skip_mutations']:
+            requests = [r for r in requests if 'mutation' not in r.get('kinds', ())]
+        requests = requests[:options['limit']] if options['limit'] else requests
+        if not requests:
+            raise CommandError('No hay peticiones para reproducir')
+
+        self.base_url = options['url'].rstrip('/')
+        self.timeout = options['timeout']
+        self.headers = {'Content-Type': 'application/json', 'Accept-Encoding': 'identity'}
+        if options['token']:
+            self.headers['Authorization'] = f'JWT {options["token"]}'
+        for header in options['header']:
+            name, _, value = header.partition(':')
+            self.headers[name.strip()] = value.strip()
+
+        results, lock = [None] * len(requests), threading.Lock()
+        first_ts, speed = requests[0]['ts'], options['speed']
+        started = time.perf_counter()
+
+        def run(index, record, scheduled):
+            lag = (time.perf_counter() - scheduled) * 1000
+            result = self.send(record)
+            result.update(index=index, label=record['label'], lag_ms=round(max(lag, 0), 2),
+                          recorded_ms=record.get('duration_ms'), recorded_failures=record.get('failures'))
+            with lock:
+                results[index] = result
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            for index, record in enumerate(requests):
+                scheduled = started
+                if speed > 0:
+                    scheduled = started + (record['ts'] - first_ts) / speed
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                pool.submit(run, index, record, scheduled)
+        elapsed = time.perf_counter() - started
+
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            for result in results:
+                output.write(json.dumps(result) + '\n')
+
+        self.stdout.write(f'{len(results)} peticiones en {elapsed:.1f} s '
+                          f'({len(results) / elapsed:.1f} req/s, concurrencia {options["concurrency"]})')
+        lags = [r['lag_ms'] for r in results]
+        self.stdout.write(f'Retraso sobre el ritmo grabado: p95 {recording.percentile(lags, 0.95):.0f} ms')
+        self.stdout.write(f'{"operación":40} {"n":>6} {"p50":>8} {"p95":>8} {"p99":>8} {"fallas":>7}')
+        summary = recording.summarize(results)
+        for label, row in sorted(summary.items(), key=lambda item: -item[1]['count']):
+            self.stdout.write(f'{label[:40]:40} {row["count"]:6d} {row["p50"] or 0:8.1f} {row["p95"] or 0:8.1f} '
+                              f'{row["p99"] or 0:8.1f} {row["failed"]:7d}')
+
+    def send(self, record):
+        headers = dict(self.headers)
+        for name, value in record.get('headers', {}).items():
+            headers[name[5:].replace('_', '-').title()] = value
+        url = self.base_url + record['path']
+        body = record['body']
+        if record['method'] == 'GET':
+            params = {'query': body.get('query')}
+            if body.get('variables'):
+                params['variables'] = json.dumps(body['variables'])
+            if body.get('operationName'):
+                params['operationName'] = body['operationName']
+            request = urllib.request.Request(f'{url}?{urllib.parse.urlencode(params)}', headers=headers)
+        else:
+            request = urllib.request.Request(url, data=json.dumps(body).encode('utf-8'), headers=headers,
+                                             method='POST')
+
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status, content = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, content = e.code, e.read()
+        except (urllib.error.URLError, OSError) as e:
+            return {'latency_ms': None, 'status': None, 'failures': None, 'errors': [str(e)]}
+        latency = (time.perf_counter() - started) * 1000
+        return dict({'latency_ms': round(latency, 2), 'status': status}, **self.outcome(content))
+
+    @staticmethod
+    def outcome(content):
+        try:
+            data = json.loads(content or b'null')
+        except ValueError:
+            return {'failures': None, 'errors': ['Respuesta no es JSON']}
+        if isinstance(data, dict) and isinstance(data.get('results'), list):
+            data = data['results']
+        results = [r for r in (data if isinstance(data, list) else [data]) if isinstance(r, dict)]
+        messages = []
+        for result in results:
+            messages.extend(error.get('message') for error in result.get('errors') or [])
+            for payload in (result.get('data') or {}).values():
+                if isinstance(payload, dict) and payload.get('success') is False:
+                    messages.extend((e or {}).get('message') or str((e or {}).get('messages'))
+                                    for e in payload.get('errors') or [])
+        return {'failures': sum(1 for r in results if failed(r)), 'errors': messages[:5]}
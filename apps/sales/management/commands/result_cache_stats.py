@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from djangoProject import queries, result_cache  # noqa: F401  (queries registra los resolvers cacheados)
+
+
+class Command(BaseCommand):
+    help = 'Muestra aciertos, fallos y esperas del cache de resultados por resolver'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*')
+        parser.add_argument('--reset', action='store_true', help='Pone los contadores en cero después de mostrarlos')
+
+    def handle(self, *args, **options):
+        names = options['names'] or None
+        for name, counts in result_cache.metrics(names).items():
+            total = sum(counts.values())
+            served = counts['hit'] + counts['wait']
+            ratio = f'{served / total:.1%}' if total else '-'
+            self.stdout.write(f'{name:20} aciertos {counts["hit"]:8} esperas {counts["wait"]:6} '
+                              f'fallos {counts["miss"]:6} servidos desde cache {ratio}')
+        if options['reset']:
+            result_cache.reset_metrics(names)
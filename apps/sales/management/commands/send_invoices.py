@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.sales import billing
+
+
+class Command(BaseCommand):
+    help = 'Envía al proveedor de facturación electrónica los comprobantes pendientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=billing.BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--once', action='store_true', help='Procesa un solo lote y termina')
+
+    def handle(self, *args, **options):
+        try:
+            billing.run(batch_size=options['batch_size'], workers=options['workers'], once=options['once'])
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,59 @@
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from djangoProject import slow_queries
+
+
+class Command(BaseCommand):
+    help = ('Resume el log de consultas lentas: sentencias (por huella) con más tiempo total, las operaciones '
+            'GraphQL y resolvers que las disparan y su último plan.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', default=slow_queries.LOG_PATH)
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument('--operation', help='Solo registros de esta operación')
+        parser.add_argument('--since', help='Solo registros desde esta fecha ISO (ej. 2026-01-31)')
+        parser.add_argument('--no-explain', action='store_true', help='No mostrar los planes')
+
+    def handle(self, *args, **options):
+        groups = defaultdict(lambda: {'count': 0, 'total': 0.0, 'max': 0.0, 'durations': [], 'operations': Counter(),
+                                      'paths': Counter(), 'statement': None, 'explain': None})
+        for record in slow_queries.read_log(options['log']):
+            if options['operation'] and record.get('operation') != options['operation']:
+                continue
+            if options['since'] and record.get('time', '') < options['since']:
+                continue
+            group = groups[record['fingerprint']]
+            duration = record['duration_ms']
+            group['count'] += 1
+            group['total'] += duration
+            group['max'] = max(group['max'], duration)
+            group['durations'].append(duration)
+            group['operations'][record.get('operation')] += 1
+            if record.get('path'):
+                group['paths'][record['path']] += 1
+            group['statement'] = record['statement']
+            if record.get('explain'):
+                group['explain'] = record['explain']
+
+        if not groups:
+            raise CommandError(f'No hay consultas lentas registradas en {options["log"]}')
+
+        ranked = sorted(groups.items(), key=lambda item: item[1]['total'], reverse=True)[:options['top']]
+        for position, (digest, group) in enumerate(ranked, 1):
+            durations = sorted(group['durations'])
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{position}. {digest}  total {group["total"] / 1000:.1f} s  {group["count"]} veces  '
+                f'p50 {durations[len(durations) // 2]:.0f} ms  máx {group["max"]:.0f} ms'))
+            self.stdout.write(f'   {group["statement"][:500]}')
+            operations = ', '.join(f'{name} ({count})' for name, count in group['operations'].most_common(5))
+            self.stdout.write(f'   Operaciones: {operations}')
+            if group['paths']:
+                paths = ', '.join(f'{name} ({count})' for name, count in group['paths'].most_common(5))
+                self.stdout.write(f'   Resolvers: {paths}')
+            if group['explain'] and not options['no_explain']:
+                self.stdout.write('   Plan:')
+                for line in group['explain'][:30]:
+                    self.stdout.write(f'     {line}')
+            self.stdout.write('')
@@ -0,0 +1,81 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Proceso hijo: arranca Django como un worker nuevo y hace la primera petición GraphQL
+FIRST_RESPONSE_SCRIPT = '''
+import json, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.test import RequestFactory
+from django.urls import resolve
+ready = time.perf_counter()
+request = RequestFactory().post('/graphql/', json.dumps({"query": "{ __typename }"}),
+                                content_type='application/json')
+from django.contrib.auth.models import AnonymousUser
+request.user = AnonymousUser()
+response = resolve('/graphql/').func(request)
+done = time.perf_counter()
+print(json.dumps({"setup": ready - start, "first_response": done - start, "status": response.status_code}))
+'''
+
+IMPORT_SCRIPT = 'import django; django.setup(); import djangoProject.urls; from djangoProject.schema import get_schema; get_schema()'
+
+IMPORT_TIME_RE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de importación por módulo y el tiempo hasta la primera respuesta de un worker nuevo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budget-ms', type=float,
+                            default=getattr(settings, 'STARTUP_BUDGET_MS', 2000),
+                            help='Presupuesto para la primera respuesta (incluye arranque del intérprete)')
+        parser.add_argument('--module-budget-ms', type=float,
+                            default=getattr(settings, 'STARTUP_MODULE_BUDGET_MS', 300),
+                            help='Presupuesto de importación acumulada por módulo del proyecto')
+        parser.add_argument('--top', type=int, default=15)
+
+    def run_child(self, args):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE',
+                                                                     'djangoProject.settings'))
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, *args], capture_output=True, text=True, env=env,
+                                cwd=settings.BASE_DIR if hasattr(settings, 'BASE_DIR') else None)
+        if result.returncode != 0:
+            raise CommandError(result.stderr[-2000:])
+        return result, time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        result, wall = self.run_child(['-c', FIRST_RESPONSE_SCRIPT])
+        timings = json.loads(result.stdout.strip().splitlines()[-1])
+        self.stdout.write(f'Proceso completo: {wall * 1000:.0f} ms | django.setup(): {timings["setup"] * 1000:.0f} ms | '
+                          f'primera respuesta: {timings["first_response"] * 1000:.0f} ms (HTTP {timings["status"]})')
+
+        result, _ = self.run_child(['-X', 'importtime', '-c', IMPORT_SCRIPT])
+        modules = []
+        for line in result.stderr.splitlines():
+            match = IMPORT_TIME_RE.match(line)
+            if match:
+                modules.append((int(match.group(2)) / 1000, int(match.group(1)) / 1000, match.group(4)))
+
+        self.stdout.write(f'\n{"acumulado ms":>13} {"propio ms":>10}  módulo')
+        for cumulative, own, name in sorted(modules, reverse=True)[:options['top']]:
+            self.stdout.write(f'{cumulative:13.1f} {own:10.1f}  {name}')
+
+        failures = []
+        if wall * 1000 > options['budget_ms']:
+            failures.append(f'primera respuesta {wall * 1000:.0f} ms > {options["budget_ms"]:.0f} ms')
+        for cumulative, _, name in modules:
+            if name.split('.')[0] in ('apps', 'djangoProject') and cumulative > options['module_budget_ms']:
+                failures.append(f'{name} {cumulative:.0f} ms > {options["module_budget_ms"]:.0f} ms')
+        if failures:
+            raise CommandError('Presupuesto de arranque excedido: ' + '; '.join(failures))
+        self.stdout.write(self.style.SUCCESS('Dentro del presupuesto de arranque'))
@@ -2,6 +2,7 @@ from decimal import Decimal
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.db.models import Sum, F, Q
 from django.utils import timezone
@@ -31,6 +32,15 @@ PAYMENT_STATUS = (
     ('CANCELLED', 'ANULADO'),
 )
 
+BILLING_STATUS = (
+    ('NONE', 'NO APLICA'),
+    ('PENDING', 'PENDIENTE'),
+    ('SENDING', 'ENVIANDO'),
+    ('SENT', 'ENVIADO'),
+    ('REJECTED', 'RECHAZADO'),
+    ('FAILED', 'FALLIDO'),
+)
+
 
 class Sales(models.Model):
     TYPE_RECEIPT_CHOICES = (('B', 'Boleta'), ('F', 'Factura'), ('T', 'Ticket'))
@@ -49,10 +59,94 @@ class Sales(models.Model):
     provider = models.ForeignKey(ClientSupplier, on_delete=models.CASCADE, blank=True, null=True)
     subsidiary = models.ForeignKey('hrmn.Subsidiary', on_delete=models.CASCADE, related_name='order_subsidiary',
                                    blank=True, null=True)
+    serie = models.CharField(max_length=45, blank=True, null=True)
+    number = models.IntegerField(blank=True, null=True)
+
+    billing_status = models.CharField(max_length=10, choices=BILLING_STATUS, default='NONE')
+    billing_attempts = models.IntegerField(default=0)
+    billing_next_attempt = models.DateTimeField(blank=True, null=True)
+    billing_date = models.DateTimeField(blank=True, null=True)
+    billing_error = models.TextField(blank=True, null=True)
 
     def __str__(self):
         return str(self.id)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['billing_status', 'billing_next_attempt']),
+            # Historial de un cliente (clientHistory) en orden de fecha sin recorrer sus ventas
+            models.Index(fields=['provider', 'date_creation', 'id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['subsidiary', 'serie', 'type_receipt', 'number'],
+                condition=Q(number__isnull=False),
+                name='unique_sale_number_per_serie'
+            ),
+        ]
+
+
+class Correlative(models.Model):
+    """Contador de correlativos por sucursal, serie y tipo de comprobante."""
+    id = models.AutoField(primary_key=True)
+    subsidiary = models.ForeignKey('hrmn.Subsidiary', on_delete=models.CASCADE, related_name='correlatives')
+    serie = models.CharField(max_length=45, default='')
+    type_receipt = models.CharField(max_length=2, choices=Sales.TYPE_RECEIPT_CHOICES)
+    current = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.serie}-{self.type_receipt}-{self.current}'
+
+    class Meta:
+        db_table = 'Correlative'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['subsidiary', 'serie', 'type_receipt'],
+                name='unique_correlative_per_serie'
+            ),
+        ]
+
+
+class CorrelativeBlock(models.Model):
+    """Bloque de correlativos reservado por un terminal para trabajar sin conexión."""
+    id = models.AutoField(primary_key=True)
+    correlative = models.ForeignKey('Correlative', on_delete=models.CASCADE, related_name='blocks')
+    device = models.ForeignKey('Device', on_delete=models.CASCADE, related_name='correlative_blocks')
+    start = models.IntegerField()
+    end = models.IntegerField()
+    next_number = models.IntegerField()
+    is_active = models.BooleanField(default=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.start}-{self.end}'
+
+    class Meta:
+        db_table = 'CorrelativeBlock'
+        indexes = [
+            models.Index(fields=['device', 'is_active']),
+        ]
+
+
+class CorrelativeGap(models.Model):
+    """Número anulado o no utilizado dentro de una serie."""
+    id = models.AutoField(primary_key=True)
+    correlative = models.ForeignKey('Correlative', on_delete=models.CASCADE, related_name='gaps')
+    number = models.IntegerField()
+    reason = models.CharField(max_length=200, blank=True, null=True)
+    sale = models.ForeignKey('Sales', on_delete=models.SET_NULL, related_name='correlative_gaps', blank=True,
+                             null=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return str(self.number)
+
+    class Meta:
+        db_table = 'CorrelativeGap'
+        constraints = [
+            models.UniqueConstraint(fields=['correlative', 'number'], name='unique_correlative_gap'),
+        ]
+
 
 class DetailSales(models.Model):
     id = models.AutoField(primary_key=True)
@@ -83,11 +177,30 @@ class Purchase(models.Model):
     typeReceipt = models.CharField(max_length=2, choices=TYPE_RECEIPT_CHOICES, default='')
     typePay = models.CharField(max_length=2, choices=TYPE_PAY_CHOICES, default='E')
     date = models.DateTimeField(blank=True, null=True)
+    subsidiary = models.ForeignKey('hrmn.Subsidiary', on_delete=models.CASCADE, related_name='purchase_subsidiary',
+                                   blank=True, null=True)
+    n_document = models.CharField(max_length=45, blank=True, null=True)
 
     def __str__(self):
         return str(self.id)
 
 
+class DetailPurchase(models.Model):
+    id = models.AutoField(primary_key=True)
+    purchase = models.ForeignKey(Purchase, on_delete=models.CASCADE, related_name='details')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='detail_purchases')
+    quantity = models.IntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    total = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    def __str__(self):
+        return str(self.id)
+
+    class Meta:
+        db_table = 'DetailPurchase'
+
+
 class Cash(models.Model):
     STATUS_CASH_CHOICES = (('A', 'APERTURA'), ('C', 'CIERRE'))
 
@@ -180,6 +293,80 @@ class Payment(models.Model):
         ]
 
 
+class CashReport(models.Model):
+    """Reporte Z del cierre de caja; se guarda una sola vez y no se modifica."""
+    id = models.AutoField(primary_key=True)
+    cash = models.OneToOneField('sales.Cash', on_delete=models.PROTECT, related_name='report')
+    subsidiary = models.ForeignKey('hrmn.Subsidiary', on_delete=models.PROTECT, blank=True, null=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    date_open = models.DateTimeField(blank=True, null=True)
+    date_close = models.DateTimeField()
+
+    initial_amount = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    total_expected = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    total_counted = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    difference = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    total_sales = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    payments_count = models.IntegerField(default=0)
+    sales_count = models.IntegerField(default=0)
+
+    # {clave: {'total': '0.00', 'count': 0}}
+    by_method = models.JSONField(default=dict)
+    by_payment_type = models.JSONField(default=dict)
+    by_receipt = models.JSONField(default=dict)
+    by_employee = models.JSONField(default=dict)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValidationError('El reporte de cierre no se puede modificar.')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError('El reporte de cierre no se puede eliminar.')
+
+    def __str__(self):
+        return f'Z {self.cash_id} - {self.date_close}'
+
+    class Meta:
+        db_table = 'CashReport'
+
+
+class OutboxEvent(models.Model):
+    """Registro de cambios (solo se agrega); se escribe en la misma transacción que el cambio."""
+    AGGREGATE_CHOICES = (('sale', 'VENTA'), ('payment', 'PAGO'), ('cash', 'CAJA'), ('product', 'PRODUCTO'),
+                         ('purchase', 'COMPRA'), ('transfer', 'TRASLADO'))
+
+    seq = models.BigAutoField(primary_key=True)
+    aggregate = models.CharField(max_length=20, choices=AGGREGATE_CHOICES)
+    aggregate_id = models.BigIntegerField()
+    event_type = models.CharField(max_length=40)
+    subsidiary_id = models.IntegerField(blank=True, null=True)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    published_at = models.DateTimeField(blank=True, null=True)
+    # Orden de publicación: lo asigna el relay en orden de commit (ver outbox.publish)
+    published_seq = models.BigIntegerField(blank=True, null=True, unique=True)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValidationError('Los eventos del outbox no se modifican.')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError('Los eventos del outbox no se eliminan.')
+
+    def __str__(self):
+        return f'{self.seq} {self.event_type} {self.aggregate}:{self.aggregate_id}'
+
+    class Meta:
+        db_table = 'OutboxEvent'
+        indexes = [
+            models.Index(fields=['seq'], condition=Q(published_at__isnull=True), name='outbox_unpublished'),
+            models.Index(fields=['aggregate', 'published_seq'], name='outbox_aggregate_published'),
+            models.Index(fields=['subsidiary_id', 'published_seq'], name='outbox_subsidiary_published'),
+        ]
+
+
 # class CashFlow(models.Model):
 #     STATUS_CASH_CHOICES = (('A', 'APERTURA'), ('C', 'CIERRE'))
 #     RECEIPT_TYPE_CHOICES = (('F', 'FACTURA'), ('B', 'BOLETA'), ('T', 'TICKET'))
@@ -204,6 +391,131 @@ class Payment(models.Model):
 #         db_table = 'CashFlow'
 
 
+class SalesArchive(models.Model):
+    """Ventas de periodos cerrados movidas fuera de la tabla activa por ``archive_sales``."""
+    id = models.IntegerField(primary_key=True)
+    date_creation = models.DateTimeField(blank=True, null=True)
+    date_cancel = models.DateTimeField(blank=True, null=True)
+    employee_creation_id = models.IntegerField(blank=True, null=True)
+    employee_cancel_id = models.IntegerField(blank=True, null=True)
+    type_receipt = models.CharField(max_length=2, choices=Sales.TYPE_RECEIPT_CHOICES, default='B')
+    type_pay = models.CharField(max_length=2, choices=Sales.TYPE_PAY_CHOICES, default='E')
+    total = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    provider_id = models.IntegerField(blank=True, null=True)
+    subsidiary_id = models.IntegerField(blank=True, null=True)
+    serie = models.CharField(max_length=45, blank=True, null=True)
+    number = models.IntegerField(blank=True, null=True)
+    billing_status = models.CharField(max_length=10, choices=BILLING_STATUS, default='NONE')
+    date_archive = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return str(self.id)
+
+    class Meta:
+        db_table = 'SalesArchive'
+        indexes = [
+            models.Index(fields=['subsidiary_id', 'date_creation']),
+            models.Index(fields=['provider_id', 'date_creation']),
+        ]
+
+
+class DetailSalesArchive(models.Model):
+    id = models.IntegerField(primary_key=True)
+    sale_id = models.IntegerField(db_index=True)
+    product_id = models.IntegerField(blank=True, null=True)
+    quantity = models.IntegerField(null=True, blank=True)
+    quantity_cancel = models.IntegerField(blank=True, null=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    total = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    observation = models.CharField(max_length=200, blank=True, null=True)
+
+    def __str__(self):
+        return str(self.id)
+
+    class Meta:
+        db_table = 'DetailSalesArchive'
+
+
+class PaymentArchive(models.Model):
+    id = models.IntegerField(primary_key=True)
+    subsidiary_id = models.IntegerField()
+    cash_id = models.IntegerField(db_index=True)
+    sale_id = models.IntegerField(blank=True, null=True, db_index=True)
+    purchase_id = models.IntegerField(blank=True, null=True)
+    payment_type = models.CharField(max_length=10, choices=PAYMENT_TYPES)
+    payment_method = models.CharField(max_length=10, choices=PAYMENT_METHODS)
+    status = models.CharField(max_length=10, choices=PAYMENT_STATUS, default='PAID')
+    payment_date = models.DateTimeField()
+    due_date = models.DateTimeField(null=True, blank=True)
+    total_amount = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    paid_amount = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    reference_number = models.CharField(max_length=50, blank=True, null=True)
+    notes = models.TextField(blank=True, null=True)
+    user_id = models.IntegerField(blank=True, null=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.payment_date} - {self.paid_amount}'
+
+    class Meta:
+        db_table = 'PaymentArchive'
+
+
+class SalesMonthlySummary(models.Model):
+    """Resumen compacto de un mes archivado por sucursal y tipo de comprobante."""
+    id = models.AutoField(primary_key=True)
+    subsidiary_id = models.IntegerField(blank=True, null=True)
+    month = models.DateField()
+    type_receipt = models.CharField(max_length=2, choices=Sales.TYPE_RECEIPT_CHOICES)
+    sales_count = models.IntegerField(default=0)
+    cancelled_count = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    items_quantity = models.IntegerField(default=0)
+    payments_by_method = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f'{self.month} - {self.type_receipt}'
+
+    class Meta:
+        db_table = 'SalesMonthlySummary'
+        constraints = [
+            models.UniqueConstraint(fields=['subsidiary_id', 'month', 'type_receipt'],
+                                    name='unique_sales_monthly_summary'),
+        ]
+
+
+class ReorderSuggestion(models.Model):
+    """Sugerencia de reposición calculada por ``compute_reorder_suggestions``."""
+    ABC_CHOICES = (('A', 'A'), ('B', 'B'), ('C', 'C'))
+
+    id = models.AutoField(primary_key=True)
+    subsidiary = models.ForeignKey('hrmn.Subsidiary', on_delete=models.CASCADE, related_name='reorder_suggestions',
+                                   blank=True, null=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reorder_suggestions')
+    supplier = models.ForeignKey(ClientSupplier, on_delete=models.SET_NULL, blank=True, null=True)
+    abc_class = models.CharField(max_length=1, choices=ABC_CHOICES, default='C')
+    avg_daily = models.DecimalField(max_digits=12, decimal_places=3, default=Decimal('0'))
+    forecast_lead_time = models.DecimalField(max_digits=12, decimal_places=3, default=Decimal('0'))
+    lead_time_days = models.IntegerField(default=0)
+    safety_stock = models.IntegerField(default=0)
+    reorder_point = models.IntegerField(default=0)
+    stock = models.IntegerField(default=0)
+    suggested_quantity = models.IntegerField(default=0)
+    date_computed = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.product_id} - {self.suggested_quantity}'
+
+    class Meta:
+        db_table = 'ReorderSuggestion'
+        indexes = [
+            models.Index(fields=['subsidiary', 'abc_class']),
+        ]
+
+
 class PaymentDistribution(models.Model):
     id = models.AutoField(primary_key=True)
     # cash_flow = models.ForeignKey(CashFlow, on_delete=models.CASCADE, related_name='distributions')
@@ -220,7 +532,7 @@ class PaymentDistribution(models.Model):
 class Operation(models.Model):
     TYPE_OPERATION = (('E', 'ENTRADA'), ('S', 'SALIDA'), ('I', 'INICIAL'))
     TYPE_DOCUMENT = (('F', 'FACTURA'), ('B', 'BOLETA'), ('T', 'TICKET'), ('GU', 'GUIA'), ('N', 'NINGUNO'))
-    OPERATION_CHOICES = (('C', 'COMPRA'), ('P', 'PRODUCCION'), ('A', 'AJUSTE'), ('T', 'TRASLADO'))
+    OPERATION_CHOICES = (('C', 'COMPRA'), ('P', 'PRODUCCION'), ('A', 'AJUSTE'), ('T', 'TRASLADO'), ('V', 'VENTA'))
 
     id = models.AutoField(primary_key=True)
     employee = models.ForeignKey('hrmn.Employee', on_delete=models.CASCADE, related_name='operation_employee',
@@ -229,6 +541,10 @@ class Operation(models.Model):
                                         related_name='operation_employee', blank=True, null=True)
     detail_order = models.ForeignKey('DetailSales', on_delete=models.CASCADE, related_name='operation_detail_order',
                                      blank=True, null=True)
+    detail_purchase = models.ForeignKey('DetailPurchase', on_delete=models.CASCADE,
+                                        related_name='operation_detail_purchase', blank=True, null=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='operation_product',
+                                blank=True, null=True)
     warehouse = models.ForeignKey('hrmn.Warehouse', on_delete=models.CASCADE, related_name='operation_warehouse',
                                   blank=True, null=True)
     quantity = models.IntegerField(blank=True, null=True)
@@ -247,6 +563,9 @@ class Operation(models.Model):
 
     class Meta:
         db_table = 'Operation'
+        indexes = [
+            models.Index(fields=['product', 'date']),
+        ]
 
     def get_total_price(self):
         if self.quantity is not None and self.price is not None:
@@ -254,6 +573,68 @@ class Operation(models.Model):
         return 0
 
 
+class WarehouseStock(models.Model):
+    """Stock de un producto en un almacén; ``Product.quantity`` sigue siendo el total."""
+    id = models.AutoField(primary_key=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='warehouse_stock')
+    warehouse = models.ForeignKey('hrmn.Warehouse', on_delete=models.CASCADE, related_name='stock')
+    # Copia de warehouse.subsidiary para consultar la disponibilidad de una sucursal con un índice
+    subsidiary = models.ForeignKey('hrmn.Subsidiary', on_delete=models.CASCADE, blank=True, null=True)
+    quantity = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.product_id}@{self.warehouse_id}: {self.quantity}'
+
+    class Meta:
+        db_table = 'WarehouseStock'
+        constraints = [
+            models.UniqueConstraint(fields=['warehouse', 'product'], name='unique_stock_per_warehouse'),
+        ]
+        indexes = [
+            models.Index(fields=['subsidiary', 'product']),
+        ]
+
+
+class ClientStats(models.Model):
+    """Acumulados de compras de un cliente, mantenidos por ``apps.sales.client_stats``."""
+    id = models.AutoField(primary_key=True)
+    client = models.OneToOneField(ClientSupplier, on_delete=models.CASCADE, related_name='stats')
+    tickets_count = models.IntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    first_purchase = models.DateTimeField(blank=True, null=True)
+    last_purchase = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.client_id}: {self.tickets_count}'
+
+    class Meta:
+        db_table = 'ClientStats'
+
+
+class ClientProductStats(models.Model):
+    """Unidades e importe comprados por un cliente de cada producto (sus productos más comprados)."""
+    id = models.AutoField(primary_key=True)
+    client = models.ForeignKey(ClientSupplier, on_delete=models.CASCADE, related_name='+')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=15, decimal_places=2, default=Decimal('0.00'))
+    last_purchase = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f'{self.client_id} - {self.product_id}: {self.quantity}'
+
+    class Meta:
+        db_table = 'ClientProductStats'
+        constraints = [
+            models.UniqueConstraint(fields=['client', 'product'], name='unique_client_product_stats'),
+        ]
+        indexes = [
+            models.Index(fields=['client', '-quantity'], name='client_product_stats_top'),
+        ]
+
+
 class Device(models.Model):
     TYOE_DEVICE_CHOICES = (('S', 'SALIDA'), ('E', 'ENTRADA'))
     # TIPO_DISPOSITIVO_CHOICES = [('S', 'SALIDA'),
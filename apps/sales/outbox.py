@@ -0,0 +1,240 @@
+"""Outbox de cambios para consumidores externos (contabilidad, BI, facturación).
+
+Las mutaciones llaman a ``record`` dentro de su transacción, así el evento
+existe si y solo si el cambio se confirmó. ``relay_batch`` entrega los
+pendientes en lotes y ``changes_since`` sirve la lectura incremental. Un
+evento no se modifica después de grabado; el relay solo le asigna
+``published_seq``.
+
+``seq`` es un autoincremental: una transacción que tomó un número menor
+puede confirmarse después que otra con uno mayor, así que no sirve para
+paginar. ``changes_since`` pagina por ``published_seq``, que el relay asigna
+a eventos ya confirmados y en orden de commit. Si no hay consumidores por
+webhook, el relay se corre con ``--handler apps.sales.outbox.sequence_only``.
+"""
+import json
+import logging
+import time
+import urllib.request
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Case, When, Value, Max
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from apps.sales.models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'OUTBOX_BATCH_SIZE', 500)
+MAX_CHANGES = 1000
+
+
+def record(aggregate, aggregate_id, event_type, payload, subsidiary_id=None):
+    return OutboxEvent.objects.create(aggregate=aggregate, aggregate_id=aggregate_id, event_type=event_type,
+                                      payload=payload, subsidiary_id=subsidiary_id)
+
+
+def sale_created(sale, details):
+    return record('sale', sale.id, 'SALE_CREATED', {
+        'serie': sale.serie,
+        'number': sale.number,
+        'type_receipt': sale.type_receipt,
+        'type_pay': sale.type_pay,
+        'total': sale.total,
+        'provider_id': sale.provider_id,
+        'date_creation': sale.date_creation,
+        'details': [{'product_id': d.product_id, 'quantity': d.quantity, 'price': d.price, 'total': d.total}
+                    for d in details],
+    }, sale.subsidiary_id)
+
+
+def sales_cancelled(cancellations):
+    """Un evento por venta en un solo INSERT; ``cancellations`` son ``(venta, completa, importe, líneas)``."""
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(aggregate='sale', aggregate_id=sale.id, subsidiary_id=sale.subsidiary_id,
+                    event_type='SALE_CANCELLED' if full else 'SALE_PARTIALLY_CANCELLED', payload={
+                        'serie': sale.serie,
+                        'number': sale.number,
+                        'type_receipt': sale.type_receipt,
+                        'amount': amount,
+                        'date_cancel': sale.date_cancel,
+                        'lines': [{'detail_id': detail_id, 'product_id': product_id, 'quantity': quantity}
+                                  for detail_id, _, product_id, quantity, _ in lines],
+                    })
+        for sale, full, amount, lines in cancellations
+    ])
+
+
+def cash_event(cash, event_type, **extra):
+    return record('cash', cash.id, event_type, dict({
+        'status': cash.status,
+        'initial_amount': cash.initialAmount,
+        'closing_amount': cash.closingAmount,
+        'difference': cash.difference,
+        'date_open': cash.dateOpen,
+        'date_close': cash.dateClose,
+    }, **extra), cash.subsidiary_id)
+
+
+def _payment_payload(payment):
+    return {
+        'cash_id': payment.cash_id,
+        'sale_id': payment.sale_id,
+        'purchase_id': payment.purchase_id,
+        'payment_type': payment.payment_type,
+        'payment_method': payment.payment_method,
+        'paid_amount': payment.paid_amount,
+        'payment_date': payment.payment_date,
+    }
+
+
+def payment_created(payment):
+    return record('payment', payment.id, 'PAYMENT_CREATED', _payment_payload(payment), payment.subsidiary_id)
+
+
+def payments_created(payments):
+    """``PAYMENT_CREATED`` de varios pagos en un solo INSERT."""
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(aggregate='payment', aggregate_id=payment.id, event_type='PAYMENT_CREATED',
+                    payload=_payment_payload(payment), subsidiary_id=payment.subsidiary_id)
+        for payment in payments
+    ])
+
+
+def product_updated(product):
+    return record('product', product.id, 'PRODUCT_UPDATED', {
+        'code': product.code,
+        'name': product.name,
+        'price': product.price,
+        'quantity': product.quantity,
+    }, product.subsidiary_id)
+
+
+def purchase_event(purchase, event_type, details=()):
+    return record('purchase', purchase.id, event_type, {
+        'provider_id': purchase.provider_id,
+        'type_receipt': purchase.typeReceipt,
+        'n_document': purchase.n_document,
+        'total': purchase.total,
+        'date': purchase.date,
+        'details': [{'product_id': d.product_id, 'quantity': d.quantity, 'price': d.price} for d in details] or
+                   [{'product_id': purchase.product_id, 'quantity': purchase.quantity, 'price': purchase.price}],
+    }, purchase.subsidiary_id)
+
+
+def stock_transferred(source, target, operations):
+    """``operations`` son las salidas del almacén origen; la primera identifica el traslado."""
+    first = operations[0]
+    return record('transfer', first.id, 'STOCK_TRANSFERRED', {
+        'from_warehouse_id': source.id,
+        'to_warehouse_id': target.id,
+        'to_subsidiary_id': target.subsidiary_id,
+        'n_document': first.n_document,
+        'date': first.date,
+        'lines': [{'product_id': o.product_id, 'quantity': o.quantity} for o in operations],
+    }, source.subsidiary_id)
+
+
+def serialize(event):
+    return {
+        'seq': event.seq,
+        'published_seq': event.published_seq,
+        'aggregate': event.aggregate,
+        'aggregate_id': event.aggregate_id,
+        'event_type': event.event_type,
+        'subsidiary_id': event.subsidiary_id,
+        'payload': event.payload,
+        'created_at': event.created_at,
+    }
+
+
+def changes_since(published_seq, limit=MAX_CHANGES, aggregates=None, subsidiary_id=None):
+    """Eventos publicados después de ``published_seq``, en orden de publicación."""
+    qs = OutboxEvent.objects.filter(published_seq__gt=published_seq)
+    if aggregates:
+        qs = qs.filter(aggregate__in=aggregates)
+    if subsidiary_id is not None:
+        qs = qs.filter(subsidiary_id=subsidiary_id)
+    return list(qs.order_by('published_seq')[:limit])
+
+
+def webhook_handler(events):
+    """Entrega por POST a ``OUTBOX_WEBHOOK_URL``; un error deja el lote pendiente."""
+    url = getattr(settings, 'OUTBOX_WEBHOOK_URL', None)
+    if not url:
+        raise RuntimeError('OUTBOX_WEBHOOK_URL no está configurado')
+    body = json.dumps({'events': [serialize(e) for e in events]}, cls=DjangoJSONEncoder).encode('utf-8')
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        if response.status >= 300:
+            raise RuntimeError(f'El webhook respondió {response.status}')
+
+
+def get_handler(path=None):
+    return import_string(path or getattr(settings, 'OUTBOX_HANDLER', 'apps.sales.outbox.webhook_handler'))
+
+
+def sequence_only(events):
+    """Handler que no entrega nada: solo publica los eventos para ``changesSince``."""
+
+
+def publish(events):
+    """Marca ``events`` publicados con ``published_seq`` consecutivos desde el máximo confirmado.
+
+    Un relay que lee el máximo mientras otro tiene números sin confirmar
+    choca con la restricción única y su lote se reintenta. Así un número
+    menor nunca aparece después de que un consumidor pasó por uno mayor.
+    """
+    last = OutboxEvent.objects.aggregate(top=Max('published_seq'))['top'] or 0
+    now = timezone.now()
+    numbers = {event.seq: last + position for position, event in enumerate(events, 1)}
+    OutboxEvent.objects.filter(seq__in=numbers).update(published_at=now, published_seq=Case(
+        *[When(seq=seq, then=Value(number)) for seq, number in numbers.items()]))
+    for event in events:
+        event.published_at, event.published_seq = now, numbers[event.seq]
+
+
+def relay_batch(handler, batch_size=BATCH_SIZE):
+    """Publica un lote de eventos pendientes y lo entrega; devuelve cuántos.
+
+    Si el handler falla se deshace todo el lote, también su ``published_seq``.
+    """
+    with transaction.atomic():
+        events = list(OutboxEvent.objects.select_for_update(skip_locked=True)
+                      .filter(published_at__isnull=True).order_by('seq')[:batch_size])
+        if not events:
+            return 0
+        publish(events)
+        handler(events)
+    return len(events)
+
+
+def relay(handler, batch_size=BATCH_SIZE, once=False, idle_sleep=1, log=None):
+    total = 0
+    while True:
+        try:
+            sent = relay_batch(handler, batch_size)
+        except Exception:
+            logger.exception('Error entregando eventos del outbox')
+            sent = 0
+            if once:
+                raise
+        total += sent
+        if sent and log:
+            log(f'{total} eventos entregados')
+        if once and not sent:
+            return total
+        if not sent:
+            time.sleep(idle_sleep)
+
+
+def prune(days):
+    """Elimina los eventos ya publicados con más de ``days`` días."""
+    cutoff = timezone.now() - timedelta(days=days)
+    # QuerySet.delete no pasa por OutboxEvent.delete
+    deleted, _ = OutboxEvent.objects.filter(published_at__isnull=False, published_at__lt=cutoff).delete()
+    return deleted
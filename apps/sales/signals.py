@@ -0,0 +1,20 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.sales.models import Sales, Cash, Payment
+from djangoProject import versions
+
+
+@receiver([post_save, post_delete], sender=Sales)
+def sale_changed(sender, instance, **kwargs):
+    versions.bump('sales', f'sales:{instance.subsidiary_id}')
+
+
+@receiver([post_save, post_delete], sender=Payment)
+def payment_changed(sender, instance, **kwargs):
+    versions.bump('payment', f'payment:{instance.subsidiary_id}', f'cash:{instance.cash_id}')
+
+
+@receiver([post_save, post_delete], sender=Cash)
+def cash_changed(sender, instance, **kwargs):
+    versions.bump('cash', f'cash:{instance.id}')
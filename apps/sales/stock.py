@@ -0,0 +1,129 @@
+import logging
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Case, When, F, Value, IntegerField, DecimalField
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.hrmn.models import Warehouse
+from apps.products.models import Product
+from apps.sales.models import WarehouseStock, Operation
+from djangoProject import broadcast, versions
+
+logger = logging.getLogger(__name__)
+
+
+def lock_products(product_ids):
+    """Bloquea los productos en orden de id para evitar interbloqueos entre transacciones."""
+    return {p.id: p for p in Product.objects.select_for_update().filter(id__in=product_ids).order_by('id')}
+
+
+def apply_deltas(deltas, prices=None):
+    """Suma ``deltas[product_id]`` al stock en una sola sentencia UPDATE.
+
+    ``prices`` opcional fija ``purchase_price`` de cada producto en la misma sentencia.
+    La versión de catálogo no se toca aquí: quien llama la programa con ``sync.stamp``.
+    """
+    deltas = {pid: delta for pid, delta in deltas.items() if delta}
+    prices = prices or {}
+    ids = set(deltas) | set(prices)
+    if not ids:
+        return 0
+    fields = {}
+    if deltas:
+        fields['quantity'] = Case(
+            *[When(id=pid, then=Coalesce(F('quantity'), Value(0)) + Value(delta)) for pid, delta in deltas.items()],
+            default=F('quantity'),
+            output_field=IntegerField(),
+        )
+    if prices:
+        fields['purchase_price'] = Case(
+            *[When(id=pid, then=Value(price)) for pid, price in prices.items()],
+            default=F('purchase_price'),
+            output_field=DecimalField(max_digits=10, decimal_places=2),
+        )
+    return Product.objects.filter(id__in=ids).update(**fields)
+
+
+def default_warehouse(subsidiary_id):
+    """Almacén habilitado de menor id de la sucursal; es el que usan ventas y compras sin almacén."""
+    if subsidiary_id is None:
+        return None
+    return Warehouse.objects.filter(subsidiary_id=subsidiary_id, is_enabled=True).order_by('id').first()
+
+
+def apply_warehouse_deltas(warehouse, deltas):
+    """Suma ``deltas[product_id]`` al stock del almacén: un UPDATE para las filas existentes y
+    un INSERT para las que faltan.
+
+    Se llama con los productos ya bloqueados (``lock_products``), así dos transacciones
+    no crean la misma fila ni pierden actualizaciones.
+    """
+    deltas = {pid: delta for pid, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    if warehouse is None:
+        # Product.quantity cambia sin almacén: la suma de WarehouseStock queda desfasada
+        logger.warning('Movimiento de stock sin almacén para los productos %s', sorted(deltas))
+        return
+    existing = set(WarehouseStock.objects.filter(warehouse=warehouse, product_id__in=deltas)
+                   .values_list('product_id', flat=True))
+    if existing:
+        WarehouseStock.objects.filter(warehouse=warehouse, product_id__in=existing).update(
+            quantity=Case(*[When(product_id=pid, then=F('quantity') + Value(deltas[pid])) for pid in existing],
+                          default=F('quantity'), output_field=IntegerField()),
+            updated_at=timezone.now(),
+        )
+    WarehouseStock.objects.bulk_create([
+        WarehouseStock(warehouse=warehouse, subsidiary_id=warehouse.subsidiary_id, product_id=pid, quantity=delta)
+        for pid, delta in deltas.items() if pid not in existing
+    ])
+
+
+def warehouse_quantities(warehouse, product_ids):
+    return dict(WarehouseStock.objects.filter(warehouse=warehouse, product_id__in=product_ids)
+                .values_list('product_id', 'quantity'))
+
+
+def create_operations(operations):
+    """``bulk_create`` que devuelve las filas con id también en motores sin RETURNING."""
+    if connection.features.can_return_rows_from_bulk_insert:
+        return Operation.objects.bulk_create(operations)
+    for operation in operations:
+        operation.save()
+    return operations
+
+
+def weighted_purchase_prices(products, lines):
+    """Nuevo costo promedio ponderado por producto.
+
+    ``lines`` son pares ``(product_id, quantity, price)``; el stock negativo cuenta como cero.
+    """
+    received = {}
+    for product_id, quantity, price in lines:
+        qty, amount = received.get(product_id, (0, Decimal('0')))
+        received[product_id] = (qty + quantity, amount + Decimal(quantity) * Decimal(price))
+
+    prices = {}
+    for product_id, (qty, amount) in received.items():
+        product = products[product_id]
+        stock = max(product.quantity or 0, 0)
+        cost = product.purchase_price if product.purchase_price is not None else Decimal('0')
+        if stock + qty > 0:
+            prices[product_id] = ((stock * cost + amount) / (stock + qty)).quantize(Decimal('0.01'))
+    return prices
+
+
+def changed(products, deltas):
+    """Refleja los deltas en los objetos bloqueados y avisa a terminales y caches después del commit."""
+    touched = []
+    for product_id, delta in deltas.items():
+        product = products.get(product_id)
+        if product is not None and delta:
+            product.quantity = (product.quantity or 0) + delta
+            touched.append(product)
+    # update() no dispara post_save: se incrementan las versiones a mano
+    versions.bump('product', *{f'product:{p.subsidiary_id}' for p in touched})
+    broadcast.notify_stock(touched)
+    return touched
@@ -1,3 +1,173 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.layers import InMemoryChannelLayer
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.test import TestCase, RequestFactory
+from django.utils import timezone
+from graphql_jwt.shortcuts import get_token
+
+from apps.hrmn.models import Company, Subsidiary
+from apps.sales import billing
+from apps.sales.models import Sales
+from djangoProject import admission, operations
+from djangoProject.broadcast import Broadcaster, ChannelLayerBackend, InMemoryBackend
+
+SUBSCRIBERS = 200
+
+
+class BroadcastFanOutTests(TestCase):
+    """Cada suscriptor del canal recibe un evento publicado exactamente una vez."""
+
+    async def _wait_until(self, predicate, timeout=5):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not predicate():
+            self.assertLess(loop.time(), deadline, 'Los suscriptores no se registraron a tiempo')
+            await asyncio.sleep(0.01)
+
+    async def _fan_out(self, broadcaster, registered):
+        streams = [broadcaster.subscribe('stock.1') for _ in range(SUBSCRIBERS)]
+        first = [asyncio.ensure_future(stream.__anext__()) for stream in streams]
+        await self._wait_until(lambda: registered() == SUBSCRIBERS)
+
+        message = {'product_id': 7, 'subsidiary_id': 1, 'quantity': 3}
+        await sync_to_async(broadcaster.publish)('stock.1', message)
+        received = await asyncio.wait_for(asyncio.gather(*first), timeout=10)
+        self.assertEqual(received, [message] * SUBSCRIBERS)
+
+        # Ningún suscriptor recibe el evento repetido
+        extra = await asyncio.gather(*[asyncio.wait_for(stream.__anext__(), timeout=0.2) for stream in streams],
+                                     return_exceptions=True)
+        self.assertTrue(all(isinstance(result, asyncio.TimeoutError) for result in extra))
+        for stream in streams:
+            await stream.aclose()
+
+    async def test_channel_layer_delivers_once_to_every_subscriber(self):
+        layer = InMemoryChannelLayer(capacity=10)
+        await self._fan_out(Broadcaster(ChannelLayerBackend(layer=layer)),
+                            lambda: len(layer.groups.get('stock.1', {})))
+        self.assertFalse(layer.groups.get('stock.1'))
+
+    async def test_in_memory_backend_delivers_once_to_every_subscriber(self):
+        backend = InMemoryBackend()
+        await self._fan_out(Broadcaster(backend), lambda: len(backend._subscribers.get('stock.1', ())))
+        self.assertNotIn('stock.1', backend._subscribers)
+
+
+CREATE_SALE = 'mutation($input: CreateSaleInput!) { createSale(input: $input) { success } }'
+
+
+class AdmissionBurstTests(TestCase):
+    """Un terminal en bucle agota su propio presupuesto y no el de los terminales de la misma tienda."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = admission.BucketStore(os.path.join(directory.name, 'admission.sqlite3'))
+
+    def sale_request(self, device, subsidiary, **headers):
+        request = self.factory.post('/graphql/', data=json.dumps({
+            'query': CREATE_SALE, 'variables': {'input': {'subsidiaryId': subsidiary, 'deviceId': device}},
+        }), content_type='application/json', HTTP_X_DEVICE_ID=device, REMOTE_ADDR='10.0.0.1', **headers)
+        request.user = AnonymousUser()
+        return request
+
+    def acquire(self, request, now):
+        return self.store.acquire(admission.buckets_for(request, operations.from_request(request)), now=now)
+
+    def test_looping_device_is_throttled_and_normal_devices_are_admitted(self):
+        admitted, rejected = {'loop': 0, 'normal': 0}, {'loop': 0, 'normal': 0}
+        start, seconds = 1_000_000.0, 30
+        events = [(n / 40, 'loop', 'loop') for n in range(40 * seconds)]
+        events += [(n * 5 + device * 0.1, 'normal', f't{device}')
+                   for device in range(10) for n in range(seconds // 5)]
+        for t, actor, device in sorted(events):
+            # Todos los terminales son de la misma sucursal y salen por la misma IP
+            wait = self.acquire(self.sale_request(device, '1'), start + t)
+            (rejected if wait else admitted)[actor] += 1
+
+        self.assertEqual(rejected['normal'], 0)
+        self.assertEqual(admitted['normal'], 10 * (seconds // 5))
+        self.assertGreater(rejected['loop'], admitted['loop'])
+        # Capacidad del bucket del terminal más lo repuesto en la ráfaga
+        capacity, rate = admission.LIMITS['priority']['device']
+        self.assertLessEqual(admitted['loop'], capacity + rate * seconds + 1)
+
+    def test_user_bucket_comes_from_the_jwt(self):
+        first = get_user_model().objects.create_user(username='cajero1', password='x')
+        second = get_user_model().objects.create_user(username='cajero2', password='x')
+        prefix = admission.jwt_settings.JWT_AUTH_HEADER_PREFIX
+
+        def key(user):
+            request = self.sale_request('t1', '1', HTTP_AUTHORIZATION=f'{prefix} {get_token(user)}')
+            return admission.identities(request, operations.from_request(request))['user']
+
+        self.assertEqual(key(first), 'jwt:cajero1')
+        self.assertNotEqual(key(first), key(second))
+        anonymous = self.sale_request('t1', '1')
+        self.assertIsNone(admission.identities(anonymous, operations.from_request(anonymous))['user'])
+
+
+class ProviderStub(BaseHTTPRequestHandler):
+    """Proveedor de facturación simulado: responde el estado que el servidor asigna a cada número."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        document = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        data = json.dumps({'number': document['number']}).encode('utf-8')
+        self.send_response(self.server.statuses[document['number']])
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BillingWorkerTests(TestCase):
+    """El worker envía los comprobantes pendientes y graba el resultado de cada uno."""
+
+    def setUp(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), ProviderStub)
+        server.statuses = {1: 200, 2: 503, 3: 400}
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        company = Company.objects.create(ruc='20123456789', igv=18, token='token', billing_top=True,
+                                         url=f'http://127.0.0.1:{server.server_port}/comprobantes')
+        subsidiary = Subsidiary.objects.create(company=company, serie='B001')
+        self.sales = {number: Sales.objects.create(subsidiary=subsidiary, type_receipt='B', serie='B001', number=number,
+                                                   total=Decimal('11.80'), date_creation=timezone.now(),
+                                                   billing_status='PENDING')
+                      for number in server.statuses}
+
+    def test_process_batch_records_each_response(self):
+        pool = billing.ConnectionPool(timeout=5)
+        self.addCleanup(pool.close)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            processed, counts = billing.process_batch(pool, executor)
+
+        self.assertEqual(processed, 3)
+        self.assertEqual(counts, {'SENT': 1, 'PENDING': 1, 'REJECTED': 1})
+        sent, retry, rejected = (Sales.objects.get(pk=self.sales[number].pk) for number in (1, 2, 3))
+        self.assertEqual(sent.billing_status, 'SENT')
+        self.assertIsNotNone(sent.billing_date)
+        self.assertEqual(retry.billing_status, 'PENDING')
+        self.assertEqual(retry.billing_attempts, 1)
+        self.assertGreater(retry.billing_next_attempt, timezone.now())
+        self.assertIn('HTTP 503', retry.billing_error)
+        self.assertEqual(rejected.billing_status, 'REJECTED')
+        # El reintento espera su plazo y las demás ya no están pendientes
+        self.assertEqual(billing.claim_batch(), [])
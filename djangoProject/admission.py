@@ -0,0 +1,207 @@
+"""Control de admisión para /graphql/ con token buckets.
+
+Cada petición consume fichas de los buckets de su terminal, usuario y
+sucursal según la clase de operación (``priority``, ``mutation``,
+``expensive`` o ``query``). Los buckets se guardan en un SQLite local
+compartido por todos los workers del servidor, así un terminal en un bucle
+de reintentos agota su propio presupuesto y no el de los demás.
+
+Además hay un bucket global: cuando se vacía (sobrecarga) se rechazan
+consultas y mutaciones comunes, pero ``createSale`` y ``closeCash`` pueden
+seguir tomando fichas prestadas y pasan primero.
+
+Se activa agregando ``'djangoProject.admission.AdmissionMiddleware'`` a
+``MIDDLEWARE`` después de ``AuthenticationMiddleware``.
+"""
+import logging
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.http import JsonResponse
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.utils import get_http_authorization, get_payload
+
+from djangoProject import operations
+
+logger = logging.getLogger(__name__)
+
+# clase -> alcance -> (capacidad, fichas por segundo)
+DEFAULT_LIMITS = {
+    'priority': {'device': (30, 1.0), 'user': (60, 2.0), 'subsidiary': (600, 20.0)},
+    'mutation': {'device': (20, 0.5), 'user': (40, 1.0), 'subsidiary': (200, 5.0)},
+    'expensive': {'device': (4, 0.1), 'user': (6, 0.2), 'subsidiary': (12, 0.5)},
+    'query': {'device': (120, 10.0), 'user': (240, 20.0), 'subsidiary': (1200, 100.0)},
+}
+LIMITS = {category: dict(scopes, **getattr(settings, 'ADMISSION_LIMITS', {}).get(category, {}))
+          for category, scopes in DEFAULT_LIMITS.items()}
+GLOBAL_LIMIT = getattr(settings, 'ADMISSION_GLOBAL_LIMIT', (500, 100.0))
+
+PRIORITY_FIELDS = set(getattr(settings, 'ADMISSION_PRIORITY_FIELDS', ('createSale', 'closeCash')))
+EXPENSIVE_FIELDS = set(getattr(settings, 'ADMISSION_EXPENSIVE_FIELDS', (
+    'salesHistory', 'monthlySales', 'correlativeGaps', 'reorderSuggestions', 'cashSummary', 'cashReport',
+    'sales', 'purchases', 'payments',
+)))
+PATHS = set(getattr(settings, 'ADMISSION_PATHS', ('/graphql/', '/graphql/batch/')))
+DB_PATH = getattr(settings, 'ADMISSION_DB_PATH', os.path.join(tempfile.gettempdir(), 'punto_venta_admission.sqlite3'))
+IDLE_SECONDS = 3600
+
+
+class BucketStore:
+    """Buckets en SQLite (WAL); cada admisión es una transacción ``BEGIN IMMEDIATE``."""
+
+    def __init__(self, path, timeout=0.5):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS bucket '
+                               '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+            self._local.connection = connection
+        return connection
+
+    def acquire(self, buckets, now=None):
+        """Toma fichas de todos los buckets o de ninguno.
+
+        ``buckets`` es una lista de ``(clave, capacidad, fichas/s, costo, puede_deber)``.
+        Devuelve 0 si se admite o los segundos a esperar antes de reintentar.
+        """
+        now = time.time() if now is None else now
+        connection = self._connection()
+        keys = [bucket[0] for bucket in buckets]
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            stored = dict((key, (tokens, updated)) for key, tokens, updated in connection.execute(
+                f'SELECT key, tokens, updated FROM bucket WHERE key IN ({",".join("?" * len(keys))})', keys))
+
+            wait, levels = 0.0, []
+            for key, capacity, rate, cost, may_borrow in buckets:
+                tokens, updated = stored.get(key, (capacity, now))
+                tokens = min(capacity, tokens + max(now - updated, 0) * rate)
+                if tokens < cost and not may_borrow:
+                    wait = max(wait, (cost - tokens) / rate if rate > 0 else float(IDLE_SECONDS))
+                # Lo prestado se limita a una capacidad para que la deuda se pague en un tiempo acotado
+                levels.append((key, max(tokens - cost, -capacity)))
+
+            if not wait:
+                connection.executemany('INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)',
+                                       [(key, tokens, now) for key, tokens in levels])
+                if random.random() < 0.001:
+                    connection.execute('DELETE FROM bucket WHERE updated < ?', (now - IDLE_SECONDS,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return wait
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BucketStore(DB_PATH)
+        return _store
+
+
+def classify(operation):
+    names = {name for name, _ in operation.fields}
+    if operation.kind == 'mutation':
+        return 'priority' if names and names <= PRIORITY_FIELDS else 'mutation'
+    if names & EXPENSIVE_FIELDS:
+        return 'expensive'
+    return 'query'
+
+
+def user_key(request):
+    """Usuario de la petición; el JWT se lee aquí porque graphql_jwt lo resuelve recién dentro de GraphQL."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'u{user.pk}'
+    token = get_http_authorization(request)
+    if token:
+        try:
+            username = jwt_settings.JWT_PAYLOAD_GET_USERNAME_HANDLER(get_payload(token))
+        except JSONWebTokenError:
+            username = None
+        if username:
+            return f'jwt:{username}'
+    return None
+
+
+def identities(request, graphql_operations):
+    """Claves de terminal, usuario y sucursal de la petición (las que se conozcan).
+
+    Sin usuario ni terminal se usa la IP; con terminal no, porque todos los
+    terminales de una tienda suelen salir por la misma IP (NAT).
+    """
+    arguments = [dict(args) for op in graphql_operations for _, args in op.fields]
+    device = request.META.get('HTTP_X_DEVICE_ID') or operations.find_argument(arguments, 'deviceId')
+    subsidiary = request.META.get('HTTP_X_SUBSIDIARY_ID') or operations.find_argument(arguments, 'subsidiaryId')
+    user = user_key(request)
+    if user is None and not device:
+        user = 'ip' + request.META.get('REMOTE_ADDR', '')
+    return {'device': device and str(device), 'user': user, 'subsidiary': subsidiary and str(subsidiary)}
+
+
+def buckets_for(request, graphql_operations):
+    costs = Counter(classify(op) for op in graphql_operations)
+    ids = identities(request, graphql_operations)
+    buckets = []
+    for category, cost in costs.items():
+        for scope, (capacity, rate) in LIMITS[category].items():
+            if ids.get(scope):
+                buckets.append((f'{category}:{scope}:{ids[scope]}', capacity, rate, cost, False))
+    # Las operaciones prioritarias también cuentan en la carga global pero pueden dejarla en negativo
+    capacity, rate = GLOBAL_LIMIT
+    total = sum(costs.values())
+    buckets.append(('global', capacity, rate, total, set(costs) == {'priority'}))
+    return buckets
+
+
+def too_many_requests(wait):
+    retry_after = max(1, math.ceil(wait))
+    response = JsonResponse({'errors': [{
+        'message': f'Demasiadas solicitudes, intente nuevamente en {retry_after} s',
+        'extensions': {'code': 'RATE_LIMITED', 'retryAfter': retry_after},
+    }]}, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+class AdmissionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path not in PATHS or request.method not in ('GET', 'POST'):
+            return self.get_response(request)
+        graphql_operations = operations.from_request(request)
+        if not graphql_operations:
+            return self.get_response(request)
+
+        try:
+            wait = get_store().acquire(buckets_for(request, graphql_operations))
+        except sqlite3.Error:
+            # Sin almacén de buckets no se bloquea la venta
+            logger.warning('Control de admisión no disponible', exc_info=True)
+            wait = 0
+        if wait:
+            return too_many_requests(wait)
+        return self.get_response(request)
@@ -13,4 +13,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djangoProject.settings')
 
-application = get_asgi_application()
+# Django debe inicializarse antes de importar consumers (importan modelos)
+django_application = get_asgi_application()
+
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from django.urls import path  # noqa: E402
+
+from djangoProject.consumers import GraphQLSubscriptionConsumer  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': django_application,
+    'websocket': AuthMiddlewareStack(URLRouter([
+        path('graphql/', GraphQLSubscriptionConsumer.as_asgi()),
+    ])),
+})
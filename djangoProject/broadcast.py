@@ -0,0 +1,123 @@
+"""Difusión de eventos a las suscripciones GraphQL.
+
+Las mutaciones publican después del commit; cada suscriptor recibe los
+mensajes de su canal (``stock.<subsidiary_id>``, ``cash.<cash_id>``,
+``sale.<subsidiary_id>``). El backend por defecto vive en el proceso; con
+varios workers se usa ``ChannelLayerBackend`` sobre la capa de channels.
+"""
+import asyncio
+import threading
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+QUEUE_SIZE = getattr(settings, 'GRAPHQL_BROADCAST_QUEUE_SIZE', 100)
+
+
+class InMemoryBackend:
+    """Reparte los mensajes a colas asyncio de los suscriptores de este proceso."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _put(queue, message):
+        if queue.full():
+            # Un suscriptor lento pierde los mensajes más antiguos, no bloquea al resto.
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._put, queue, message)
+
+    async def subscribe(self, channel):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=QUEUE_SIZE))
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(subscriber)
+        try:
+            while True:
+                yield await subscriber[1].get()
+        finally:
+            with self._lock:
+                self._subscribers.get(channel, set()).discard(subscriber)
+                if not self._subscribers.get(channel):
+                    self._subscribers.pop(channel, None)
+
+
+class ChannelLayerBackend:
+    """Usa la capa de channels (Redis en producción) para repartir entre procesos."""
+
+    def __init__(self, alias='default', layer=None):
+        from channels.layers import get_channel_layer
+        self.layer = layer or get_channel_layer(alias)
+
+    def publish(self, channel, message):
+        async_to_sync(self.layer.group_send)(channel, {'type': 'broadcast.message', 'payload': message})
+
+    async def subscribe(self, channel):
+        name = await self.layer.new_channel()
+        await self.layer.group_add(channel, name)
+        try:
+            while True:
+                event = await self.layer.receive(name)
+                yield event['payload']
+        finally:
+            await self.layer.group_discard(channel, name)
+
+
+class Broadcaster:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def publish(self, channel, message):
+        self.backend.publish(channel, message)
+
+    def publish_on_commit(self, channel, message):
+        transaction.on_commit(lambda: self.publish(channel, message))
+
+    def subscribe(self, channel):
+        return self.backend.subscribe(channel)
+
+
+def _default_backend():
+    backend = getattr(settings, 'GRAPHQL_BROADCAST_BACKEND', None)
+    return import_string(backend)() if backend else InMemoryBackend()
+
+
+broadcaster = Broadcaster(_default_backend())
+
+
+def notify_stock(products):
+    for product in products:
+        broadcaster.publish_on_commit(f'stock.{product.subsidiary_id}', {
+            'product_id': product.id,
+            'subsidiary_id': product.subsidiary_id,
+            'quantity': product.quantity,
+        })
+
+
+def notify_cash(cash, event):
+    broadcaster.publish_on_commit(f'cash.{cash.id}', {
+        'cash_id': cash.id,
+        'event': event,
+        'status': cash.status,
+        'total_sales': str(cash.totalSales),
+        'difference': str(cash.difference),
+    })
+
+
+def notify_sale(sale):
+    broadcaster.publish_on_commit(f'sale.{sale.subsidiary_id}', {
+        'sale_id': sale.id,
+        'subsidiary_id': sale.subsidiary_id,
+        'type_receipt': sale.type_receipt,
+        'serie': sale.serie,
+        'number': sale.number,
+        'total': str(sale.total),
+    })
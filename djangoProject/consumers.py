@@ -0,0 +1,74 @@
+import asyncio
+
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from graphql import ExecutionResult
+
+from djangoProject.schema import get_schema
+
+
+class SubscriptionContext:
+    def __init__(self, scope):
+        self.scope = scope
+        self.user = scope.get('user')
+
+
+class GraphQLSubscriptionConsumer(AsyncJsonWebsocketConsumer):
+    """Suscripciones GraphQL con el protocolo ``graphql-transport-ws``."""
+
+    subprotocol = 'graphql-transport-ws'
+
+    async def connect(self):
+        self.operations = {}
+        self.initialized = False
+        await self.accept(subprotocol=self.subprotocol)
+
+    async def disconnect(self, code):
+        for task in self.operations.values():
+            task.cancel()
+        self.operations.clear()
+
+    async def receive_json(self, content, **kwargs):
+        message_type = content.get('type')
+        if message_type == 'connection_init':
+            self.initialized = True
+            await self.send_json({'type': 'connection_ack'})
+        elif message_type == 'ping':
+            await self.send_json({'type': 'pong'})
+        elif message_type == 'subscribe':
+            if not self.initialized:
+                await self.close(code=4401)
+                return
+            operation_id = content['id']
+            if operation_id in self.operations:
+                await self.close(code=4409)
+                return
+            self.operations[operation_id] = asyncio.ensure_future(
+                self.run_operation(operation_id, content.get('payload') or {})
+            )
+        elif message_type == 'complete':
+            task = self.operations.pop(content.get('id'), None)
+            if task:
+                task.cancel()
+
+    async def run_operation(self, operation_id, payload):
+        try:
+            result = await get_schema().subscribe(
+                payload.get('query'),
+                variable_values=payload.get('variables'),
+                operation_name=payload.get('operationName'),
+                context_value=SubscriptionContext(self.scope),
+            )
+            if isinstance(result, ExecutionResult):
+                await self.send_json({'type': 'error', 'id': operation_id,
+                                      'payload': [error.formatted for error in result.errors or []]})
+                return
+            try:
+                async for execution_result in result:
+                    await self.send_json({'type': 'next', 'id': operation_id,
+                                          'payload': execution_result.formatted})
+            finally:
+                # Libera la suscripción en el broadcaster aunque la tarea se cancele
+                await result.aclose()
+            await self.send_json({'type': 'complete', 'id': operation_id})
+        finally:
+            self.operations.pop(operation_id, None)
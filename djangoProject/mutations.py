@@ -4,28 +4,27 @@ from decimal import Decimal
 import graphene
 import graphql_jwt
 
-from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout, get_user_model
-from django.contrib.auth.forms import UserCreationForm
 from django.db import transaction, IntegrityError
-from django.contrib.auth.tokens import default_token_generator
-from django.db.models import Sum
-from django.utils.http import urlsafe_base64_encode
-from django.utils.encoding import force_bytes
 from graphene_django.types import ErrorType
 
-from apps.hrmn.models import ClientSupplier, Subsidiary, Employee
+from apps.hrmn.models import ClientSupplier, Subsidiary, Warehouse
 from apps.products.models import Product
-from apps.sales.models import Purchase, Sales, DetailSales, Cash, Payment
+from apps.products import pricing, sync
+from apps.sales.models import Purchase, Sales, DetailSales, Cash, Payment, Device, CorrelativeBlock, DetailPurchase, \
+    Operation
+from apps.sales import correlatives, billing, stock, cash_report, outbox, cancellation, client_stats
 from .types import (
-    RegisterUserInput, LoginUserInput,
+    RegisterUserInput, LoginUserInput, UserType,
     RegisterUserPayload, LoginUserPayload, LogoutUserPayload,
     AuthErrorType, CreateProductInput, ProductType, CreatePurchaseInput, PurchaseType, CreateClientSupplierInput,
     ClientSupplierType, UpdateClientSupplierInput, UpdateProductInput, CreateSaleInput, SaleType, OpenCashInput,
-    CashType, CloseCashInput, CashSummaryType, MethodTotal, CreateExpensePaymentInput, PaymentType, UpdatePurchaseInput
+    CashType, CloseCashInput, CashSummaryType, MethodTotal, CreateExpensePaymentInput, UpdatePurchaseInput,
+    ReserveCorrelativeBlockInput, VoidCorrelativeInput, CorrelativeBlockType, CorrelativeGapType,
+    CreatePurchaseDocumentInput, CashReportType, TransferStockInput, OperationType, CancelSaleInput,
+    CancelSalesInput
 )
-from django.contrib.auth import get_user_model
-from .types import UserType
+from . import broadcast
 
 User = get_user_model()
 
@@ -195,7 +194,14 @@ class UpdateProduct(graphene.Mutation):
             product.alias = input.alias
             product.quantity = input.quantity
 
-            product.save()
+            with transaction.atomic():
+                # El ajuste manual de cantidad se refleja en el almacén principal de la sucursal
+                previous = stock.lock_products([product.id])[product.id].quantity or 0
+                product.save()
+                stock.apply_warehouse_deltas(stock.default_warehouse(product.subsidiary_id),
+                                             {product.id: (product.quantity or 0) - previous})
+                outbox.product_updated(product)
+            broadcast.notify_stock([product])
 
             return UpdateProduct(product=product, success=True, errors=None)
         except Product.DoesNotExist:
@@ -224,9 +230,6 @@ class CreateSale(graphene.Mutation):
 
     def mutate(self, info, input):
         try:
-            from django.utils import timezone
-            from decimal import Decimal
-
             # Validar que haya al menos un producto
             if not input.details or len(input.details) == 0:
                 return CreateSale(
@@ -269,15 +272,34 @@ class CreateSale(graphene.Mutation):
                         errors=[AuthErrorType(message=f"Sucursal '{input.subsidiaryId}' no encontrada")]
                     )
 
+            # Almacén que despacha la venta
+            if input.warehouseId:
+                warehouse = Warehouse.objects.filter(id=input.warehouseId, subsidiary=subsidiary).first()
+                if warehouse is None:
+                    return CreateSale(
+                        sale=None,
+                        success=False,
+                        errors=[AuthErrorType(message=f"Almacén '{input.warehouseId}' no encontrado en la sucursal")]
+                    )
+            else:
+                warehouse = stock.default_warehouse(subsidiary.id if subsidiary else None)
+                if warehouse is None:
+                    # Sin almacén Product.quantity dejaría de coincidir con la suma de WarehouseStock
+                    message = ("La sucursal no tiene un almacén habilitado para descontar el stock" if subsidiary
+                               else "Debe indicar la sucursal o el almacén de la venta")
+                    return CreateSale(sale=None, success=False, errors=[AuthErrorType(message=message)])
+
             # Calcular el total de la venta sumando todos los detalles
             total_sale = Decimal('0.00')
             detail_objects = []
+            # Los precios salen de las reglas de la sucursal, no de lo que envía el terminal
+            price_rules = pricing.get_pricing(subsidiary.id if subsidiary else None)
+            products = Product.objects.in_bulk({int(detail_input.productId) for detail_input in input.details})
 
             # Validar y preparar los detalles
             for detail_input in input.details:
-                try:
-                    product = Product.objects.get(id=detail_input.productId)
-                except Product.DoesNotExist:
+                product = products.get(int(detail_input.productId))
+                if product is None:
                     return CreateSale(
                         sale=None,
                         success=False,
@@ -294,39 +316,114 @@ class CreateSale(graphene.Mutation):
                         )]
                     )
 
-                total_sale += Decimal(str(detail_input.total))
+                price = price_rules.unit_price(product.id, product.category_id, product.price, detail_input.quantity)
+                line_total = price * detail_input.quantity
+                total_sale += line_total
 
                 # Preparar objeto DetailSales (aún no guardado)
                 detail_obj = DetailSales(
                     product=product,
                     quantity=detail_input.quantity,
-                    price=detail_input.price,
-                    subtotal=detail_input.subtotal,
-                    total=detail_input.total,
+                    price=price,
+                    subtotal=line_total,
+                    total=line_total,
                     observation=getattr(detail_input, 'observation', None)
                 )
                 detail_objects.append(detail_obj)
 
-            # Crear la venta (Sales) - UNA SOLA VENTA
-            sale = Sales.objects.create(
-                date_creation=input.date if input.date else timezone.now(),
-                employee_creation=employee,
-                type_receipt=input.typeReceipt,
-                type_pay=input.typePay,
-                total=total_sale,  # Total de todos los productos
-                provider=provider,
-                subsidiary=subsidiary
-            )
+            # Obtener terminal si se proporciona (bloques de correlativos)
+            device = None
+            if input.deviceId:
+                try:
+                    device = Device.objects.get(id=input.deviceId)
+                except Device.DoesNotExist:
+                    return CreateSale(
+                        sale=None,
+                        success=False,
+                        errors=[AuthErrorType(message=f"Terminal '{input.deviceId}' no encontrado")]
+                    )
+
+            if input.number is not None:
+                if not (subsidiary and device and
+                        correlatives.block_contains(subsidiary, input.typeReceipt, device, input.number)):
+                    return CreateSale(
+                        sale=None,
+                        success=False,
+                        errors=[AuthErrorType(
+                            message=f"El correlativo {input.number} no pertenece a un bloque del terminal")]
+                    )
 
-            # Crear los detalles de venta (DetailSales) - MÚLTIPLES DETALLES
-            # Todos asociados a la misma venta
+            deltas = {}
             for detail_obj in detail_objects:
-                detail_obj.sale = sale  # Asociar a la misma venta
-                detail_obj.save()
+                deltas[detail_obj.product_id] = deltas.get(detail_obj.product_id, 0) - detail_obj.quantity
 
-                # Actualizar stock del producto
-                detail_obj.product.quantity -= detail_obj.quantity
-                detail_obj.product.save()
+            with transaction.atomic():
+                # Se vuelve a validar con los productos bloqueados: otra venta pudo descontar el stock
+                locked = stock.lock_products(list(deltas))
+                shortage = CreateSale.shortage(locked, deltas, warehouse, strict=bool(input.warehouseId))
+                if shortage:
+                    return CreateSale(sale=None, success=False, errors=[AuthErrorType(message=shortage)])
+
+                # Crear la venta (Sales) - UNA SOLA VENTA
+                sale = Sales.objects.create(
+                    date_creation=input.date if input.date else timezone.now(),
+                    employee_creation=employee,
+                    type_receipt=input.typeReceipt,
+                    type_pay=input.typePay,
+                    total=total_sale,  # Total de todos los productos
+                    provider=provider,
+                    subsidiary=subsidiary
+                )
+
+                # Crear los detalles de venta (DetailSales) - MÚLTIPLES DETALLES
+                # Todos asociados a la misma venta
+                for detail_obj in detail_objects:
+                    detail_obj.sale = sale  # Asociar a la misma venta
+                    detail_obj.save()
+
+                # Stock total y del almacén en una sentencia cada uno, con su salida por línea
+                stock.apply_deltas(deltas)
+                stock.apply_warehouse_deltas(warehouse, deltas)
+                Operation.objects.bulk_create([
+                    Operation(
+                        client_supplier=provider,
+                        product_id=detail_obj.product_id,
+                        detail_order=detail_obj,
+                        warehouse=warehouse,
+                        quantity=detail_obj.quantity,
+                        price=detail_obj.price,
+                        date=sale.date_creation,
+                        type_operation='S',
+                        type_document=input.typeReceipt,
+                        operation='V',
+                    )
+                    for detail_obj in detail_objects
+                ])
+
+                # La facturación electrónica la envía el worker después del commit
+                billing.mark_pending(sale)
+                client_stats.record_sale(sale, detail_objects)
+                # La versión de catálogo se toma después del commit, fuera de la transacción de la venta
+                sync.stamp(deltas)
+
+                # Asignar el correlativo al final: la fila del contador queda
+                # bloqueada solo hasta el commit de esta transacción. Después
+                # solo se escriben filas propias de esta transacción: la venta
+                # numerada y su SALE_CREATED, que el outbox no vuelve a modificar.
+                if subsidiary:
+                    if input.number is not None:
+                        sale.serie, sale.number = correlatives.claim_number(subsidiary, input.typeReceipt, device,
+                                                                            input.number)
+                    else:
+                        allocated = None
+                        if device:
+                            allocated = correlatives.take_from_block(subsidiary, input.typeReceipt, device)
+                        sale.serie, sale.number = allocated or correlatives.allocate(subsidiary, input.typeReceipt)
+                    Sales.objects.filter(pk=sale.pk).update(serie=sale.serie, number=sale.number)
+                outbox.sale_created(sale, detail_objects)
+
+                stock.changed(locked, deltas)
+                broadcast.notify_sale(sale)
 
             return CreateSale(sale=sale, success=True, errors=None)
 
@@ -339,6 +436,80 @@ class CreateSale(graphene.Mutation):
                 errors=[AuthErrorType(message=str(e))]
             )
 
+    @staticmethod
+    def shortage(products, deltas, warehouse=None, strict=True):
+        """Mensaje del primer producto sin stock suficiente; con almacén también se valida su stock.
+
+        Un producto sin fila en el almacén tiene cero con ``strict``; sin él (almacén principal
+        implícito) aún no se cargó con ``init_warehouse_stock`` y vale su total.
+        """
+        in_warehouse = stock.warehouse_quantities(warehouse, deltas) if warehouse else None
+        for product_id, delta in deltas.items():
+            product = products.get(product_id)
+            if product is None:
+                return f"Producto '{product_id}' no encontrado"
+            available = product.quantity or 0
+            if in_warehouse is not None and (strict or product_id in in_warehouse):
+                available = min(available, in_warehouse.get(product_id, 0))
+            if available < -delta:
+                return (f"Stock insuficiente para el producto '{product.name}'. "
+                        f"Disponible: {available}, Solicitado: {-delta}")
+        return None
+
+
+def cancel_sales(info, items):
+    """Traduce los inputs de anulación a ``cancellation.cancel`` y devuelve ``(ventas, errores)``."""
+    requests = {}
+    for item in items:
+        lines = None
+        if item.lines:
+            lines = {}
+            for line in item.lines:
+                lines[int(line.detailId)] = lines.get(int(line.detailId), 0) + line.quantity
+        requests[int(item.saleId)] = lines
+
+    user = info.context.user if info.context.user.is_authenticated else None
+    employee = getattr(user, 'employee', None) if user else None
+    try:
+        with transaction.atomic():
+            return cancellation.cancel(requests, employee=employee, user=user), None
+    except Exception as e:
+        return None, [AuthErrorType(message=str(e))]
+
+
+class CancelSale(graphene.Mutation):
+    """Anula una venta completa o algunas de sus líneas"""
+
+    class Arguments:
+        input = CancelSaleInput(required=True)
+
+    sale = graphene.Field(SaleType)
+    success = graphene.Boolean()
+    errors = graphene.List(AuthErrorType)
+
+    def mutate(self, info, input):
+        sales, errors = cancel_sales(info, [input])
+        if errors:
+            return CancelSale(sale=None, success=False, errors=errors)
+        return CancelSale(sale=sales[0], success=True, errors=None)
+
+
+class CancelSales(graphene.Mutation):
+    """Anula varios tickets a la vez: si uno falla no se anula ninguno"""
+
+    class Arguments:
+        input = CancelSalesInput(required=True)
+
+    sales = graphene.List(SaleType)
+    success = graphene.Boolean()
+    errors = graphene.List(AuthErrorType)
+
+    def mutate(self, info, input):
+        sales, errors = cancel_sales(info, input.sales or [])
+        if errors:
+            return CancelSales(sales=None, success=False, errors=errors)
+        return CancelSales(sales=sales, success=True, errors=None)
+
 
 class CreatePurchase(graphene.Mutation):
     class Arguments:
@@ -358,21 +529,228 @@ class CreatePurchase(graphene.Mutation):
                     success=False,
                     errors=[AuthErrorType(message=f"Producto '{input.productId}' no encontrado")]
                 )
-            purchase = Purchase.objects.create(
-                product=product,
-                price=input.price,
-                quantity=input.quantity,
-                subtotal=input.subtotal,
-                total=input.total,
-                typeReceipt=input.typeReceipt,
-                typePay=input.typePay,
-                date=input.date,
-            )
+            with transaction.atomic():
+                purchase = Purchase.objects.create(
+                    product=product,
+                    price=input.price,
+                    quantity=input.quantity,
+                    subtotal=input.subtotal,
+                    total=input.total,
+                    typeReceipt=input.typeReceipt,
+                    typePay=input.typePay,
+                    date=input.date,
+                )
+                outbox.purchase_event(purchase, 'PURCHASE_CREATED')
             return CreatePurchase(purchase=purchase, success=True, errors=None)
         except Exception as e:
             return CreatePurchase(purchase=None, success=False, errors=[AuthErrorType(message=str(e))])
 
 
+class CreatePurchaseDocument(graphene.Mutation):
+    """Compra con varios productos: suma stock, actualiza el costo promedio y registra las entradas"""
+
+    class Arguments:
+        input = CreatePurchaseDocumentInput(required=True)
+
+    purchase = graphene.Field(PurchaseType)
+    success = graphene.Boolean()
+    errors = graphene.List(AuthErrorType)
+
+    def mutate(self, info, input):
+        if not input.details:
+            return CreatePurchaseDocument(purchase=None, success=False,
+                                          errors=[AuthErrorType(message="Debe incluir al menos un producto")])
+        if any(detail.quantity <= 0 for detail in input.details):
+            return CreatePurchaseDocument(purchase=None, success=False,
+                                          errors=[AuthErrorType(message="Las cantidades deben ser mayores a cero")])
+        invalid = next((detail.productId for detail in input.details if not str(detail.productId).isdigit()), None)
+        if invalid is not None:
+            return CreatePurchaseDocument(purchase=None, success=False,
+                                          errors=[AuthErrorType(message=f"Producto '{invalid}' no válido")])
+
+        provider = None
+        if input.providerId:
+            try:
+                provider = ClientSupplier.objects.get(id=input.providerId)
+            except (ClientSupplier.DoesNotExist, ValueError):
+                return CreatePurchaseDocument(purchase=None, success=False, errors=[
+                    AuthErrorType(message=f"Proveedor '{input.providerId}' no encontrado")])
+
+        subsidiary = None
+        if input.subsidiaryId:
+            try:
+                subsidiary = Subsidiary.objects.get(id=input.subsidiaryId)
+            except (Subsidiary.DoesNotExist, ValueError):
+                return CreatePurchaseDocument(purchase=None, success=False, errors=[
+                    AuthErrorType(message=f"Sucursal '{input.subsidiaryId}' no encontrada")])
+
+        if input.warehouseId:
+            warehouse = None
+            if str(input.warehouseId).isdigit():
+                warehouse = Warehouse.objects.filter(id=input.warehouseId, subsidiary=subsidiary).first()
+            if warehouse is None:
+                return CreatePurchaseDocument(purchase=None, success=False, errors=[
+                    AuthErrorType(message=f"Almacén '{input.warehouseId}' no encontrado en la sucursal")])
+        else:
+            warehouse = stock.default_warehouse(subsidiary.id if subsidiary else None)
+            if warehouse is None:
+                message = ("La sucursal no tiene un almacén habilitado para ingresar el stock" if subsidiary
+                           else "Debe indicar la sucursal o el almacén de la compra")
+                return CreatePurchaseDocument(purchase=None, success=False, errors=[AuthErrorType(message=message)])
+
+        product_ids = {int(detail.productId) for detail in input.details}
+        date = input.date or timezone.now()
+        try:
+            with transaction.atomic():
+                products = stock.lock_products(product_ids)
+                missing = product_ids - set(products)
+                if missing:
+                    return CreatePurchaseDocument(purchase=None, success=False, errors=[
+                        AuthErrorType(message=f"Producto '{min(missing)}' no encontrado")])
+
+                details = []
+                for detail in input.details:
+                    subtotal = detail.subtotal if detail.subtotal is not None else detail.price * detail.quantity
+                    details.append(DetailPurchase(
+                        product_id=int(detail.productId),
+                        quantity=detail.quantity,
+                        price=detail.price,
+                        subtotal=subtotal,
+                        total=detail.total if detail.total is not None else subtotal,
+                    ))
+
+                purchase = Purchase.objects.create(
+                    provider=provider,
+                    subsidiary=subsidiary,
+                    quantity=sum(d.quantity for d in details),
+                    subtotal=sum(d.subtotal for d in details),
+                    total=sum(d.total for d in details),
+                    typeReceipt=input.typeReceipt,
+                    typePay=input.typePay,
+                    n_document=input.nDocument,
+                    date=date,
+                )
+                for detail in details:
+                    detail.purchase = purchase
+                details = DetailPurchase.objects.bulk_create(details)
+                if details[0].pk is None:
+                    # Motores sin RETURNING en bulk_create (MySQL) no asignan los ids
+                    details = list(purchase.details.order_by('id'))
+
+                deltas = {}
+                for detail in details:
+                    deltas[detail.product_id] = deltas.get(detail.product_id, 0) + detail.quantity
+                prices = stock.weighted_purchase_prices(
+                    products, [(d.product_id, d.quantity, d.price) for d in details])
+                stock.apply_deltas(deltas, prices)
+                stock.apply_warehouse_deltas(warehouse, deltas)
+
+                Operation.objects.bulk_create([
+                    Operation(
+                        client_supplier=provider,
+                        product_id=detail.product_id,
+                        detail_purchase=detail,
+                        warehouse=warehouse,
+                        quantity=detail.quantity,
+                        price=detail.price,
+                        date=date,
+                        type_operation='E',
+                        type_document=input.typeReceipt,
+                        n_document=input.nDocument,
+                        date_document=date.date(),
+                        operation='C',
+                    )
+                    for detail in details
+                ])
+                outbox.purchase_event(purchase, 'PURCHASE_CREATED', details)
+                sync.stamp(set(deltas) | set(prices))
+                stock.changed(products, deltas)
+
+            return CreatePurchaseDocument(purchase=purchase, success=True, errors=None)
+        except Exception as e:
+            return CreatePurchaseDocument(purchase=None, success=False, errors=[AuthErrorType(message=str(e))])
+
+
+class TransferStock(graphene.Mutation):
+    """Traslado entre almacenes: una SALIDA en el origen y su ENTRADA en el destino por producto"""
+
+    class Arguments:
+        input = TransferStockInput(required=True)
+
+    operations = graphene.List(OperationType)
+    success = graphene.Boolean()
+    errors = graphene.List(AuthErrorType)
+
+    def mutate(self, info, input):
+        if not input.lines:
+            return TransferStock(operations=None, success=False,
+                                 errors=[AuthErrorType(message="Debe incluir al menos un producto")])
+        if any(line.quantity <= 0 for line in input.lines):
+            return TransferStock(operations=None, success=False,
+                                 errors=[AuthErrorType(message="Las cantidades deben ser mayores a cero")])
+        invalid = next((line.productId for line in input.lines if not str(line.productId).isdigit()), None)
+        if invalid is not None:
+            return TransferStock(operations=None, success=False,
+                                 errors=[AuthErrorType(message=f"Producto '{invalid}' no válido")])
+        invalid = next((warehouse_id for warehouse_id in (input.fromWarehouseId, input.toWarehouseId)
+                        if not str(warehouse_id).isdigit()), None)
+        if invalid is not None:
+            return TransferStock(operations=None, success=False,
+                                 errors=[AuthErrorType(message=f"Almacén '{invalid}' no encontrado")])
+        source_id, target_id = int(input.fromWarehouseId), int(input.toWarehouseId)
+        if source_id == target_id:
+            return TransferStock(operations=None, success=False,
+                                 errors=[AuthErrorType(message="El almacén de origen y destino deben ser distintos")])
+
+        warehouses = Warehouse.objects.in_bulk([source_id, target_id])
+        source, target = warehouses.get(source_id), warehouses.get(target_id)
+        if source is None or target is None:
+            return TransferStock(operations=None, success=False,
+                                 errors=[AuthErrorType(message="Almacén no encontrado")])
+
+        quantities = {}
+        for line in input.lines:
+            quantities[int(line.productId)] = quantities.get(int(line.productId), 0) + line.quantity
+        employee = getattr(info.context.user, 'employee', None) if info.context.user.is_authenticated else None
+        date = input.date or timezone.now()
+        try:
+            with transaction.atomic():
+                products = stock.lock_products(list(quantities))
+                missing = set(quantities) - set(products)
+                if missing:
+                    return TransferStock(operations=None, success=False, errors=[
+                        AuthErrorType(message=f"Producto '{min(missing)}' no encontrado")])
+                available = stock.warehouse_quantities(source, quantities)
+                for product_id, quantity in quantities.items():
+                    if available.get(product_id, 0) < quantity:
+                        return TransferStock(operations=None, success=False, errors=[AuthErrorType(
+                            message=f"Stock insuficiente de '{products[product_id].name}' en "
+                                    f"'{source.warehouse}'. Disponible: {available.get(product_id, 0)}, "
+                                    f"Solicitado: {quantity}")])
+
+                # Product.quantity es el total de todos los almacenes: un traslado no lo cambia
+                stock.apply_warehouse_deltas(source, {pid: -qty for pid, qty in quantities.items()})
+                stock.apply_warehouse_deltas(target, quantities)
+
+                common = dict(employee=employee, date=date, type_document='GU', n_document=input.nDocument,
+                              date_document=date.date(), operation='T')
+                exits = stock.create_operations([
+                    Operation(product_id=pid, warehouse=source, quantity=qty, type_operation='S',
+                              price=products[pid].purchase_price, **common)
+                    for pid, qty in quantities.items()
+                ])
+                entries = Operation.objects.bulk_create([
+                    Operation(product_id=out.product_id, warehouse=target, quantity=out.quantity,
+                              type_operation='E', price=out.price, reference=out, **common)
+                    for out in exits
+                ])
+                outbox.stock_transferred(source, target, exits)
+
+            return TransferStock(operations=exits + entries, success=True, errors=None)
+        except Exception as e:
+            return TransferStock(operations=None, success=False, errors=[AuthErrorType(message=str(e))])
+
+
 class UpdatePurchase(graphene.Mutation):
     class Arguments:
         id = graphene.ID(required=True)
@@ -419,13 +797,23 @@ class UpdatePurchase(graphene.Mutation):
                 if field in input and getattr(input, field) is not None:
                     setattr(purchase, field, getattr(input, field))
 
-            purchase.save()
+            with transaction.atomic():
+                purchase.save()
+                outbox.purchase_event(purchase, 'PURCHASE_UPDATED')
             return UpdatePurchase(purchase=purchase, success=True, errors=None)
 
         except Exception as e:
             return UpdatePurchase(purchase=None, success=False, errors=[AuthErrorType(message=str(e))])
 
 
+DUPLICATE_DOCUMENT = "Ya existe un cliente con ese documento"
+
+
+def document_number(value):
+    """Número de documento del input o ``None`` si es negativo."""
+    return value if value is not None and value >= 0 else None
+
+
 class CreateClientSupplier(graphene.Mutation):
     class Arguments:
         input = CreateClientSupplierInput(required=True)
@@ -436,15 +824,31 @@ class CreateClientSupplier(graphene.Mutation):
 
     def mutate(self, info, input):
         try:
-            clientSupplier = ClientSupplier.objects.create(
-                name=input.name,
-                address=input.address,
-                phone=input.phone,
-                mail=input.mail,
-                nDocument=input.nDocument,
-                typeDocument=input.typeDocument,
-                typePerson=input.typePerson
-            )
+            n_document = document_number(input.nDocument)
+            if n_document is None:
+                return CreateClientSupplier(
+                    clientSupplier=None,
+                    success=False,
+                    errors=[AuthErrorType(field="nDocument", message="El número de documento no es válido")]
+                )
+            try:
+                # La restricción única resuelve dos altas simultáneas del mismo documento
+                with transaction.atomic():
+                    clientSupplier = ClientSupplier.objects.create(
+                        name=input.name,
+                        address=input.address,
+                        phone=input.phone,
+                        mail=input.mail,
+                        nDocument=n_document,
+                        typeDocument=input.typeDocument,
+                        typePerson=input.typePerson
+                    )
+            except IntegrityError:
+                return CreateClientSupplier(
+                    clientSupplier=None,
+                    success=False,
+                    errors=[AuthErrorType(field="nDocument", message=DUPLICATE_DOCUMENT)]
+                )
             return CreateClientSupplier(clientSupplier=clientSupplier, success=True, errors=None)
         except Exception as e:
             return CreateClientSupplier(clientSupplier=None, success=False, errors=[AuthErrorType(message=str(e))])
@@ -461,6 +865,13 @@ class UpdateClientSupplier(graphene.Mutation):
 
     def mutate(self, info, id, input):
         try:
+            n_document = document_number(input.nDocument)
+            if n_document is None:
+                return UpdateClientSupplier(
+                    clientSupplier=None,
+                    success=False,
+                    errors=[AuthErrorType(field="nDocument", message="El número de documento no es válido")]
+                )
             clientSupplier = ClientSupplier.objects.get(pk=id)
 
             # Actualizar los camposn
@@ -468,11 +879,19 @@ class UpdateClientSupplier(graphene.Mutation):
             clientSupplier.address = input.address
             clientSupplier.phone = input.phone
             clientSupplier.mail = input.mail
-            clientSupplier.nDocument = input.nDocument
+            clientSupplier.nDocument = n_document
             clientSupplier.typeDocument = input.typeDocument
             clientSupplier.typePerson = input.typePerson
 
-            clientSupplier.save()
+            try:
+                with transaction.atomic():
+                    clientSupplier.save()
+            except IntegrityError:
+                return UpdateClientSupplier(
+                    clientSupplier=None,
+                    success=False,
+                    errors=[AuthErrorType(field="nDocument", message=DUPLICATE_DOCUMENT)]
+                )
 
             return UpdateClientSupplier(clientSupplier=clientSupplier, success=True, errors=None)
         except ClientSupplier.DoesNotExist:
@@ -548,15 +967,18 @@ class OpenCash(graphene.Mutation):
             print(f"Creando caja...")
 
             # USAR CAMELCASE como está definido en el modelo
-            cash = Cash.objects.create(
-                subsidiary=subsidiary,
-                name=getattr(input, 'name', None) or 'Caja',
-                user=user,
-                status='A',
-                initialAmount=Decimal(str(input.initial_amount)),  # ⬅️ camelCase
-                dateOpen=timezone.now(),  # ⬅️ camelCase
-            )
+            with transaction.atomic():
+                cash = Cash.objects.create(
+                    subsidiary=subsidiary,
+                    name=getattr(input, 'name', None) or 'Caja',
+                    user=user,
+                    status='A',
+                    initialAmount=Decimal(str(input.initial_amount)),  # ⬅️ camelCase
+                    dateOpen=timezone.now(),  # ⬅️ camelCase
+                )
+                outbox.cash_event(cash, 'CASH_OPENED')
 
+            broadcast.notify_cash(cash, 'OPEN')
             print(f"Caja {cash.id} creada exitosamente")
             print(f"Detalles: id={cash.id}, status={cash.status}, amount={cash.initialAmount}")
             return OpenCash(cash=cash, success=True, errors=[])
@@ -577,45 +999,41 @@ class CloseCash(graphene.Mutation):
         input = CloseCashInput(required=True)
     cash = graphene.Field(CashType)
     summary = graphene.Field(CashSummaryType)
+    report = graphene.Field(CashReportType)
     success = graphene.Boolean()
     errors = graphene.List(ErrorType)
 
     @staticmethod
     def mutate(root, info, input):
-        try:
-            cash = Cash.objects.get(id=input.cash_id)
-        except Cash.DoesNotExist:
-            return CloseCash(cash=None, summary=None, success=False, errors=[ErrorType(messages=['Caja no encontrada'])])
-
-        if cash.status != 'A':
-            return CloseCash(cash=None, summary=None, success=False, errors=[ErrorType(messages=['La caja no está abierta'])])
-
         user = info.context.user
-
-        payments_qs = Payment.objects.filter(cash=cash, status='PAID')
-        by_method_qs = payments_qs.values('payment_method').annotate(total=Sum('paid_amount'))
-        by_method = [
-            MethodTotal(method=row['payment_method'], total=row['total'] or Decimal('0.00'))
-        for row in by_method_qs
-        ]
-        total_expected = payments_qs.aggregate(t=Sum('paid_amount'))['t'] or Decimal('0.00')
         total_counted = Decimal(str(input.closing_amount))
-        difference = total_counted - total_expected
-
-        cash.closing_amount = total_counted
-        cash.difference = difference
-        cash.status = 'C'
-        cash.date_close = timezone.now()
-        cash.user = user
-        cash.save()
+        with transaction.atomic():
+            # El bloqueo detiene los pagos nuevos de esta caja hasta terminar el cierre
+            cash = Cash.objects.select_for_update().filter(id=input.cash_id).first()
+            if cash is None:
+                return CloseCash(cash=None, summary=None, success=False, errors=[ErrorType(messages=['Caja no encontrada'])])
+            if cash.status != 'A':
+                return CloseCash(cash=None, summary=None, success=False, errors=[ErrorType(messages=['La caja no está abierta'])])
+
+            now = timezone.now()
+            report = cash_report.create(cash, total_counted, user, now)
+
+            cash.closingAmount = total_counted
+            cash.difference = report.difference
+            cash.status = 'C'
+            cash.dateClose = now
+            cash.user = user
+            cash.save()
+            outbox.cash_event(cash, 'CASH_CLOSED', report_id=report.id, total_expected=report.total_expected)
+            broadcast.notify_cash(cash, 'CLOSE')
 
         summary = CashSummaryType(
-            by_method=by_method,
-            total_expected=total_expected,
-            total_counted=total_counted,
-            difference=difference,
+            by_method=[MethodTotal(method=method, total=value['total']) for method, value in report.by_method.items()],
+            total_expected=report.total_expected,
+            total_counted=report.total_counted,
+            difference=report.difference,
         )
-        return CloseCash(cash=cash, summary=summary, success=True, errors=[])
+        return CloseCash(cash=cash, summary=summary, report=report, success=True, errors=[])
 
 
 class CreateExpensePayment(graphene.Mutation):
@@ -630,27 +1048,103 @@ class CreateExpensePayment(graphene.Mutation):
         user = info.context.user
         try:
             subsidiary = Subsidiary.objects.get(id=input.subsidiary_id)
-            cash = Cash.objects.get(id=input.cash_id)
         except Subsidiary.DoesNotExist:
             return CreateExpensePayment(payment=None, success=False, errors=[ErrorType(messages=['Sucursal no encontrada'])])
-        except Cash.DoesNotExist:
-            return CreateExpensePayment(payment=None, success=False, errors=[ErrorType(messages=['Caja no encontrada'])])
-
-        payment = Payment.objects.create(
-            subsidiary=subsidiary,
-            cash=cash,
-            payment_type='EXPENSE',
-            payment_method=input.payment_method,
-            status='PAID',
-            payment_date=input.payment_date or timezone.now(),
-            total_amount=Decimal(str(input.total_amount)),
-            paid_amount=Decimal(str(input.paid_amount)),
-            notes=input.notes or '',
-            user=user,
-        )
+
+        with transaction.atomic():
+            # Espera a un cierre en curso y no registra pagos en una caja ya cerrada
+            cash = Cash.objects.select_for_update().filter(id=input.cash_id).first()
+            if cash is None:
+                return CreateExpensePayment(payment=None, success=False, errors=[ErrorType(messages=['Caja no encontrada'])])
+            if cash.status != 'A':
+                return CreateExpensePayment(payment=None, success=False,
+                                            errors=[ErrorType(messages=['La caja no está abierta'])])
+
+            payment = Payment.objects.create(
+                subsidiary=subsidiary,
+                cash=cash,
+                payment_type='EXPENSE',
+                payment_method=input.payment_method,
+                status='PAID',
+                payment_date=input.payment_date or timezone.now(),
+                total_amount=Decimal(str(input.total_amount)),
+                paid_amount=Decimal(str(input.paid_amount)),
+                notes=input.notes or '',
+                user=user,
+            )
+            outbox.payment_created(payment)
+            broadcast.notify_cash(cash, 'PAYMENT')
         return CreateExpensePayment(payment={'id': str(payment.id)}, success=True, errors=[])
 
 
+class ReserveCorrelativeBlock(graphene.Mutation):
+    """Reserva un bloque de correlativos para que un terminal facture sin conexión"""
+
+    class Arguments:
+        input = ReserveCorrelativeBlockInput(required=True)
+
+    block = graphene.Field(CorrelativeBlockType)
+    success = graphene.Boolean()
+    errors = graphene.List(ErrorType)
+
+    @staticmethod
+    def mutate(root, info, input):
+        try:
+            subsidiary = Subsidiary.objects.get(id=input.subsidiary_id)
+            device = Device.objects.get(id=input.device_id, subsidiary=subsidiary)
+        except Subsidiary.DoesNotExist:
+            return ReserveCorrelativeBlock(block=None, success=False, errors=[ErrorType(messages=['Sucursal no encontrada'])])
+        except Device.DoesNotExist:
+            return ReserveCorrelativeBlock(block=None, success=False, errors=[ErrorType(messages=['Terminal no encontrado'])])
+
+        try:
+            block = correlatives.reserve_block(subsidiary, input.type_receipt, device, input.size)
+        except correlatives.CorrelativeError as e:
+            return ReserveCorrelativeBlock(block=None, success=False, errors=[ErrorType(messages=[str(e)])])
+        return ReserveCorrelativeBlock(block=block, success=True, errors=[])
+
+
+class ReleaseCorrelativeBlock(graphene.Mutation):
+    """Cierra un bloque y registra como anulados los números que no se usaron"""
+
+    class Arguments:
+        block_id = graphene.ID(required=True)
+
+    block = graphene.Field(CorrelativeBlockType)
+    success = graphene.Boolean()
+    errors = graphene.List(ErrorType)
+
+    @staticmethod
+    def mutate(root, info, block_id):
+        try:
+            block = CorrelativeBlock.objects.get(id=block_id, is_active=True)
+        except CorrelativeBlock.DoesNotExist:
+            return ReleaseCorrelativeBlock(block=None, success=False, errors=[ErrorType(messages=['Bloque no encontrado'])])
+        block = correlatives.release_block(block)
+        return ReleaseCorrelativeBlock(block=block, success=True, errors=[])
+
+
+class VoidCorrelative(graphene.Mutation):
+    class Arguments:
+        input = VoidCorrelativeInput(required=True)
+
+    gap = graphene.Field(CorrelativeGapType)
+    success = graphene.Boolean()
+    errors = graphene.List(ErrorType)
+
+    @staticmethod
+    def mutate(root, info, input):
+        try:
+            subsidiary = Subsidiary.objects.get(id=input.subsidiary_id)
+        except Subsidiary.DoesNotExist:
+            return VoidCorrelative(gap=None, success=False, errors=[ErrorType(messages=['Sucursal no encontrada'])])
+
+        sale = Sales.objects.filter(subsidiary=subsidiary, serie=subsidiary.serie or '',
+                                    type_receipt=input.type_receipt, number=input.number).first()
+        gap = correlatives.void_number(subsidiary, input.type_receipt, input.number, reason=input.reason, sale=sale)
+        return VoidCorrelative(gap=gap, success=True, errors=[])
+
+
 class AuthMutation(graphene.ObjectType):
     register_user = RegisterUser.Field()
     login_user = LoginUser.Field()
@@ -658,13 +1152,20 @@ class AuthMutation(graphene.ObjectType):
     create_product = CreateProduct.Field()
     update_product = UpdateProduct.Field()
     create_purchase = CreatePurchase.Field()
+    create_purchase_document = CreatePurchaseDocument.Field()
+    transfer_stock = TransferStock.Field()
     updatePurchase = UpdatePurchase.Field()
     create_sale = CreateSale.Field()
+    cancel_sale = CancelSale.Field()
+    cancel_sales = CancelSales.Field()
     create_client_supplier = CreateClientSupplier.Field()
     update_client_supplier = UpdateClientSupplier.Field()
     open_cash = OpenCash.Field()
     close_cash = CloseCash.Field()
     create_expense_payment = CreateExpensePayment.Field()
+    reserve_correlative_block = ReserveCorrelativeBlock.Field()
+    release_correlative_block = ReleaseCorrelativeBlock.Field()
+    void_correlative = VoidCorrelative.Field()
     token_auth = ObtainJSONWebToken.Field()
     verify_token = graphql_jwt.Verify.Field()
     refresh_token = graphql_jwt.Refresh.Field()
@@ -0,0 +1,106 @@
+"""Lectura de las operaciones GraphQL de una petición HTTP.
+
+Lo usan la vista (ETag), los middlewares y las herramientas de diagnóstico
+para saber qué campos raíz pide una petición sin ejecutar la consulta.
+"""
+import json
+from collections import namedtuple
+
+from graphql import parse, GraphQLError, OperationType
+from graphql.utilities import value_from_ast_untyped
+
+# kind: 'query' | 'mutation' | 'subscription'; fields: [(nombre, {argumento: valor})]
+Operation = namedtuple('Operation', 'kind name fields query variables')
+
+
+def load_payloads(request):
+    """Devuelve la lista de ``{'query', 'variables', 'operationName'}`` de la petición."""
+    if request.method == 'GET':
+        query = request.GET.get('query')
+        if not query:
+            return []
+        try:
+            variables = json.loads(request.GET.get('variables') or '{}')
+        except ValueError:
+            variables = {}
+        return [{'query': query, 'variables': variables, 'operationName': request.GET.get('operationName')}]
+
+    content_type = request.META.get('CONTENT_TYPE', '').split(';')[0].strip()
+    if content_type == 'application/graphql':
+        return [{'query': request.body.decode('utf-8'), 'variables': {}, 'operationName': None}]
+    if content_type != 'application/json':
+        return []
+    try:
+        data = json.loads(request.body or b'null')
+    except ValueError:
+        return []
+    if isinstance(data, dict) and isinstance(data.get('operations'), list):
+        data = data['operations']  # lote atómico de BatchGraphQLView
+    payloads = data if isinstance(data, list) else [data]
+    return [p for p in payloads if isinstance(p, dict) and p.get('query')]
+
+
+def describe(query, variables=None, operation_name=None):
+    """Tipo, nombre y campos raíz (con argumentos resueltos) de la operación a ejecutar."""
+    variables = variables if isinstance(variables, dict) else {}
+    try:
+        document = parse(query)
+    except (GraphQLError, TypeError):
+        return None
+
+    operations = [d for d in document.definitions if hasattr(d, 'operation')]
+    operation = next((o for o in operations if not operation_name or
+                      (o.name and o.name.value == operation_name)), None)
+    if operation is None:
+        return None
+
+    fields = []
+    for selection in operation.selection_set.selections:
+        field = getattr(selection, 'name', None)
+        if field is None:
+            # Fragmentos en la raíz: se tratan como un campo desconocido
+            fields.append((None, {}))
+            continue
+        args = {arg.name.value: value_from_ast_untyped(arg.value, variables) for arg in selection.arguments}
+        fields.append((field.value, args))
+
+    kind = {OperationType.QUERY: 'query', OperationType.MUTATION: 'mutation',
+            OperationType.SUBSCRIPTION: 'subscription'}[operation.operation]
+    return Operation(kind, operation.name.value if operation.name else None, fields, query, variables)
+
+
+def from_request(request):
+    """Operaciones de la petición; se guardan en ``request`` para no volver a parsearlas."""
+    cached = getattr(request, '_graphql_operations', None)
+    if cached is None:
+        cached = []
+        for payload in load_payloads(request):
+            operation = describe(payload['query'], payload.get('variables'), payload.get('operationName'))
+            if operation is not None:
+                cached.append(operation)
+        request._graphql_operations = cached
+    return cached
+
+
+def label(graphql_operations):
+    """Nombre legible de las operaciones para logs y archivos: el nombre o sus campos raíz."""
+    names = [operation.name or '+'.join(name or '?' for name, _ in operation.fields)
+             for operation in graphql_operations]
+    return '_'.join(names) or 'unknown'
+
+
+def find_argument(values, name):
+    """Busca ``name`` en los argumentos, también dentro de objetos input anidados."""
+    if isinstance(values, dict):
+        if values.get(name) not in (None, ''):
+            return values[name]
+        for value in values.values():
+            found = find_argument(value, name)
+            if found is not None:
+                return found
+    elif isinstance(values, list):
+        for value in values:
+            found = find_argument(value, name)
+            if found is not None:
+                return found
+    return None
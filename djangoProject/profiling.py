@@ -0,0 +1,175 @@
+"""Perfilado estadístico a pedido de las operaciones GraphQL.
+
+Un hilo muestrea la pila del hilo que atiende la petición cada
+``PROFILER_INTERVAL`` segundos y el resultado se guarda como *folded stacks*
+(``funcion;funcion;... muestras``), el formato que leen ``flamegraph.pl`` y
+speedscope. Se perfila una petición cuando:
+
+  * trae la cabecera ``X-Profile`` con ``PROFILER_TOKEN`` (o el usuario es staff),
+  * alguna operación o campo raíz está en ``PROFILER_OPERATIONS``, o
+  * cae en la muestra aleatoria ``PROFILER_SAMPLE_RATE``.
+
+Con la tasa en 0, sin filtro y sin la cabecera el middleware solo compara la
+ruta. Los archivos van a ``PROFILER_DIR`` y se conservan los
+``PROFILER_MAX_FILES`` más recientes.
+
+Se activa agregando ``djangoProject.profiling.ProfilingMiddleware`` a
+``MIDDLEWARE`` después de ``AuthenticationMiddleware``.
+"""
+import itertools
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from djangoProject import operations
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = getattr(settings, 'PROFILER_SAMPLE_RATE', 0.0)
+OPERATIONS = set(getattr(settings, 'PROFILER_OPERATIONS', ()))
+TOKEN = getattr(settings, 'PROFILER_TOKEN', None)
+INTERVAL = getattr(settings, 'PROFILER_INTERVAL', 0.005)
+DIR = getattr(settings, 'PROFILER_DIR', os.path.join(tempfile.gettempdir(), 'punto_venta_profiles'))
+MAX_FILES = getattr(settings, 'PROFILER_MAX_FILES', 200)
+MIN_DURATION = getattr(settings, 'PROFILER_MIN_DURATION', 0.0)
+PATHS = set(getattr(settings, 'PROFILER_PATHS', ('/graphql/', '/graphql/batch/')))
+
+ENABLED = bool(SAMPLE_RATE or OPERATIONS)
+UNSAFE = re.compile(r'[^A-Za-z0-9_.-]+')
+_sequence = itertools.count()
+
+
+class Sampler:
+    """Cuenta las pilas de ``thread_id`` desde un hilo aparte mientras está activo."""
+
+    def __init__(self, thread_id, interval=INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = f'{code.co_name} ({short_path(code.co_filename)}:{code.co_firstlineno})'
+            self._labels[code] = label
+        return label
+
+
+def short_path(filename):
+    for marker in ('site-packages' + os.sep, 'dist-packages' + os.sep):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    base = str(getattr(settings, 'BASE_DIR', ''))
+    if base and filename.startswith(base):
+        return os.path.relpath(filename, base)
+    return filename
+
+
+def requested(request):
+    """``True`` si la petición pide explícitamente ser perfilada."""
+    value = request.META.get('HTTP_X_PROFILE')
+    if not value:
+        return False
+    if TOKEN and value == TOKEN:
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_authenticated and user.is_staff)
+
+
+def should_profile(request, graphql_operations):
+    if requested(request):
+        return True
+    if OPERATIONS:
+        names = {op.name for op in graphql_operations} | {name for op in graphql_operations for name, _ in op.fields}
+        if names & OPERATIONS:
+            return True
+    return bool(SAMPLE_RATE) and random.random() < SAMPLE_RATE
+
+
+def write(stacks, label, duration, directory=DIR, max_files=MAX_FILES):
+    """Guarda las pilas y borra los perfiles más antiguos; devuelve el nombre del archivo."""
+    os.makedirs(directory, exist_ok=True)
+    name = (f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{next(_sequence)}_'
+            f'{UNSAFE.sub("-", label)[:80]}_{duration * 1000:.0f}ms.folded')
+    path = os.path.join(directory, name)
+    with open(path, 'w', encoding='utf-8') as output:
+        for stack, count in stacks.most_common():
+            output.write(f'{stack} {count}\n')
+    rotate(directory, max_files)
+    return name
+
+
+def rotate(directory, max_files):
+    try:
+        entries = [e for e in os.scandir(directory) if e.name.endswith('.folded')]
+    except FileNotFoundError:
+        return
+    if len(entries) <= max_files:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for entry in entries[:len(entries) - max_files]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path not in PATHS or not (ENABLED or 'HTTP_X_PROFILE' in request.META):
+            return self.get_response(request)
+        graphql_operations = operations.from_request(request)
+        if not graphql_operations or not should_profile(request, graphql_operations):
+            return self.get_response(request)
+
+        sampler = Sampler(threading.get_ident()).start()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            duration = time.perf_counter() - started
+            stacks = sampler.stop()
+
+        if stacks and duration >= MIN_DURATION:
+            try:
+                name = write(stacks, operations.label(graphql_operations), duration)
+            except OSError:
+                logger.warning('No se pudo guardar el perfil', exc_info=True)
+            else:
+                if requested(request):
+                    response['X-Profile'] = name
+        return response
@@ -1,19 +1,27 @@
 import graphene
 from django.db.models import Sum
-from graphene_django import DjangoObjectType
-from django.contrib.auth.models import User
-from django.contrib.auth import get_user
+from graphql import GraphQLError
 
-from apps.hrmn.models import ClientSupplier, Subsidiary
-from apps.products.models import Product
-from apps.sales.models import Purchase, Sales, Cash, Payment
+from apps.hrmn.models import ClientSupplier, Subsidiary, Employee
+from apps.products.models import Product, Category
+from apps.sales.models import Purchase, Sales, Cash, Payment, CorrelativeGap, ReorderSuggestion, CashReport, \
+    WarehouseStock
 from .types import UserType, ProductType, PurchaseType, ClientSupplierType, SaleType, CashType, PaymentType, \
-    MethodTotal, CashSummaryType
+    MethodTotal, CashSummaryType, CorrelativeGapType, SubsidiaryType, CategoryType, SaleHistoryType, MonthlySalesType, \
+    EmployeeType, DocumentLookupType, ReorderSuggestionType, CashReportType, ChangesType, PriceQuoteLineType, \
+    PriceQuoteLineInput, ProductAvailabilityType, WarehouseQuantityType, CatalogCategoryType, CatalogChangesType, \
+    CatalogDeletionType, ClientHistoryType
+from apps.hrmn import padron
+from apps.products import pricing, catalog, sync
+from apps.sales import archive, outbox, client_stats
+from djangoProject import result_cache
 
 
 class EmployeeQuery(graphene.ObjectType):
-    # Mantén tus queries existentes de Employee aquí
-    pass
+    employees = graphene.List(EmployeeType, subsidiaryId=graphene.ID(required=True))
+
+    def resolve_employees(self, info, subsidiaryId):
+        return Employee.objects.filter(subsidiary_id=subsidiaryId, is_enabled=True)
 
 
 class AuthQuery(graphene.ObjectType):
@@ -36,16 +44,82 @@ class AuthQuery(graphene.ObjectType):
         return None
 
 
+class SubsidiaryQuery(graphene.ObjectType):
+    subsidiaries = graphene.List(SubsidiaryType)
+    subsidiary = graphene.Field(SubsidiaryType, id=graphene.ID(required=True))
+
+    def resolve_subsidiaries(self, info):
+        return Subsidiary.objects.filter(is_enabled=True)
+
+    def resolve_subsidiary(self, info, id):
+        return Subsidiary.objects.get(pk=id)
+
+
+@result_cache.cached('catalogTree', lambda subsidiaryId: catalog.version_names(subsidiaryId))
+def catalog_tree(subsidiaryId):
+    return catalog.build_tree(subsidiaryId)
+
+
 class ProductQuery(graphene.ObjectType):
-    products = graphene.List(ProductType)
+    products = graphene.List(ProductType, subsidiaryId=graphene.ID())
     product = graphene.Field(ProductType, id=graphene.ID(required=True))
-
-    def resolve_products(self, info):
+    categories = graphene.List(CategoryType, subsidiaryId=graphene.ID(required=True))
+    catalogTree = graphene.List(CatalogCategoryType, subsidiaryId=graphene.ID(required=True))
+    productsChangedSince = graphene.Field(CatalogChangesType, subsidiaryId=graphene.ID(required=True),
+                                          version=graphene.BigInt(required=True),
+                                          limit=graphene.Int(default_value=500))
+    priceQuote = graphene.List(PriceQuoteLineType, subsidiaryId=graphene.ID(required=True),
+                               lines=graphene.List(PriceQuoteLineInput, required=True))
+    availability = graphene.List(ProductAvailabilityType, productIds=graphene.List(graphene.ID, required=True),
+                                 subsidiaryId=graphene.ID(required=True))
+
+    def resolve_products(self, info, subsidiaryId=None):
+        if subsidiaryId:
+            return Product.objects.filter(subsidiary_id=subsidiaryId)
         return Product.objects.all()
 
+    def resolve_categories(self, info, subsidiaryId):
+        return Category.objects.filter(subsidiary_id=subsidiaryId, is_enabled=True)
+
+    def resolve_catalogTree(self, info, subsidiaryId):
+        return catalog_tree(subsidiaryId=str(subsidiaryId))
+
+    def resolve_productsChangedSince(self, info, subsidiaryId, version, limit=500):
+        changes = sync.changes_since(subsidiaryId, version, max(1, min(limit, sync.MAX_CHANGES)))
+        changes['deleted'] = [CatalogDeletionType(model=row['model'], object_id=row['object_id'])
+                              for row in changes['deleted']]
+        return CatalogChangesType(**changes)
+
     def resolve_product(self, info, id):
         return Product.objects.get(pk=id)
 
+    def resolve_availability(self, info, productIds, subsidiaryId):
+        # Una sola consulta por el índice (subsidiary, product) sin importar cuántos almacenes haya
+        rows = (WarehouseStock.objects
+                .filter(subsidiary_id=subsidiaryId, product_id__in=productIds, warehouse__is_enabled=True)
+                .values_list('product_id', 'warehouse_id', 'warehouse__warehouse', 'quantity')
+                .order_by('product_id', 'warehouse_id'))
+        result = {int(pid): ProductAvailabilityType(product_id=int(pid), total=0, warehouses=[]) for pid in productIds}
+        for product_id, warehouse_id, name, quantity in rows:
+            availability = result[product_id]
+            availability.total += quantity
+            availability.warehouses.append(WarehouseQuantityType(warehouse_id=warehouse_id, warehouse=name,
+                                                                 quantity=quantity))
+        return list(result.values())
+
+    def resolve_priceQuote(self, info, subsidiaryId, lines):
+        products = Product.objects.in_bulk([line.productId for line in lines])
+        rules = pricing.get_pricing(int(subsidiaryId))
+        quote = []
+        for line in lines:
+            product = products.get(int(line.productId))
+            if product is None:
+                continue
+            unit = rules.unit_price(product.id, product.category_id, product.price, line.quantity)
+            quote.append(PriceQuoteLineType(product_id=product.id, quantity=line.quantity, base_price=product.price,
+                                            unit_price=unit, total=unit * line.quantity))
+        return quote
+
 
 class SaleQuery(graphene.ObjectType):
     sales = graphene.List(SaleType)
@@ -58,6 +132,51 @@ class SaleQuery(graphene.ObjectType):
         return Sales.objects.get(pk=id)
 
 
+@result_cache.cached('salesHistory', lambda subsidiaryId, **kwargs: [f'sales:{subsidiaryId}'])
+def sales_history(subsidiaryId, dateFrom, dateTo):
+    return list(archive.sales_between(subsidiaryId, dateFrom, dateTo))
+
+
+@result_cache.cached('monthlySales', lambda subsidiaryId, **kwargs: [f'sales:{subsidiaryId}'])
+def monthly_sales(subsidiaryId, dateFrom, dateTo):
+    return archive.monthly_totals(subsidiaryId, dateFrom, dateTo)
+
+
+class SaleHistoryQuery(graphene.ObjectType):
+    salesHistory = graphene.List(SaleHistoryType, subsidiaryId=graphene.ID(required=True),
+                                 dateFrom=graphene.DateTime(required=True), dateTo=graphene.DateTime(required=True))
+    monthlySales = graphene.List(MonthlySalesType, subsidiaryId=graphene.ID(required=True),
+                                 dateFrom=graphene.DateTime(required=True), dateTo=graphene.DateTime(required=True))
+
+    def resolve_salesHistory(self, info, subsidiaryId, dateFrom, dateTo):
+        return sales_history(subsidiaryId=subsidiaryId, dateFrom=dateFrom, dateTo=dateTo)
+
+    def resolve_monthlySales(self, info, subsidiaryId, dateFrom, dateTo):
+        return monthly_sales(subsidiaryId=subsidiaryId, dateFrom=dateFrom, dateTo=dateTo)
+
+
+class CorrelativeQuery(graphene.ObjectType):
+    correlativeGaps = graphene.List(CorrelativeGapType, subsidiaryId=graphene.ID(required=True),
+                                    typeReceipt=graphene.String(required=True))
+
+    def resolve_correlativeGaps(self, info, subsidiaryId, typeReceipt):
+        return CorrelativeGap.objects.filter(correlative__subsidiary_id=subsidiaryId,
+                                             correlative__type_receipt=typeReceipt).order_by('number')
+
+
+class ReorderSuggestionQuery(graphene.ObjectType):
+    reorderSuggestions = graphene.List(ReorderSuggestionType, subsidiaryId=graphene.ID(required=True),
+                                       abcClass=graphene.String(), onlyNeeded=graphene.Boolean(default_value=True))
+
+    def resolve_reorderSuggestions(self, info, subsidiaryId, abcClass=None, onlyNeeded=True):
+        qs = ReorderSuggestion.objects.filter(subsidiary_id=subsidiaryId).select_related('product', 'supplier')
+        if abcClass:
+            qs = qs.filter(abc_class=abcClass)
+        if onlyNeeded:
+            qs = qs.filter(suggested_quantity__gt=0)
+        return qs.order_by('abc_class', '-suggested_quantity')
+
+
 class PurchaseQuery(graphene.ObjectType):
     purchases = graphene.List(PurchaseType)
     purchase = graphene.Field(PurchaseType, id=graphene.ID(required=True))
@@ -72,6 +191,10 @@ class PurchaseQuery(graphene.ObjectType):
 class ClientSupplierQuery(graphene.ObjectType):
     clientSuppliers = graphene.List(ClientSupplierType)
     clientSupplier = graphene.Field(ClientSupplierType, id=graphene.ID(required=True))
+    lookupClientByDocument = graphene.Field(DocumentLookupType, type=graphene.String(required=True),
+                                            number=graphene.String(required=True))
+    clientHistory = graphene.Field(ClientHistoryType, clientId=graphene.ID(required=True),
+                                   first=graphene.Int(default_value=20), after=graphene.String())
 
     def resolve_clientSuppliers(self, info):
         return ClientSupplier.objects.all()
@@ -79,6 +202,27 @@ class ClientSupplierQuery(graphene.ObjectType):
     def resolve_clientSupplier(self, info, id):
         return ClientSupplier.objects.get(pk=id)
 
+    def resolve_clientHistory(self, info, clientId, first=20, after=None):
+        try:
+            sales, end_cursor, has_more = client_stats.history(clientId, first, after)
+        except ValueError as e:
+            raise GraphQLError(str(e))
+        return ClientHistoryType(sales=sales, end_cursor=end_cursor, has_next_page=has_more)
+
+    def resolve_lookupClientByDocument(self, info, type, number):
+        if not number.isdigit():
+            return DocumentLookupType(found=False)
+        client = ClientSupplier.objects.filter(typeDocument=type, nDocument=int(number)).order_by('id').first()
+        if client:
+            return DocumentLookupType(found=True, source='CLIENT', clientSupplier=client, document=number,
+                                      name=client.name, address=client.address)
+        found = padron.lookup(type, number)
+        if found:
+            return DocumentLookupType(found=True, source='PADRON', document=str(found['document']),
+                                      name=found['name'], address=found['address'], status=found['status'],
+                                      condition=found['condition'])
+        return DocumentLookupType(found=False, document=number)
+
 
 class CashQuery(graphene.ObjectType):
     cashes = graphene.List(CashType)
@@ -111,21 +255,52 @@ class PaymentQuery(graphene.ObjectType):
         return Payment.objects.filter(cash_id=cashId).order_by('payment_date')
 
 
+@result_cache.cached('cashSummary', lambda cashId: [f'cash:{cashId}'])
+def cash_summary(cashId):
+    cash = Cash.objects.get(pk=cashId)
+    report = CashReport.objects.filter(cash=cash).first()
+    if report is not None:
+        # Caja cerrada: se responde con el reporte Z sin volver a agregar los pagos
+        by_method = [(k, v['total']) for k, v in report.by_method.items()]
+        return {'by_method': by_method, 'total_expected': report.total_expected,
+                'total_counted': report.total_counted, 'difference': report.difference}
+
+    qs = Payment.objects.filter(cash=cash, status='PAID')
+    by_method = [(x['payment_method'], x['total'] or 0)
+                 for x in qs.values('payment_method').annotate(total=Sum('paid_amount'))]
+    total_expected = qs.aggregate(t=Sum('paid_amount'))['t'] or 0
+    total_counted = cash.closingAmount or 0
+    return {'by_method': by_method, 'total_expected': total_expected, 'total_counted': total_counted,
+            'difference': total_counted - total_expected}
+
+
 class CashSummaryQuery(graphene.ObjectType):
     cashSummary = graphene.Field(CashSummaryType, cashId=graphene.ID(required=True))
+    cashReport = graphene.Field(CashReportType, cashId=graphene.ID(required=True))
 
     def resolve_cashSummary(self, info, cashId):
-        cash = Cash.objects.get(pk=cashId)
-        qs = Payment.objects.filter(cash=cash, status='PAID')
-        by_method_qs = qs.values('payment_method').annotate(total=Sum('paid_amount'))
-        by_method = [MethodTotal(method=x['payment_method'], total=x['total'] or 0) for x in by_method_qs]
-        total_expected = qs.aggregate(t=Sum('paid_amount'))['t'] or 0
-        total_counted = cash.closing_amount or 0
-        difference = total_counted - total_expected
-        return CashSummaryType(by_method=by_method, total_expected=total_expected, total_counted=total_counted,
-                               difference=difference)
-
-
-class Query(EmployeeQuery, AuthQuery, ProductQuery, SaleQuery, PurchaseQuery, ClientSupplierQuery, CashQuery,
-            PaymentQuery, CashSummaryQuery, graphene.ObjectType):
+        summary = cash_summary(cashId=cashId)
+        return CashSummaryType(by_method=[MethodTotal(method=m, total=t) for m, t in summary['by_method']],
+                               total_expected=summary['total_expected'], total_counted=summary['total_counted'],
+                               difference=summary['difference'])
+
+    def resolve_cashReport(self, info, cashId):
+        return CashReport.objects.select_related('cash', 'subsidiary', 'user').filter(cash_id=cashId).first()
+
+
+class OutboxQuery(graphene.ObjectType):
+    changesSince = graphene.Field(ChangesType, seq=graphene.BigInt(required=True), limit=graphene.Int(default_value=500),
+                                  aggregates=graphene.List(graphene.String), subsidiaryId=graphene.ID())
+
+    def resolve_changesSince(self, info, seq, limit=500, aggregates=None, subsidiaryId=None):
+        limit = max(1, min(limit, outbox.MAX_CHANGES))
+        events = outbox.changes_since(seq, limit + 1, aggregates, subsidiaryId)
+        has_more = len(events) > limit
+        events = events[:limit]
+        return ChangesType(events=events, last_seq=events[-1].published_seq if events else seq, has_more=has_more)
+
+
+class Query(EmployeeQuery, AuthQuery, SubsidiaryQuery, ProductQuery, SaleQuery, SaleHistoryQuery, CorrelativeQuery,
+            PurchaseQuery, ReorderSuggestionQuery, ClientSupplierQuery, CashQuery, PaymentQuery, CashSummaryQuery,
+            OutboxQuery, graphene.ObjectType):
     pass
@@ -0,0 +1,295 @@
+"""Grabación del tráfico GraphQL real para reproducirlo contra otra versión.
+
+``TrafficRecorderMiddleware`` guarda cada petición a GraphQL como una línea
+JSON: instante, ruta, operación, cuerpo (con las consultas reemplazadas por
+su hash), estado HTTP, duración y cuántas operaciones fallaron. El texto de
+cada consulta se escribe una vez por archivo en una línea ``query``.
+
+Antes de escribir se anonimiza: los valores de variables y literales con
+nombres de ``TRAFFIC_RECORD_SCRUB_FIELDS`` se reemplazan por otros del mismo
+formato (dígitos por dígitos, letras por letras) derivados de un HMAC, así la
+misma persona da el mismo valor y las validaciones de largo siguen pasando.
+Login, registro y tokens no se graban, ni tampoco la cabecera Authorization.
+
+``replay_traffic`` reproduce los archivos y ``compare_replays`` compara dos
+corridas. Se activa con ``TRAFFIC_RECORD_ENABLED`` agregando el middleware a
+``MIDDLEWARE``.
+"""
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import logging.handlers
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from graphql import parse, print_ast, GraphQLError, Visitor, visit
+from graphql.language import StringValueNode
+
+from djangoProject import operations
+from djangoProject.views import failed
+
+try:
+    import brotli
+except ImportError:  # sin brotli las respuestas br no se pueden revisar
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, 'TRAFFIC_RECORD_ENABLED', False)
+SAMPLE_RATE = getattr(settings, 'TRAFFIC_RECORD_SAMPLE_RATE', 1.0)
+PATH = getattr(settings, 'TRAFFIC_RECORD_PATH',
+               os.path.join(tempfile.gettempdir(), 'punto_venta_traffic-{pid}.jsonl'))
+MAX_BYTES = getattr(settings, 'TRAFFIC_RECORD_MAX_BYTES', 50 * 1024 * 1024)
+BACKUPS = getattr(settings, 'TRAFFIC_RECORD_BACKUPS', 10)
+PATHS = set(getattr(settings, 'TRAFFIC_RECORD_PATHS', ('/graphql/', '/graphql/batch/')))
+SECRET = getattr(settings, 'TRAFFIC_RECORD_SECRET', None) or settings.SECRET_KEY
+SKIP_FIELDS = set(getattr(settings, 'TRAFFIC_RECORD_SKIP_FIELDS', (
+    'tokenAuth', 'verifyToken', 'refreshToken', 'loginUser', 'logoutUser', 'registerUser',
+)))
+SCRUB_FIELDS = {name.lower() for name in getattr(settings, 'TRAFFIC_RECORD_SCRUB_FIELDS', (
+    'name', 'names', 'nameLastname', 'businessName', 'nDocument', 'document', 'ruc', 'dni', 'email', 'phone',
+    'address', 'username', 'password', 'password1', 'password2', 'token', 'notes', 'observation',
+    'firstName', 'lastName', 'referenceNumber',
+))}
+HEADERS = ('HTTP_X_DEVICE_ID', 'HTTP_X_SUBSIDIARY_ID')
+
+_query_cache = {}
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def pseudonym(value):
+    """Valor del mismo formato que ``value`` y siempre el mismo para la misma entrada."""
+    digest = hmac.new(SECRET.encode('utf-8'), str(value).encode('utf-8'), hashlib.sha256).digest()
+    result = []
+    for position, char in enumerate(str(value)):
+        byte = digest[position % len(digest)]
+        if char.isdigit():
+            result.append(str(byte % 10))
+        elif char.isalpha():
+            letter = chr(ord('a') + byte % 26)
+            result.append(letter.upper() if char.isupper() else letter)
+        else:
+            result.append(char)
+    return ''.join(result)
+
+
+def scrub(value, key=None):
+    """Anonimiza recursivamente los valores cuyas claves están en ``SCRUB_FIELDS``."""
+    if isinstance(value, dict):
+        return {k: scrub(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [scrub(item, key) for item in value]
+    if key is not None and key.lower() in SCRUB_FIELDS and isinstance(value, (str, int)) \
+            and not isinstance(value, bool):
+        scrubbed = pseudonym(value)
+        return int(scrubbed) if isinstance(value, int) else scrubbed
+    return value
+
+
+class _LiteralScrubber(Visitor):
+    def enter_string_value(self, node, key, parent, path, ancestors):
+        name = getattr(getattr(parent, 'name', None), 'value', None)
+        if name is not None and name.lower() in SCRUB_FIELDS:
+            return StringValueNode(value=pseudonym(node.value), block=False)
+        return None
+
+
+def scrub_query(query):
+    """Consulta sin literales sensibles y su hash; se cachea por texto."""
+    cached = _query_cache.get(query)
+    if cached is None:
+        text = query
+        if '"' in query:
+            try:
+                text = print_ast(visit(parse(query), _LiteralScrubber()))
+            except GraphQLError:
+                pass
+        cached = (hashlib.sha1(text.encode('utf-8')).hexdigest()[:16], text)
+        if len(_query_cache) < 5000:
+            _query_cache[query] = cached
+    return cached
+
+
+class _Writer(logging.handlers.RotatingFileHandler):
+    """Archivo JSONL con rotación; al rotar se vuelven a escribir las consultas en el archivo nuevo."""
+
+    def __init__(self, path):
+        super().__init__(path, maxBytes=MAX_BYTES, backupCount=BACKUPS, encoding='utf-8')
+        self.written = set()
+
+    def doRollover(self):
+        super().doRollover()
+        self.written = set()
+
+    def write(self, record):
+        self.emit(logging.makeLogRecord({'msg': json.dumps(record, default=str), 'levelno': logging.INFO,
+                                         'levelname': 'INFO'}))
+
+    def write_entry(self, queries, entry):
+        with self.lock:
+            for digest, text in queries:
+                if digest not in self.written:
+                    self.written.add(digest)
+                    self.write({'type': 'query', 'hash': digest, 'query': text})
+            self.write(entry)
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            path = PATH.format(pid=os.getpid())
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            _writer = _Writer(path)
+        return _writer
+
+
+def recorded_body(request):
+    """Cuerpo a grabar: el JSON original (o los parámetros GET) con las consultas por hash."""
+    if request.method == 'GET':
+        payloads = operations.load_payloads(request)
+        body = payloads[0] if payloads else {}
+    else:
+        try:
+            body = json.loads(request.body or b'null')
+        except ValueError:
+            return None, []
+    queries = []
+
+    def replace(value):
+        if isinstance(value, list):
+            return [replace(item) for item in value]
+        if isinstance(value, dict):
+            if isinstance(value.get('query'), str):
+                digest, text = scrub_query(value['query'])
+                queries.append((digest, text))
+                value = {k: v for k, v in value.items() if k != 'query'}
+                value['queryHash'] = digest
+            return {k: replace(v) if k == 'operations' else v for k, v in value.items()}
+        return value
+
+    return scrub(replace(body)), queries
+
+
+def decoded_content(response):
+    encoding = response.get('Content-Encoding')
+    content = response.content
+    if encoding == 'gzip':
+        return gzip.decompress(content)
+    if encoding == 'br':
+        return brotli.decompress(content) if brotli else None
+    return content
+
+
+def failures(response):
+    """Operaciones fallidas de la respuesta (errores o ``success: false``); None si no se puede leer."""
+    if response.streaming:
+        return None
+    try:
+        content = decoded_content(response)
+        data = json.loads(content) if content else None
+    except (ValueError, OSError):
+        return None
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        data = data['results']
+    results = data if isinstance(data, list) else [data]
+    return sum(1 for result in results if isinstance(result, dict) and failed(result))
+
+
+class TrafficRecorderMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not ENABLED or request.path not in PATHS or request.method not in ('GET', 'POST'):
+            return self.get_response(request)
+        if SAMPLE_RATE < 1 and random.random() >= SAMPLE_RATE:
+            return self.get_response(request)
+        graphql_operations = operations.from_request(request)
+        if not graphql_operations or any(name in SKIP_FIELDS for op in graphql_operations for name, _ in op.fields):
+            return self.get_response(request)
+        started = time.time()
+        response = self.get_response(request)
+        duration = time.time() - started
+        try:
+            body, queries = recorded_body(request)
+            if body is not None:
+                get_writer().write_entry(queries, {
+                    'type': 'request',
+                    'ts': round(started, 4),
+                    'path': request.path,
+                    'method': request.method,
+                    'label': operations.label(graphql_operations),
+                    'kinds': sorted({op.kind for op in graphql_operations}),
+                    'headers': {name: request.META[name] for name in HEADERS if name in request.META},
+                    'body': body,
+                    'status': response.status_code,
+                    'duration_ms': round(duration * 1000, 2),
+                    'failures': failures(response),
+                })
+        except Exception:
+            logger.warning('No se pudo grabar la petición', exc_info=True)
+        return response
+
+
+def load(paths):
+    """Peticiones grabadas en orden de llegada, con el texto de la consulta ya repuesto."""
+    queries, requests = {}, []
+    for path in paths:
+        with open(path, encoding='utf-8') as traffic:
+            for line in traffic:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get('type') == 'query':
+                    queries[record['hash']] = record['query']
+                elif record.get('type') == 'request':
+                    requests.append(record)
+
+    def restore(value):
+        if isinstance(value, list):
+            return [restore(item) for item in value]
+        if isinstance(value, dict):
+            if 'queryHash' in value:
+                value = dict(value)
+                value['query'] = queries.get(value.pop('queryHash'))
+            return {k: restore(v) if k == 'operations' else v for k, v in value.items()}
+        return value
+
+    for record in requests:
+        record['body'] = restore(record['body'])
+    requests.sort(key=lambda record: record['ts'])
+    return requests
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(results):
+    """Por operación: cantidad, p50/p95/p99 de latencia en ms y cuántas fallaron."""
+    by_label = {}
+    for result in results:
+        by_label.setdefault(result['label'], []).append(result)
+    summary = {}
+    for label, items in by_label.items():
+        latencies = [item['latency_ms'] for item in items if item.get('latency_ms') is not None]
+        summary[label] = {
+            'count': len(items),
+            'p50': percentile(latencies, 0.50),
+            'p95': percentile(latencies, 0.95),
+            'p99': percentile(latencies, 0.99),
+            'failed': sum(1 for item in items if item.get('status') != 200 or item.get('failures')),
+        }
+    return summary
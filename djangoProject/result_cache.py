@@ -0,0 +1,145 @@
+"""Cache de resultados para resolvers costosos (resúmenes de caja, reportes).
+
+La clave combina los argumentos con los contadores de ``versions`` de los
+que depende el resultado; una escritura confirmada cambia la versión y la
+entrada anterior deja de usarse, así que no hace falta un TTL corto.
+
+Solo un cálculo por clave a la vez: dentro del proceso con un lock y entre
+procesos con una marca ``cache.add``; los demás esperan el resultado.
+Los aciertos, fallos y esperas se cuentan por nombre en el cache.
+
+Dentro de una transacción (un batch atómico, por ejemplo) el cache no se
+usa: el resultado vería escrituras que todavía no cambiaron las versiones y
+que pueden deshacerse, y guardarlo serviría datos nunca confirmados.
+"""
+import functools
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from djangoProject import versions
+
+PREFIX = 'result:'
+LOCK_PREFIX = 'result-lock:'
+METRICS_PREFIX = 'result-metrics:'
+OUTCOMES = ('hit', 'miss', 'wait')
+
+# Solo libera memoria de entradas viejas; la invalidación es por versión
+TIMEOUT = getattr(settings, 'RESULT_CACHE_TIMEOUT', 24 * 3600)
+LOCK_TIMEOUT = getattr(settings, 'RESULT_CACHE_LOCK_TIMEOUT', 30)
+WAIT = getattr(settings, 'RESULT_CACHE_WAIT', 10.0)
+POLL = 0.05
+
+MISSING = object()
+REGISTERED = set()
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+@contextmanager
+def _single_flight(key):
+    with _flights_lock:
+        flight = _flights.setdefault(key, [threading.Lock(), 0])
+        flight[1] += 1
+    try:
+        with flight[0]:
+            yield
+    finally:
+        with _flights_lock:
+            flight[1] -= 1
+            if not flight[1]:
+                _flights.pop(key, None)
+
+
+def _count(name, outcome):
+    key = f'{METRICS_PREFIX}{name}:{outcome}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def make_key(name, args, data_versions):
+    digest = hashlib.sha1(json.dumps([args, data_versions], sort_keys=True, default=str).encode('utf-8'))
+    return f'{PREFIX}{name}:{digest.hexdigest()}'
+
+
+def _compute(key, compute):
+    value = compute()
+    cache.set(key, value, TIMEOUT)
+    return value
+
+
+def get_or_compute(name, scopes, args, compute):
+    """Devuelve el resultado cacheado para ``args`` y las versiones de ``scopes`` o lo calcula."""
+    if connection.in_atomic_block:
+        return compute()
+    key = make_key(name, args, versions.get_versions(sorted(set(scopes))))
+    value = cache.get(key, MISSING)
+    if value is not MISSING:
+        _count(name, 'hit')
+        return value
+
+    with _single_flight(key):
+        value = cache.get(key, MISSING)
+        if value is not MISSING:
+            _count(name, 'wait')
+            return value
+
+        lock_key = LOCK_PREFIX + key
+        if cache.add(lock_key, 1, LOCK_TIMEOUT):
+            try:
+                _count(name, 'miss')
+                return _compute(key, compute)
+            finally:
+                cache.delete(lock_key)
+
+        # Otro proceso lo está calculando
+        deadline = time.monotonic() + WAIT
+        while time.monotonic() < deadline:
+            time.sleep(POLL)
+            value = cache.get(key, MISSING)
+            if value is not MISSING:
+                _count(name, 'wait')
+                return value
+            if cache.get(lock_key) is None:
+                break
+        _count(name, 'miss')
+        return _compute(key, compute)
+
+
+def cached(name, scopes):
+    """Decorador para funciones con argumentos por nombre que devuelven datos serializables.
+
+    ``scopes(**kwargs)`` devuelve los contadores de versión de los que depende el resultado.
+    """
+    REGISTERED.add(name)
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(**kwargs):
+            return get_or_compute(name, scopes(**kwargs), kwargs, lambda: function(**kwargs))
+        return wrapper
+    return decorator
+
+
+def metrics(names=None):
+    """``{nombre: {'hit': n, 'miss': n, 'wait': n}}`` acumulado desde el último reinicio."""
+    names = sorted(names or REGISTERED)
+    keys = [f'{METRICS_PREFIX}{name}:{outcome}' for name in names for outcome in OUTCOMES]
+    values = cache.get_many(keys)
+    return {name: {outcome: values.get(f'{METRICS_PREFIX}{name}:{outcome}', 0) for outcome in OUTCOMES}
+            for name in names}
+
+
+def reset_metrics(names=None):
+    cache.delete_many([f'{METRICS_PREFIX}{name}:{outcome}'
+                       for name in (names or REGISTERED) for outcome in OUTCOMES])
@@ -1,14 +1,29 @@
-import graphene
-from .queries import Query as QueryBase
-from .mutations import Mutation as MutationBase
+"""Esquema GraphQL.
 
+Construir el esquema importa graphene, graphql_jwt y todos los tipos; se hace
+en la primera petición con ``get_schema()`` y no al importar ``urls.py``.
+"""
+from functools import lru_cache
 
-class Query(QueryBase, graphene.ObjectType):
-    pass
 
+@lru_cache(maxsize=None)
+def get_schema():
+    import graphene
+    from .queries import Query as QueryBase
+    from .mutations import Mutation as MutationBase
+    from .subscriptions import Subscription
 
-class Mutation(MutationBase, graphene.ObjectType):
-    pass
+    class Query(QueryBase, graphene.ObjectType):
+        pass
 
+    class Mutation(MutationBase, graphene.ObjectType):
+        pass
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
+    return graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
+
+
+def __getattr__(name):
+    # Compatibilidad con ``from djangoProject.schema import schema``
+    if name == 'schema':
+        return get_schema()
+    raise AttributeError(name)
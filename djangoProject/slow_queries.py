@@ -0,0 +1,234 @@
+"""Registro de consultas SQL lentas con su operación GraphQL y su plan.
+
+``SlowQueryMiddleware`` instala un ``execute_wrapper`` en las conexiones
+durante cada petición a GraphQL. Las sentencias que superan
+``SLOW_QUERY_THRESHOLD_MS`` se anotan con la operación y la ruta del resolver
+que las disparó (``ResolverPathMiddleware`` en ``GRAPHENE['MIDDLEWARE']``).
+
+El plan se pide una vez por huella (la sentencia sin literales) cada
+``SLOW_QUERY_EXPLAIN_TTL`` segundos, después de responder y fuera de
+transacciones, para no tocar la transacción de la petición. ``EXPLAIN
+ANALYZE`` vuelve a ejecutar la consulta, así que solo se usa con SELECT sin
+``FOR UPDATE`` y en motores que lo soportan.
+
+Cada registro es una línea JSON en ``SLOW_QUERY_LOG`` (con rotación);
+``slow_queries_report`` los resume.
+"""
+import contextvars
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from djangoProject import operations
+
+logger = logging.getLogger(__name__)
+
+THRESHOLD = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 200) / 1000
+LOG_PATH = getattr(settings, 'SLOW_QUERY_LOG',
+                   os.path.join(tempfile.gettempdir(), 'punto_venta_slow_queries.jsonl'))
+LOG_BYTES = getattr(settings, 'SLOW_QUERY_LOG_BYTES', 10 * 1024 * 1024)
+LOG_BACKUPS = getattr(settings, 'SLOW_QUERY_LOG_BACKUPS', 5)
+EXPLAIN_TTL = getattr(settings, 'SLOW_QUERY_EXPLAIN_TTL', 3600)
+EXPLAIN_ANALYZE = getattr(settings, 'SLOW_QUERY_EXPLAIN_ANALYZE', True)
+ENABLED = getattr(settings, 'SLOW_QUERY_ENABLED', True)
+PATHS = set(getattr(settings, 'SLOW_QUERY_PATHS', ('/graphql/', '/graphql/batch/')))
+MAX_SQL = 4000
+
+_path = contextvars.ContextVar('slow_query_resolver_path', default=None)
+_explained = {}
+_explained_lock = threading.Lock()
+_log = None
+_log_lock = threading.Lock()
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LISTS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+SPACES = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Sentencia normalizada (sin literales ni listas IN de largo variable) y su hash corto."""
+    normalized = SPACES.sub(' ', PLACEHOLDER_LISTS.sub('(...)', LITERALS.sub('?', sql))).strip()
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16], normalized
+
+
+def resolver_path():
+    path = _path.get()
+    if path is None:
+        return None
+    keys = path.as_list()
+    return '.'.join(str(key) for key in keys if not isinstance(key, int))
+
+
+class ResolverPathMiddleware:
+    """Middleware de graphene: recuerda el último resolver que empezó en este contexto.
+
+    No se restaura al salir: las listas perezosas (QuerySet) se evalúan justo
+    después de que su resolver retorna, y así quedan atribuidas a él.
+    """
+
+    def resolve(self, next, root, info, **args):
+        _path.set(info.path)
+        return next(root, info, **args)
+
+
+class Recorder:
+    """``execute_wrapper`` que junta las sentencias lentas de una petición."""
+
+    def __init__(self, operation, threshold=THRESHOLD):
+        self.operation = operation
+        self.threshold = threshold
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = execute(sql, params, many, context)
+            failed = False
+            return result
+        finally:
+            duration = time.perf_counter() - started
+            if duration >= self.threshold:
+                self.slow.append({
+                    'connection': context['connection'],
+                    'sql': sql,
+                    'params': None if many else params,
+                    'many': many,
+                    'failed': failed,
+                    'duration': duration,
+                    'path': resolver_path(),
+                })
+
+    def flush(self):
+        """Escribe lo acumulado con los planes pendientes; se llama fuera de transacciones."""
+        for entry in self.slow:
+            digest, normalized = fingerprint(entry['sql'])
+            record = {
+                'time': timezone.now().isoformat(),
+                'fingerprint': digest,
+                'duration_ms': round(entry['duration'] * 1000, 2),
+                'operation': self.operation,
+                'path': entry['path'],
+                'vendor': entry['connection'].vendor,
+                'many': entry['many'],
+                'failed': entry['failed'],
+                'statement': normalized[:MAX_SQL],
+            }
+            if not entry['many'] and not entry['failed'] and should_explain(digest):
+                record['explain'] = explain(entry['connection'], entry['sql'], entry['params'])
+            write(record)
+        self.slow = []
+
+
+def should_explain(digest, now=None):
+    now = time.monotonic() if now is None else now
+    with _explained_lock:
+        last = _explained.get(digest)
+        if last is not None and now - last < EXPLAIN_TTL:
+            return False
+        _explained[digest] = now
+        return True
+
+
+def explain_prefix(vendor, sql):
+    """Prefijo de EXPLAIN para el motor; ANALYZE solo para lecturas que no bloquean filas."""
+    statement = sql.lstrip().upper()
+    analyze = EXPLAIN_ANALYZE and statement.startswith('SELECT') and ' FOR UPDATE' not in statement
+    if vendor == 'postgresql':
+        return 'EXPLAIN (ANALYZE, BUFFERS) ' if analyze else 'EXPLAIN '
+    if vendor == 'mysql':
+        return 'EXPLAIN ANALYZE ' if analyze else 'EXPLAIN '
+    if vendor == 'sqlite':
+        return 'EXPLAIN QUERY PLAN '
+    return None
+
+
+def explain(connection, sql, params):
+    prefix = explain_prefix(connection.vendor, sql)
+    if prefix is None or connection.in_atomic_block:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return [' | '.join(str(column) for column in row) for row in cursor.fetchall()]
+    except Exception as e:
+        # MySQL < 8.0.18 no tiene EXPLAIN ANALYZE; se deja constancia y se sigue
+        return [f'EXPLAIN falló: {e}']
+
+
+def _get_log():
+    global _log
+    with _log_lock:
+        if _log is None:
+            os.makedirs(os.path.dirname(LOG_PATH) or '.', exist_ok=True)
+            _log = logging.handlers.RotatingFileHandler(LOG_PATH, maxBytes=LOG_BYTES, backupCount=LOG_BACKUPS,
+                                                        encoding='utf-8')
+        return _log
+
+
+def write(record):
+    handler = _get_log()
+    handler.emit(logging.makeLogRecord({'msg': json.dumps(record, default=str), 'levelno': logging.INFO,
+                                        'levelname': 'INFO'}))
+
+
+def read_log(path=LOG_PATH):
+    """Registros del log actual y de sus copias rotadas, del más antiguo al más nuevo."""
+    paths = [f'{path}.{n}' for n in range(LOG_BACKUPS, 0, -1)] + [path]
+    for name in paths:
+        if not os.path.exists(name):
+            continue
+        with open(name, encoding='utf-8') as log:
+            for line in log:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def capture(operation):
+    """Instala el ``Recorder`` en todas las conexiones; usar con ``with`` y luego ``recorder.flush()``."""
+    recorder = Recorder(operation)
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(recorder))
+    return recorder, stack
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not ENABLED or request.path not in PATHS:
+            return self.get_response(request)
+        recorder, stack = capture(operations.label(operations.from_request(request)))
+        token = _path.set(None)
+        try:
+            with stack:
+                response = self.get_response(request)
+        finally:
+            _path.reset(token)
+        if recorder.slow:
+            # response.close() corre los closers después de enviar el cuerpo y antes de request_finished
+            # (que cierra las conexiones): el EXPLAIN ANALYZE no demora la respuesta al cliente
+            response._resource_closers.append(lambda: flush(recorder))
+        return response
+
+
+def flush(recorder):
+    try:
+        recorder.flush()
+    except Exception:
+        logger.warning('No se pudo registrar las consultas lentas', exc_info=True)
@@ -0,0 +1,44 @@
+import graphene
+
+from djangoProject.broadcast import broadcaster
+
+
+class StockChangedType(graphene.ObjectType):
+    product_id = graphene.ID()
+    subsidiary_id = graphene.ID()
+    quantity = graphene.Int()
+
+
+class CashUpdatedType(graphene.ObjectType):
+    cash_id = graphene.ID()
+    event = graphene.String()
+    status = graphene.String()
+    total_sales = graphene.Decimal()
+    difference = graphene.Decimal()
+
+
+class SaleCreatedType(graphene.ObjectType):
+    sale_id = graphene.ID()
+    subsidiary_id = graphene.ID()
+    type_receipt = graphene.String()
+    serie = graphene.String()
+    number = graphene.Int()
+    total = graphene.Decimal()
+
+
+class Subscription(graphene.ObjectType):
+    stock_changed = graphene.Field(StockChangedType, subsidiary_id=graphene.ID(required=True))
+    cash_updated = graphene.Field(CashUpdatedType, cash_id=graphene.ID(required=True))
+    sale_created = graphene.Field(SaleCreatedType, subsidiary_id=graphene.ID(required=True))
+
+    async def subscribe_stock_changed(root, info, subsidiary_id):
+        async for message in broadcaster.subscribe(f'stock.{subsidiary_id}'):
+            yield message
+
+    async def subscribe_cash_updated(root, info, cash_id):
+        async for message in broadcaster.subscribe(f'cash.{cash_id}'):
+            yield message
+
+    async def subscribe_sale_created(root, info, subsidiary_id):
+        async for message in broadcaster.subscribe(f'sale.{subsidiary_id}'):
+            yield message
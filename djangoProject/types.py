@@ -1,19 +1,56 @@
 import graphene
 from graphene_django import DjangoObjectType
 from django.contrib.auth.models import User
-from django.contrib.auth import authenticate, login
-from django.contrib.auth.forms import UserCreationForm
-from django.db import transaction
 
-from apps.products.models import Product
-from apps.hrmn.models import Subsidiary, ClientSupplier
-from apps.sales.models import Purchase, Sales, DetailSales, Cash, Payment
+from apps.products.models import Product, Category, SubCategory, Observation
+from apps.hrmn import images
+from apps.hrmn.models import Subsidiary, ClientSupplier, Company, Employee
+from apps.sales.models import Purchase, Sales, DetailSales, Cash, Payment, CorrelativeBlock, CorrelativeGap, \
+    DetailPurchase, ReorderSuggestion, CashReport, Operation, ClientStats, ClientProductStats
+from apps.sales import client_stats
+
+
+class CompanyType(DjangoObjectType):
+    """Las imágenes se exponen como URL; el logo en base64 nunca viaja en el JSON"""
+
+    class Meta:
+        model = Company
+        fields = ('id', 'ruc', 'company', 'igv', 'is_enabled', 'billing_top')
+
+    logo_thumb_url = graphene.String()
+    logo_receipt_url = graphene.String()
+
+    def resolve_logo_thumb_url(self, info):
+        return images.variant_url(info.context, self.logo_thumb)
+
+    def resolve_logo_receipt_url(self, info):
+        return images.variant_url(info.context, self.logo_receipt)
 
 
 class SubsidiaryType(DjangoObjectType):
     class Meta:
         model = Subsidiary
-        fields = '__all__'
+        fields = ('id', 'company', 'subsidiary', 'address', 'phone', 'is_enabled', 'serie')
+
+    logo_thumb_url = graphene.String()
+    logo_receipt_url = graphene.String()
+
+    def resolve_logo_thumb_url(self, info):
+        return images.variant_url(info.context, self.logo_thumb)
+
+    def resolve_logo_receipt_url(self, info):
+        return images.variant_url(info.context, self.logo_receipt)
+
+
+class EmployeeType(DjangoObjectType):
+    class Meta:
+        model = Employee
+        fields = ('id', 'name_lastname', 'n_document', 'charge', 'subsidiary', 'date_birth', 'phone', 'is_enabled')
+
+    foto_thumb_url = graphene.String()
+
+    def resolve_foto_thumb_url(self, info):
+        return images.variant_url(info.context, self.foto_thumb)
 
 
 class UserType(DjangoObjectType):
@@ -65,6 +102,61 @@ class ProductType(DjangoObjectType):
         fields = '__all__'
 
 
+class CategoryType(DjangoObjectType):
+    class Meta:
+        model = Category
+        fields = ('id', 'subsidiary', 'category', 'description', 'is_enabled', 'version')
+
+
+class SubCategoryType(DjangoObjectType):
+    class Meta:
+        model = SubCategory
+        fields = ('id', 'category', 'subcategory', 'description', 'is_enabled', 'version')
+
+
+class ObservationType(DjangoObjectType):
+    class Meta:
+        model = Observation
+        fields = ('id', 'subcategory', 'observation', 'version')
+
+
+class CatalogDeletionType(graphene.ObjectType):
+    model = graphene.String()
+    object_id = graphene.ID()
+
+
+class CatalogChangesType(graphene.ObjectType):
+    """Cambios del catálogo desde una versión; ``full_resync`` pide descargar todo de nuevo"""
+    products = graphene.List(ProductType)
+    categories = graphene.List(CategoryType)
+    subcategories = graphene.List(SubCategoryType)
+    observations = graphene.List(ObservationType)
+    deleted = graphene.List(CatalogDeletionType)
+    version = graphene.BigInt()
+    has_more = graphene.Boolean()
+    full_resync = graphene.Boolean()
+
+
+class CatalogObservationType(graphene.ObjectType):
+    id = graphene.ID()
+    observation = graphene.String()
+
+
+class CatalogSubCategoryType(graphene.ObjectType):
+    id = graphene.ID()
+    subcategory = graphene.String()
+    description = graphene.String()
+    observations = graphene.List(CatalogObservationType)
+
+
+class CatalogCategoryType(graphene.ObjectType):
+    """Nodo del menú de venta; se resuelve desde el árbol cacheado (diccionarios)"""
+    id = graphene.ID()
+    category = graphene.String()
+    description = graphene.String()
+    subcategories = graphene.List(CatalogSubCategoryType)
+
+
 class DetailSaleType(DjangoObjectType):
     """Type para el detalle de venta (DetailSales)"""
 
@@ -88,17 +180,122 @@ class SaleType(DjangoObjectType):
         return self.detailsales_set.all()
 
 
+class CorrelativeBlockType(DjangoObjectType):
+    class Meta:
+        model = CorrelativeBlock
+        fields = ('id', 'correlative', 'device', 'start', 'end', 'next_number', 'is_active', 'date_creation')
+
+
+class CorrelativeGapType(DjangoObjectType):
+    class Meta:
+        model = CorrelativeGap
+        fields = ('id', 'number', 'reason', 'sale', 'date_creation')
+
+
+class SaleHistoryType(graphene.ObjectType):
+    """Venta de la tabla activa o del archivo"""
+    id = graphene.ID()
+    date_creation = graphene.DateTime()
+    date_cancel = graphene.DateTime()
+    type_receipt = graphene.String()
+    type_pay = graphene.String()
+    total = graphene.Decimal()
+    provider_id = graphene.ID()
+    subsidiary_id = graphene.ID()
+    serie = graphene.String()
+    number = graphene.Int()
+    archived = graphene.Boolean()
+
+
+class MonthlySalesType(graphene.ObjectType):
+    month = graphene.Date()
+    type_receipt = graphene.String()
+    sales_count = graphene.Int()
+    total = graphene.Decimal()
+
+
+class DetailPurchaseType(DjangoObjectType):
+    class Meta:
+        model = DetailPurchase
+        fields = ('id', 'product', 'quantity', 'price', 'subtotal', 'total')
+
+
+class OperationType(DjangoObjectType):
+    class Meta:
+        model = Operation
+        fields = ('id', 'product', 'quantity', 'price', 'date', 'type_operation', 'type_document', 'n_document',
+                  'operation', 'reference')
+
+    warehouse_id = graphene.ID()
+
+
 class PurchaseType(DjangoObjectType):
     class Meta:
         model = Purchase
         fields = '__all__'
 
+    details = graphene.List(DetailPurchaseType)
+
+    def resolve_details(self, info):
+        return self.details.all()
+
+
+class ReorderSuggestionType(DjangoObjectType):
+    class Meta:
+        model = ReorderSuggestion
+        fields = ('id', 'subsidiary', 'product', 'supplier', 'abc_class', 'avg_daily', 'forecast_lead_time',
+                  'lead_time_days', 'safety_stock', 'reorder_point', 'stock', 'suggested_quantity', 'date_computed')
+
+
+class ClientProductStatsType(DjangoObjectType):
+    class Meta:
+        model = ClientProductStats
+        fields = ('product', 'quantity', 'total', 'last_purchase')
+
+
+class ClientStatsType(DjangoObjectType):
+    """Acumulados de compras del cliente; ``top_products`` son los más comprados por unidades"""
+
+    class Meta:
+        model = ClientStats
+        fields = ('tickets_count', 'total_spent', 'first_purchase', 'last_purchase', 'updated_at')
+
+    top_products = graphene.List(ClientProductStatsType, limit=graphene.Int(default_value=5))
+
+    def resolve_top_products(self, info, limit=5):
+        return client_stats.top_products(self.client_id, max(1, min(limit, 50)))
+
 
 class ClientSupplierType(DjangoObjectType):
     class Meta:
         model = ClientSupplier
         fields = '__all__'
 
+    stats = graphene.Field(ClientStatsType)
+
+    def resolve_stats(self, info):
+        # Sin compras registradas no hay fila y la relación inversa lanzaría DoesNotExist
+        return ClientStats.objects.filter(client_id=self.id).first()
+
+
+class ClientHistoryType(graphene.ObjectType):
+    """Página del historial de compras de un cliente, de la más reciente a la más antigua"""
+    sales = graphene.List(SaleType)
+    end_cursor = graphene.String()
+    has_next_page = graphene.Boolean()
+
+
+class DocumentLookupType(graphene.ObjectType):
+    """Resultado de buscar un cliente por documento (base de datos o padrón)"""
+    found = graphene.Boolean()
+    source = graphene.String()  # 'CLIENT' o 'PADRON'
+    clientSupplier = graphene.Field(ClientSupplierType)
+    document = graphene.String()
+    name = graphene.String()
+    address = graphene.String()
+    status = graphene.String()
+    condition = graphene.String()
+
 
 class ErrorType(graphene.ObjectType):
     messages = graphene.List(graphene.String)
@@ -132,6 +329,69 @@ class CashType(DjangoObjectType):
                   'totalSales')
 
 
+class ReportBreakdownType(graphene.ObjectType):
+    key = graphene.String()
+    total = graphene.Decimal()
+    count = graphene.Int()
+
+
+def _breakdown(values):
+    return [ReportBreakdownType(key=key, total=value['total'], count=value['count']) for key, value in values.items()]
+
+
+class CashReportType(DjangoObjectType):
+    class Meta:
+        model = CashReport
+        fields = ('id',
+                  'cash',
+                  'subsidiary',
+                  'user',
+                  'date_open',
+                  'date_close',
+                  'initial_amount',
+                  'total_expected',
+                  'total_counted',
+                  'difference',
+                  'total_sales',
+                  'payments_count',
+                  'sales_count')
+
+    by_method = graphene.List(ReportBreakdownType)
+    by_payment_type = graphene.List(ReportBreakdownType)
+    by_receipt = graphene.List(ReportBreakdownType)
+    by_employee = graphene.List(ReportBreakdownType)
+
+    def resolve_by_method(self, info):
+        return _breakdown(self.by_method)
+
+    def resolve_by_payment_type(self, info):
+        return _breakdown(self.by_payment_type)
+
+    def resolve_by_receipt(self, info):
+        return _breakdown(self.by_receipt)
+
+    def resolve_by_employee(self, info):
+        return _breakdown(self.by_employee)
+
+
+class ChangeEventType(graphene.ObjectType):
+    seq = graphene.BigInt()
+    published_seq = graphene.BigInt()
+    aggregate = graphene.String()
+    aggregate_id = graphene.BigInt()
+    event_type = graphene.String()
+    subsidiary_id = graphene.ID()
+    payload = graphene.JSONString()
+    created_at = graphene.DateTime()
+
+
+class ChangesType(graphene.ObjectType):
+    """Eventos del outbox y el ``published_seq`` desde el que continuar"""
+    events = graphene.List(ChangeEventType)
+    last_seq = graphene.BigInt()
+    has_more = graphene.Boolean()
+
+
 class PaymentType(DjangoObjectType):
     class Meta:
         model = Payment
@@ -198,6 +458,52 @@ class CreateSaleInput(graphene.InputObjectType):
     typePay = graphene.String(required=True)  # 'E', 'Y', 'P'
     date = graphene.DateTime(required=False)  # Si no se envía, usar datetime.now()
     details = graphene.List(DetailSaleInput, required=True)  # Lista de productos
+    deviceId = graphene.ID(required=False)  # Terminal con bloque de correlativos - opcional
+    number = graphene.Int(required=False)  # Correlativo asignado sin conexión - opcional
+    warehouseId = graphene.ID(required=False)  # Almacén que despacha; por defecto el primero de la sucursal
+
+
+class CancelSaleLineInput(graphene.InputObjectType):
+    detailId = graphene.ID(required=True)
+    quantity = graphene.Int(required=True)
+
+
+class CancelSaleInput(graphene.InputObjectType):
+    """Anulación de una venta; sin líneas se anula todo lo pendiente"""
+    saleId = graphene.ID(required=True)
+    lines = graphene.List(CancelSaleLineInput, required=False)
+
+
+class CancelSalesInput(graphene.InputObjectType):
+    """Anulación de varios tickets en una sola transacción"""
+    sales = graphene.List(CancelSaleInput, required=True)
+
+
+class TransferLineInput(graphene.InputObjectType):
+    productId = graphene.ID(required=True)
+    quantity = graphene.Int(required=True)
+
+
+class TransferStockInput(graphene.InputObjectType):
+    """Traslado de stock entre almacenes (pueden ser de sucursales distintas)"""
+    fromWarehouseId = graphene.ID(required=True)
+    toWarehouseId = graphene.ID(required=True)
+    lines = graphene.List(TransferLineInput, required=True)
+    nDocument = graphene.String(required=False)  # Número de la guía
+    date = graphene.DateTime(required=False)
+
+
+class WarehouseQuantityType(graphene.ObjectType):
+    warehouse_id = graphene.ID()
+    warehouse = graphene.String()
+    quantity = graphene.Int()
+
+
+class ProductAvailabilityType(graphene.ObjectType):
+    """Stock de un producto en los almacenes de una sucursal"""
+    product_id = graphene.ID()
+    total = graphene.Int()
+    warehouses = graphene.List(WarehouseQuantityType)
 
 
 class CreatePurchaseInput(graphene.InputObjectType):
@@ -211,6 +517,41 @@ class CreatePurchaseInput(graphene.InputObjectType):
     date = graphene.DateTime()
 
 
+class PriceQuoteLineInput(graphene.InputObjectType):
+    productId = graphene.ID(required=True)
+    quantity = graphene.Int(required=True)
+
+
+class PriceQuoteLineType(graphene.ObjectType):
+    """Precio que se cobrará por una línea según las reglas de la sucursal"""
+    product_id = graphene.ID()
+    quantity = graphene.Int()
+    base_price = graphene.Decimal()
+    unit_price = graphene.Decimal()
+    total = graphene.Decimal()
+
+
+class DetailPurchaseInput(graphene.InputObjectType):
+    """Línea de una compra con varios productos"""
+    productId = graphene.ID(required=True)
+    quantity = graphene.Int(required=True)
+    price = graphene.Decimal(required=True)  # Costo unitario
+    subtotal = graphene.Decimal(required=False)
+    total = graphene.Decimal(required=False)
+
+
+class CreatePurchaseDocumentInput(graphene.InputObjectType):
+    """Comprobante de compra con múltiples productos"""
+    providerId = graphene.ID(required=False)
+    subsidiaryId = graphene.ID(required=False)
+    typeReceipt = graphene.String(required=True)
+    typePay = graphene.String(required=True)
+    nDocument = graphene.String(required=False)  # Número del comprobante del proveedor
+    date = graphene.DateTime(required=False)
+    details = graphene.List(DetailPurchaseInput, required=True)
+    warehouseId = graphene.ID(required=False)  # Almacén que recibe; por defecto el primero de la sucursal
+
+
 class UpdatePurchaseInput(graphene.InputObjectType):
     productId = graphene.ID()
     providerId = graphene.ID()
@@ -228,7 +569,7 @@ class CreateClientSupplierInput(graphene.InputObjectType):
     address = graphene.String(required=False)
     phone = graphene.String(required=False)
     mail = graphene.String(required=False)
-    nDocument = graphene.Int(required=True)
+    nDocument = graphene.BigInt(required=True)  # un RUC (11 dígitos) no entra en Int (32 bits)
     typeDocument = graphene.String(required=True)  # 'R','D','O'
     typePerson = graphene.String(required=True)  # 'C','E'
 
@@ -238,7 +579,7 @@ class UpdateClientSupplierInput(graphene.InputObjectType):
     address = graphene.String(required=False)
     phone = graphene.String(required=False)
     mail = graphene.String(required=False)
-    nDocument = graphene.Int(required=True)
+    nDocument = graphene.BigInt(required=True)  # un RUC (11 dígitos) no entra en Int (32 bits)
     typeDocument = graphene.String(required=True)
     typePerson = graphene.String(required=True)
 
@@ -262,3 +603,17 @@ class CreateExpensePaymentInput(graphene.InputObjectType):
     paid_amount = graphene.Decimal(required=True)
     payment_date = graphene.DateTime(required=False)
     notes = graphene.String(required=False)
+
+
+class ReserveCorrelativeBlockInput(graphene.InputObjectType):
+    subsidiary_id = graphene.ID(required=True)
+    device_id = graphene.ID(required=True)
+    type_receipt = graphene.String(required=True)
+    size = graphene.Int(required=True)
+
+
+class VoidCorrelativeInput(graphene.InputObjectType):
+    subsidiary_id = graphene.ID(required=True)
+    type_receipt = graphene.String(required=True)
+    number = graphene.Int(required=True)
+    reason = graphene.String(required=False)
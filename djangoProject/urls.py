@@ -18,13 +18,15 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
 
-from djangoProject.schema import schema
+from apps.hrmn.views import image_variant
+from djangoProject.views import CachedGraphQLView, BatchGraphQLView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path("graphql/", csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),
+    path("graphql/", csrf_exempt(CachedGraphQLView.as_view(graphiql=True))),
+    path("graphql/batch/", csrf_exempt(BatchGraphQLView.as_view())),
+    path('images/<str:digest>.<str:ext>', image_variant, name='image_variant'),
     path('products/', include(('apps.products.urls', 'apps.products'))),
     path('employees/', include(('apps.hrmn.urls', 'apps.hrmn'))),
     path('sales/', include(('apps.sales.urls', 'apps.sales'))),
@@ -0,0 +1,44 @@
+"""Contadores de versión de datos guardados en el cache de Django.
+
+Cada escritura confirmada incrementa el contador de su entidad (por ejemplo
+``product`` y ``product:<subsidiary_id>``); las respuestas y resultados
+cacheados se identifican por esas versiones, así que se invalidan solos.
+Con varios workers el cache debe ser compartido (Redis/Memcached).
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIX = 'data-version:'
+TIMEOUT = None  # Los contadores no expiran
+
+
+def _key(name):
+    return PREFIX + name
+
+
+def get_versions(names):
+    """Devuelve ``{nombre: version}``; las versiones no creadas valen 0."""
+    values = cache.get_many([_key(name) for name in names])
+    return {name: values.get(_key(name), 0) for name in names}
+
+
+def get_version(name):
+    return get_versions([name])[name]
+
+
+def _incr(names):
+    for name in names:
+        key = _key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Primera escritura: si otro proceso la crea antes, se incrementa la suya.
+            if not cache.add(key, 1, TIMEOUT):
+                cache.incr(key)
+
+
+def bump(*names):
+    """Incrementa los contadores cuando la transacción actual hace commit."""
+    names = [name for name in names if name]
+    if names:
+        transaction.on_commit(lambda: _incr(names))
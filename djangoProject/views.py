@@ -0,0 +1,289 @@
+import gzip
+import hashlib
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.views import GraphQLView, HttpError
+
+from djangoProject import operations, versions
+from djangoProject.schema import get_schema
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional; sin él solo se usa gzip
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # sin orjson se usa el codificador estándar de GraphQLView
+    orjson = None
+
+COMPRESS_MIN_SIZE = getattr(settings, 'GRAPHQL_COMPRESS_MIN_SIZE', 1024)
+BATCH_MAX_OPERATIONS = getattr(settings, 'GRAPHQL_BATCH_MAX_OPERATIONS', 20)
+REF = '$ref'
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+def _orjson_default(value):
+    # Mismo resultado que el escalar Decimal de graphene: el número como texto
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError
+
+
+def fast_json_encode(data):
+    """Codifica con orjson (datetime nativo, Decimal como texto); None si no es posible.
+
+    Devuelve ``str`` como ``GraphQLView.json_encode``, que en modo batch concatena resultados.
+    """
+    if orjson is None:
+        return None
+    try:
+        return orjson.dumps(data, default=_orjson_default, option=ORJSON_OPTIONS).decode('utf-8')
+    except TypeError:
+        return None
+
+
+def _subsidiary_scope(*names):
+    def scopes(args):
+        subsidiary_id = args.get('subsidiaryId')
+        return [f'{name}:{subsidiary_id}' if subsidiary_id else name for name in names]
+    return scopes
+
+
+# Campos raíz que se pueden cachear por GET y los contadores de versión de los
+# que dependen. Una consulta con cualquier otro campo no lleva ETag.
+# ProductType anida su categoría: renombrarla también cambia la respuesta.
+CACHEABLE_FIELDS = {
+    'products': _subsidiary_scope('product', 'category'),
+    'product': lambda args: ['product', 'category'],
+    'categories': lambda args: ['category'],
+    'catalogTree': _subsidiary_scope('category'),
+    'subsidiaries': lambda args: ['subsidiary'],
+    'subsidiary': lambda args: ['subsidiary'],
+}
+
+
+class CachedGraphQLView(GraphQLView):
+    """GraphQLView con ETag/304 para consultas por GET, codificación rápida y compresión de respuestas."""
+
+    cacheable_fields = CACHEABLE_FIELDS
+
+    def __init__(self, schema=None, **kwargs):
+        # El esquema se construye en la primera petición, no al importar urls.py
+        super().__init__(schema=schema or get_schema(), **kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        etag = None
+        if request.method == 'GET' and request.GET.get('query') and not self.request_wants_html(request):
+            etag = self.get_etag(request)
+            if etag and {etag, '*'} & self.if_none_match(request):
+                response = HttpResponse(status=304)
+                response['ETag'] = etag
+                return response
+
+        response = super().dispatch(request, *args, **kwargs)
+
+        if etag and response.status_code == 200:
+            response['ETag'] = etag
+            response['Cache-Control'] = 'private, no-cache'
+            patch_vary_headers(response, ('Authorization',))
+        return self.compress(request, response)
+
+    def json_encode(self, request, d, pretty=False):
+        if not (self.pretty or pretty) and not request.GET.get('pretty'):
+            encoded = fast_json_encode(d)
+            if encoded is not None:
+                return encoded
+        return super().json_encode(request, d, pretty=pretty)
+
+    @staticmethod
+    def if_none_match(request):
+        """Etiquetas de ``If-None-Match`` listas para la comparación débil de RFC 9110 (sin ``W/``)."""
+        tags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        # El sufijo de codificación no cambia los datos; se compara la etiqueta base.
+        return {tag.removeprefix('W/').replace('-br"', '"').replace('-gz"', '"') for tag in tags}
+
+    def get_etag(self, request):
+        """ETag fuerte a partir de la consulta, sus variables y las versiones de datos."""
+        query = request.GET.get('query')
+        operation_name = request.GET.get('operationName') or None
+        try:
+            variables = json.loads(request.GET.get('variables') or '{}')
+        except ValueError:
+            return None
+        operation = operations.describe(query, variables, operation_name)
+        if operation is None or operation.kind != 'query':
+            return None
+
+        names = []
+        for field, args in operation.fields:
+            scopes = self.cacheable_fields.get(field)
+            if scopes is None:
+                return None
+            names.extend(scopes(args))
+
+        data_versions = versions.get_versions(sorted(set(names)))
+        digest = hashlib.sha1(json.dumps(
+            [query, variables, operation_name, data_versions], sort_keys=True, default=str
+        ).encode('utf-8')).hexdigest()
+        return f'"{digest}"'
+
+    @staticmethod
+    def compress(request, response):
+        if (response.streaming or response.has_header('Content-Encoding') or
+                len(response.content) < COMPRESS_MIN_SIZE):
+            return response
+
+        accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is not None and 'br' in accept:
+            content, encoding, suffix = brotli.compress(response.content, quality=5), 'br', '-br'
+        elif 'gzip' in accept:
+            content, encoding, suffix = gzip.compress(response.content, compresslevel=6), 'gzip', '-gz'
+        else:
+            patch_vary_headers(response, ('Accept-Encoding',))
+            return response
+
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        if response.has_header('ETag'):
+            response['ETag'] = response['ETag'][:-1] + suffix + '"'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+
+class BatchReferenceError(Exception):
+    pass
+
+
+def resolve_references(value, results):
+    """Reemplaza ``{"$ref": "<operación>.<ruta>"}`` por el valor en ``data`` de una operación anterior.
+
+    La operación se indica por su ``id`` o por su posición; la ruta recorre ``data``
+    con puntos, por ejemplo ``cliente.createClientSupplier.clientSupplier.id``.
+    """
+    if isinstance(value, list):
+        return [resolve_references(item, results) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if set(value) != {REF}:
+        return {key: resolve_references(item, results) for key, item in value.items()}
+
+    reference = str(value[REF])
+    key, _, path = reference.partition('.')
+    current = results.get(key, {}).get('data')
+    if current is None:
+        raise BatchReferenceError(f'La operación "{key}" no existe o no devolvió datos')
+    for part in path.split('.') if path else ():
+        try:
+            current = current[int(part)] if isinstance(current, list) else current[part]
+        except (KeyError, IndexError, ValueError, TypeError):
+            raise BatchReferenceError(f'Referencia no resuelta: {reference}')
+    if current is None:
+        raise BatchReferenceError(f'Referencia vacía: {reference}')
+    return current
+
+
+def failed(result):
+    """Una operación falla si tiene errores o alguna mutación responde ``success: false``."""
+    if result.get('errors'):
+        return True
+    data = result.get('data') or {}
+    return any(isinstance(payload, dict) and payload.get('success') is False for payload in data.values())
+
+
+class BatchGraphQLView(CachedGraphQLView):
+    """Varias operaciones en una sola petición POST.
+
+    El cuerpo es una lista de operaciones ``{id, query, variables, operationName}``
+    o ``{"atomic": true, "operations": [...]}``. En modo atómico todas corren en
+    una transacción y la primera que falla deshace las anteriores. Las variables
+    pueden usar ``{"$ref": ...}`` para tomar resultados de operaciones previas.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != 'POST':
+            return HttpResponseNotAllowed(['POST'])
+        try:
+            body = json.loads(request.body or b'null')
+        except ValueError:
+            return self.batch_error('El cuerpo no es JSON válido')
+
+        if isinstance(body, list):
+            entries, atomic = body, False
+        elif isinstance(body, dict) and isinstance(body.get('operations'), list):
+            entries, atomic = body['operations'], bool(body.get('atomic'))
+        else:
+            return self.batch_error('Se esperaba una lista de operaciones')
+        if not entries or len(entries) > BATCH_MAX_OPERATIONS:
+            return self.batch_error(f'Se permiten entre 1 y {BATCH_MAX_OPERATIONS} operaciones por petición')
+        if not all(isinstance(entry, dict) for entry in entries):
+            return self.batch_error('Cada operación debe ser un objeto')
+
+        try:
+            if atomic:
+                results, committed = self.run_atomic(request, entries)
+            else:
+                results, committed = self.run_all(request, entries), None
+        except HttpError as e:
+            return e.response
+
+        data = results if isinstance(body, list) else {'atomic': atomic, 'committed': committed, 'results': results}
+        response = HttpResponse(self.json_encode(request, data), content_type='application/json')
+        return self.compress(request, response)
+
+    @staticmethod
+    def batch_error(message):
+        return JsonResponse({'errors': [{'message': message}]}, status=400)
+
+    def run_all(self, request, entries):
+        by_key = {}
+        return [self.run_entry(request, entry, index, by_key) for index, entry in enumerate(entries)]
+
+    def run_atomic(self, request, entries):
+        results, by_key = [], {}
+        with transaction.atomic():
+            for index, entry in enumerate(entries):
+                result = self.run_entry(request, entry, index, by_key)
+                results.append(result)
+                if failed(result):
+                    # Lo ya ejecutado se deshace; las siguientes no se ejecutan
+                    transaction.set_rollback(True)
+                    results.extend({'id': e.get('id', str(i)), 'data': None,
+                                    'errors': [{'message': 'No ejecutada: una operación anterior falló'}]}
+                                   for i, e in enumerate(entries[index + 1:], start=index + 1))
+                    return results, False
+        return results, True
+
+    def run_entry(self, request, entry, index, by_key):
+        key = str(entry.get('id', index))
+        result = self.execute_entry(request, entry, by_key)
+        result['id'] = key
+        by_key[str(index)] = result
+        by_key[key] = result
+        return result
+
+    def execute_entry(self, request, entry, by_key):
+        if not entry.get('query'):
+            return {'data': None, 'errors': [{'message': 'Falta la consulta'}]}
+        try:
+            variables = resolve_references(entry.get('variables') or {}, by_key)
+        except BatchReferenceError as e:
+            return {'data': None, 'errors': [{'message': str(e)}]}
+
+        setattr(request, MUTATION_ERRORS_FLAG, False)
+        execution_result = self.execute_graphql_request(
+            request, entry, entry['query'], variables, entry.get('operationName'))
+        result = {'data': execution_result.data if execution_result else None}
+        if execution_result and execution_result.errors:
+            result['errors'] = [self.format_error(e) for e in execution_result.errors]
+        elif getattr(request, MUTATION_ERRORS_FLAG, False):
+            result['errors'] = [{'message': 'La mutación devolvió errores'}]
+        return result